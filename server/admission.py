@@ -0,0 +1,210 @@
+"""
+Admission control and load shedding for the data service
+
+Three layers, checked before a request touches the connection pool:
+
+  * a token bucket per user (``X-User-Id`` header, ``userId`` query
+    parameter or JSON field) so one runaway client cannot starve the rest;
+    requests that name no user only count against the global bucket, since
+    the Node server forwards every user's traffic from one address
+  * a global token bucket for the whole service
+  * a bounded in-flight limit with a short wait queue; when the queue is
+    full, requests fail fast with 503 instead of piling up until everyone
+    times out
+
+Rate-limited requests get 429 and overloaded ones 503, both with
+``Retry-After``. Each request also gets a statement timeout (per endpoint,
+see ``ROUTE_STATEMENT_TIMEOUTS_MS``): ``SET LOCAL statement_timeout`` on
+PostgreSQL and a progress-handler deadline on SQLite.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_STATEMENT_TIMEOUT_MS = int(os.getenv('STATEMENT_TIMEOUT_MS', '5000'))
+
+# Endpoints that need a different budget than DEFAULT_STATEMENT_TIMEOUT_MS; None disables the timeout
+ROUTE_STATEMENT_TIMEOUTS_MS: Dict[str, Optional[int]] = {
+    'get_chats': 2000,
+    'get_messages': 2000,
+    'get_message_context': 2000,
+    'search_chat_messages': 3000,
+    'get_cohort_rollup': 3000,
+    'import_users': 30000,
+    'recompute_statistics': None,
+    'retire_poor_items': 60000,
+    'rebuild_cohort_rollups': None,
+    'refresh_user_recommendations': 60000,
+}
+
+SQLITE_PROGRESS_STEPS = 10000  # VM instructions between deadline checks
+
+statement_timeout_ms: ContextVar[Optional[int]] = ContextVar('statement_timeout_ms', default=None)
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """0 when a token was taken, else seconds until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class InFlightLimiter:
+    """At most ``max_in_flight`` concurrent requests, with up to ``max_queued`` waiting ``queue_timeout`` seconds"""
+
+    def __init__(self, max_in_flight: int, max_queued: int, queue_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> bool:
+        with self._condition:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return True
+            if self.queued >= self.max_queued:
+                return False
+            self.queued += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+                self.in_flight += 1
+                return True
+            finally:
+                self.queued -= 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+
+class AdmissionController:
+    def __init__(self, user_rate: float, user_burst: float, global_rate: float, global_burst: float,
+                 max_in_flight: int, max_queued: int, queue_timeout: float, max_tracked_users: int = 10000):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.limiter = InFlightLimiter(max_in_flight, max_queued, queue_timeout)
+        self.max_tracked_users = max_tracked_users
+        self._users: 'OrderedDict[str, TokenBucket]' = OrderedDict()
+        self._users_lock = threading.Lock()
+        self.rejected = {'user': 0, 'global': 0, 'overload': 0}
+
+    @classmethod
+    def from_env(cls) -> 'AdmissionController':
+        return cls(
+            user_rate=float(os.getenv('ADMISSION_USER_RATE', '10')),
+            user_burst=float(os.getenv('ADMISSION_USER_BURST', '20')),
+            global_rate=float(os.getenv('ADMISSION_GLOBAL_RATE', '200')),
+            global_burst=float(os.getenv('ADMISSION_GLOBAL_BURST', '400')),
+            max_in_flight=int(os.getenv('ADMISSION_MAX_IN_FLIGHT', '8')),
+            max_queued=int(os.getenv('ADMISSION_MAX_QUEUED', '32')),
+            queue_timeout=float(os.getenv('ADMISSION_QUEUE_TIMEOUT_MS', '500')) / 1000,
+        )
+
+    def _user_bucket(self, user_id: str) -> TokenBucket:
+        with self._users_lock:
+            bucket = self._users.get(user_id)
+            if bucket is None:
+                bucket = self._users[user_id] = TokenBucket(self.user_rate, self.user_burst)
+                if len(self._users) > self.max_tracked_users:
+                    self._users.popitem(last=False)  # Least recently seen user; a full bucket again if they return
+            else:
+                self._users.move_to_end(user_id)
+            return bucket
+
+    def admit(self, user_id: Optional[str], hold_slot: bool = True) -> Optional[Tuple[int, str, int]]:
+        """None when admitted, else (status, error, retry-after seconds)
+
+        Call ``release`` after the request when ``hold_slot`` (the default);
+        long-lived streams pass False so they only spend rate-limit tokens.
+        """
+        if user_id:
+            wait = self._user_bucket(user_id).take()
+            if wait:
+                self.rejected['user'] += 1
+                return 429, 'Too many requests for this user', math.ceil(wait)
+        wait = self.global_bucket.take()
+        if wait:
+            self.rejected['global'] += 1
+            return 429, 'Too many requests', math.ceil(wait)
+        if hold_slot and not self.limiter.acquire():
+            self.rejected['overload'] += 1
+            return 503, 'Service overloaded', 1
+        return None
+
+    def release(self):
+        self.limiter.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'inFlight': self.limiter.in_flight,
+            'queued': self.limiter.queued,
+            'maxInFlight': self.limiter.max_in_flight,
+            'trackedUsers': len(self._users),
+            'rejected': dict(self.rejected),
+        }
+
+
+def route_statement_timeout(endpoint: Optional[str]) -> Optional[int]:
+    return ROUTE_STATEMENT_TIMEOUTS_MS.get(endpoint, DEFAULT_STATEMENT_TIMEOUT_MS)
+
+
+def configure_statement_timeouts(engine: Engine):
+    """Apply the current request's ``statement_timeout_ms`` to statements run on ``engine``"""
+    if engine.dialect.name == 'postgresql':
+        @event.listens_for(engine, 'begin')
+        def _set_timeout(conn):
+            timeout = statement_timeout_ms.get()
+            if timeout:
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+    elif engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _start_deadline(conn, cursor, statement, parameters, context, executemany):
+            timeout = statement_timeout_ms.get()
+            if timeout:
+                deadline = time.monotonic() + timeout / 1000
+                cursor.connection.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+
+        def _clear_deadline(conn):
+            if statement_timeout_ms.get() and conn is not None and not conn.invalidated:
+                conn.connection.dbapi_connection.set_progress_handler(None, SQLITE_PROGRESS_STEPS)
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def _end_deadline(conn, cursor, statement, parameters, context, executemany):
+            _clear_deadline(conn)
+
+        @event.listens_for(engine, 'handle_error')
+        def _error_deadline(context):
+            _clear_deadline(context.connection)
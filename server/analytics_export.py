@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Columnar export of assessment attempts for offline analytics
+
+Streams graded ``assessment_attempts`` joined with their standard and the
+student's grade when graded into Parquet files partitioned Hive-style by month and
+grade (``month=2026-10/grade=4/part-....parquet``). Each run only exports
+attempts that became available (graded) since the previous run's watermark,
+kept in ``_export_state.json``, and writes one new file per touched
+partition; files are renamed into place before the watermark advances, so
+an interrupted run never leaves half-written data behind.
+
+Availability times are taken before the grading transaction commits, so a
+run stops ``EXPORT_SAFETY_LAG`` short of now: a row that commits late is
+still ahead of the watermark when it becomes visible. Rows are read in
+(available_at, id) order over the matching expression index.
+
+The report helpers read the export through a memory-mapped Arrow dataset,
+so analytics never touch the production database. ``pyarrow`` is an
+optional dependency needed only here.
+
+    python analytics_export.py export [--out DIR]
+    python analytics_export.py report accuracy|time|cohort [--out DIR] [--grade 4] [--month 2026-10]
+"""
+import argparse
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.engine import Engine
+
+DEFAULT_EXPORT_DIR = os.getenv('ANALYTICS_EXPORT_DIR', 'analytics_export')
+STATE_FILE = '_export_state.json'
+STREAM_BATCH_SIZE = 10000
+EXPORT_SAFETY_LAG = timedelta(minutes=10)  # Longer than any grading transaction
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401  (registers pyarrow.parquet)
+    except ImportError as e:
+        raise RuntimeError("Analytics export needs the optional 'pyarrow' package") from e
+    return pyarrow
+
+
+def _schema(pa):
+    return pa.schema([
+        ('attempt_id', pa.string()),
+        ('user_id', pa.string()),
+        ('item_id', pa.string()),
+        ('sol_id', pa.string()),
+        ('subject', pa.string()),
+        ('strand', pa.string()),
+        ('sol_grade', pa.string()),
+        ('is_correct', pa.bool_()),
+        ('score', pa.float64()),
+        ('max_score', pa.float64()),
+        ('score_ratio', pa.float64()),
+        ('duration_seconds', pa.int32()),
+        ('created_at', pa.timestamp('ms')),
+        ('available_at', pa.timestamp('ms')),
+    ])
+
+
+def _read_state(root: str) -> Dict[str, Any]:
+    path = os.path.join(root, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_state(root: str, state: Dict[str, Any]):
+    path = os.path.join(root, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _attempts_query(watermark: Optional[Dict[str, str]], until: datetime):
+    # Imported here so the report helpers work without DATABASE_URL
+    from models import AssessmentAttempt, SolStandard, User
+
+    # CR attempts are graded after they are created, so export by when the result became final
+    available_at = func.coalesce(AssessmentAttempt.graded_at, AssessmentAttempt.created_at)
+    query = select(
+        AssessmentAttempt.id, AssessmentAttempt.user_id, AssessmentAttempt.item_id, AssessmentAttempt.sol_id,
+        SolStandard.subject, SolStandard.strand, SolStandard.grade.label('sol_grade'),
+        # The grade recorded at grading time, so a promotion does not move past attempts
+        func.coalesce(AssessmentAttempt.grade, User.grade).label('user_grade'),
+        AssessmentAttempt.is_correct, AssessmentAttempt.score, AssessmentAttempt.max_score,
+        AssessmentAttempt.duration_seconds, AssessmentAttempt.created_at, available_at.label('available_at'),
+    ).join(SolStandard, SolStandard.id == AssessmentAttempt.sol_id).join(
+        User, User.id == AssessmentAttempt.user_id
+    ).where(AssessmentAttempt.grading_status == 'graded', available_at <= until)
+    if watermark:
+        at = datetime.fromisoformat(watermark['availableAt'])
+        query = query.where(tuple_(available_at, AssessmentAttempt.id) > (at, watermark['id']))
+    return query.order_by(available_at, AssessmentAttempt.id)
+
+
+def ensure_export_index(engine: Engine):
+    """Index the export order on databases created before it existed"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_assessment_attempts_available_at "
+            "ON assessment_attempts ((COALESCE(graded_at, created_at)), id)"
+        ))
+
+
+class _PartitionWriters:
+    """One ParquetWriter per (month, grade) for the current run, written under temporary names"""
+
+    def __init__(self, pa, root: str, run_id: str):
+        self.pa = pa
+        self.root = root
+        self.run_id = run_id
+        self.schema = _schema(pa)
+        self.writers: Dict[tuple, Any] = {}
+        self.paths: Dict[tuple, str] = {}
+        self.rows: Dict[tuple, int] = {}
+
+    def write(self, partition: tuple, columns: Dict[str, list]):
+        if partition not in self.writers:
+            month, grade = partition
+            directory = os.path.join(self.root, f"month={month}", f"grade={grade}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{self.run_id}.parquet")
+            self.paths[partition] = path
+            self.writers[partition] = self.pa.parquet.ParquetWriter(path + '.tmp', self.schema, compression='zstd')
+            self.rows[partition] = 0
+        self.writers[partition].write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+        self.rows[partition] += len(columns['attempt_id'])
+
+    def commit(self):
+        for partition, writer in self.writers.items():
+            writer.close()
+            os.replace(self.paths[partition] + '.tmp', self.paths[partition])
+
+    def abort(self):
+        for partition, writer in self.writers.items():
+            writer.close()
+            os.remove(self.paths[partition] + '.tmp')
+
+
+def export_attempts(engine: Engine, root: str = DEFAULT_EXPORT_DIR,
+                    batch_size: int = STREAM_BATCH_SIZE) -> Dict[str, Any]:
+    """Append attempts available since the last run; returns rows written per partition"""
+    pa = _pyarrow()
+    os.makedirs(root, exist_ok=True)
+    state = _read_state(root)
+    run_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    writers = _PartitionWriters(pa, root, run_id)
+    field_names = _schema(pa).names
+    last = None
+
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+                _attempts_query(state.get('watermark'), datetime.utcnow() - EXPORT_SAFETY_LAG)
+            )
+            for chunk in result.partitions():
+                buffers: Dict[tuple, Dict[str, list]] = {}
+                for row in chunk:
+                    partition = (f"{row.created_at:%Y-%m}", row.user_grade)
+                    columns = buffers.setdefault(partition, {name: [] for name in field_names})
+                    for name, value in (
+                        ('attempt_id', str(row.id)), ('user_id', str(row.user_id)), ('item_id', str(row.item_id)),
+                        ('sol_id', row.sol_id), ('subject', row.subject), ('strand', row.strand),
+                        ('sol_grade', row.sol_grade), ('is_correct', row.is_correct), ('score', row.score),
+                        ('max_score', row.max_score),
+                        ('score_ratio', row.score / row.max_score if row.max_score else None),
+                        ('duration_seconds', row.duration_seconds), ('created_at', row.created_at),
+                        ('available_at', row.available_at),
+                    ):
+                        columns[name].append(value)
+                    last = row
+                for partition, columns in buffers.items():
+                    writers.write(partition, columns)
+    except BaseException:
+        writers.abort()
+        raise
+
+    writers.commit()
+    if last is not None:
+        state['watermark'] = {'availableAt': last.available_at.isoformat(), 'id': str(last.id)}
+        state['lastRunId'] = run_id
+        _write_state(root, state)
+    return {f"month={month}/grade={grade}": rows for (month, grade), rows in writers.rows.items()}
+
+
+def open_dataset(root: str = DEFAULT_EXPORT_DIR):
+    """The export as a memory-mapped Arrow dataset with ``month`` and ``grade`` partition columns"""
+    pa = _pyarrow()
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    return ds.dataset(root, format='parquet', partitioning='hive',
+                      filesystem=fs.LocalFileSystem(use_mmap=True),
+                      exclude_invalid_files=True, ignore_prefixes=['_', '.'],
+                      schema=_schema(pa).append(pa.field('month', pa.string())).append(pa.field('grade', pa.string())))
+
+
+def _load(root: str, columns: List[str], grade: Optional[str], month: Optional[str]):
+    import pyarrow.dataset as ds
+
+    condition = None
+    for field, value in (('grade', grade), ('month', month)):
+        if value is not None:
+            clause = ds.field(field) == value
+            condition = clause if condition is None else condition & clause
+    return open_dataset(root).to_table(columns=columns, filter=condition)
+
+
+def _rows(table) -> List[Dict[str, Any]]:
+    return table.to_pylist()
+
+
+def standard_accuracy(root: str = DEFAULT_EXPORT_DIR, grade: Optional[str] = None,
+                      month: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Per-standard attempt count, accuracy and mean score ratio, weakest first"""
+    table = _load(root, ['sol_id', 'is_correct', 'score_ratio'], grade, month)
+    pa = _pyarrow()
+    table = table.set_column(1, 'is_correct', table['is_correct'].cast(pa.float64()))
+    grouped = table.group_by('sol_id').aggregate([
+        ('is_correct', 'count'), ('is_correct', 'mean'), ('score_ratio', 'mean')
+    ]).rename_columns(['sol_id', 'attempts', 'accuracy', 'mean_score'])
+    return sorted(_rows(grouped), key=lambda row: (row['accuracy'], -row['attempts']))
+
+
+def time_on_item(root: str = DEFAULT_EXPORT_DIR, grade: Optional[str] = None,
+                 month: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Per-item attempt count and mean/approximate median duration, slowest first"""
+    table = _load(root, ['item_id', 'sol_id', 'duration_seconds'], grade, month)
+    grouped = table.filter(table['duration_seconds'].is_valid()).group_by(['item_id', 'sol_id']).aggregate([
+        ('duration_seconds', 'count'), ('duration_seconds', 'mean'), ('duration_seconds', 'approximate_median')
+    ]).rename_columns(['item_id', 'sol_id', 'attempts', 'mean_seconds', 'median_seconds'])
+    return sorted(_rows(grouped), key=lambda row: -row['mean_seconds'])
+
+
+def cohort_trend(root: str = DEFAULT_EXPORT_DIR, grade: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Accuracy and active students per (month, grade) cohort, chronologically"""
+    table = _load(root, ['month', 'grade', 'user_id', 'is_correct'], grade, None)
+    pa = _pyarrow()
+    table = table.set_column(3, 'is_correct', table['is_correct'].cast(pa.float64()))
+    grouped = table.group_by(['month', 'grade']).aggregate([
+        ('is_correct', 'count'), ('is_correct', 'mean'), ('user_id', 'count_distinct')
+    ]).rename_columns(['month', 'grade', 'attempts', 'accuracy', 'students'])
+    return sorted(_rows(grouped), key=lambda row: (row['month'], row['grade']))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Export assessment attempts to Parquet and report on them')
+    parser.add_argument('command', choices=['export', 'report'])
+    parser.add_argument('report', nargs='?', choices=['accuracy', 'time', 'cohort'], default='accuracy')
+    parser.add_argument('--out', default=DEFAULT_EXPORT_DIR)
+    parser.add_argument('--grade')
+    parser.add_argument('--month')
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        from models import db_manager
+
+        written = export_attempts(db_manager.read_engine, args.out)
+        for partition, rows in sorted(written.items()):
+            print(f"  {partition}: {rows} attempts")
+        print(f"✓ Exported {sum(written.values())} attempts to {args.out}")
+        return
+
+    if args.report == 'accuracy':
+        rows = standard_accuracy(args.out, args.grade, args.month)
+    elif args.report == 'time':
+        rows = time_on_item(args.out, args.grade, args.month)
+    else:
+        rows = cohort_trend(args.out, args.grade)
+    for row in rows:
+        print(json.dumps(row, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Parallel logical backup and restore built on the SQLAlchemy models
+
+A backup is a directory with one folder per table of gzip-compressed
+NDJSON chunks (``CHUNK_ROWS`` rows each) and a ``manifest.json`` listing
+every chunk with its row count and sha256. It is assembled under a
+``.partial`` name and renamed once the manifest is written, so an
+interrupted run never looks like a finished backup.
+
+On PostgreSQL, ``--jobs`` workers dump tables concurrently from one
+exported snapshot (``pg_export_snapshot``), like ``pg_dump -j``, so the
+tables agree with each other. SQLite allows one snapshot per connection,
+so its tables are read in turn from a single read transaction.
+
+Incremental backups (``--incremental``) only copy rows of the tables in
+``INCREMENTAL_COLUMNS`` whose timestamps are at or after the previous
+backup's watermark (less ``INCREMENTAL_OVERLAP`` for transactions that
+committed late); other tables are copied in full. Deleted rows, and
+updates that do not touch those timestamps, are only picked up by the next
+full backup.
+
+Restore verifies the checksums of the whole chain (full backup plus the
+incrementals up to the one named), drops secondary indexes, loads the full
+backup in parallel in foreign-key order, rebuilds the indexes and then
+upserts each incremental on top. Values go through the column types, so a
+backup restores onto either backend. On PostgreSQL user triggers are
+disabled while loading: restored chats already carry their message
+summaries, and restored messages must not be announced on the change feed.
+Chat summaries are recomputed after incrementals, which do not capture
+message deletions.
+
+    python backup_tool.py backup --dest /home/pi/studybuddy/backups [--incremental] [--jobs 4]
+    python backup_tool.py restore /home/pi/studybuddy/backups/studybuddy_20261019_020000_full [--truncate]
+    python backup_tool.py verify <backup dir>
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import Date, DateTime, Table, func, insert, or_, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from chat_summaries import rebuild_chat_summaries
+from models import Base
+from schema_migrations import current_version
+from sql_compat import dialect_insert
+
+FORMAT_VERSION = 1
+CHUNK_ROWS = 20000
+COMPRESS_LEVEL = 6
+DEFAULT_JOBS = min(4, os.cpu_count() or 1)
+INCREMENTAL_OVERLAP = timedelta(minutes=10)
+
+# Tables copied incrementally, by the timestamps that change when a row is written
+INCREMENTAL_COLUMNS: Dict[str, tuple] = {
+    'messages': ('created_at',),
+    'chats': ('updated_at',),
+    'assessment_attempts': ('created_at', 'graded_at'),
+    'mastery_progress': ('updated_at',),
+    'item_statistics': ('updated_at',),
+    'user_recommendations': ('computed_at',),
+    'response_cache': ('created_at', 'last_hit_at'),
+}
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_manifest(backup_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(backup_dir, 'manifest.json')) as f:
+        return json.load(f)
+
+
+def _latest_backup(dest: str) -> Optional[str]:
+    """The most recent finished backup under ``dest``"""
+    finished = [os.path.join(dest, name) for name in os.listdir(dest)
+                if os.path.isfile(os.path.join(dest, name, 'manifest.json'))] if os.path.isdir(dest) else []
+    return max(finished, key=lambda path: _read_manifest(path)['createdAt'], default=None)
+
+
+# Backup ------------------------------------------------------------------
+
+def _dump_table(conn: Connection, table: Table, backup_dir: str, chunk_rows: int,
+                since: Optional[datetime]) -> Dict[str, Any]:
+    watermark_columns = INCREMENTAL_COLUMNS.get(table.name, ())
+    query = select(table)
+    if since is not None and watermark_columns:
+        query = query.where(or_(*[table.c[column] >= since for column in watermark_columns]))
+
+    os.makedirs(os.path.join(backup_dir, table.name), exist_ok=True)
+    entry = {'rows': 0, 'since': since.isoformat() if since and watermark_columns else None,
+             'watermarkColumns': list(watermark_columns), 'watermark': None, 'chunks': []}
+    watermark = None
+    result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(query)
+    keys = list(result.keys())
+    for number, chunk in enumerate(result.partitions()):
+        lines = []
+        for row in chunk:
+            values = dict(zip(keys, row))
+            for column in watermark_columns:
+                if values[column] is not None and (watermark is None or values[column] > watermark):
+                    watermark = values[column]
+            lines.append(json.dumps(values, default=_json_default))
+        data = gzip.compress(('\n'.join(lines) + '\n').encode(), compresslevel=COMPRESS_LEVEL)
+        name = f"{table.name}/part-{number:05d}.ndjson.gz"
+        with open(os.path.join(backup_dir, name), 'wb') as f:
+            f.write(data)
+        entry['chunks'].append({'file': name, 'rows': len(chunk), 'bytes': len(data),
+                                'sha256': hashlib.sha256(data).hexdigest()})
+        entry['rows'] += len(chunk)
+    entry['watermark'] = watermark.isoformat() if watermark else None
+    return entry
+
+
+def backup(engine: Engine, dest: str, incremental: bool = False, base_dir: Optional[str] = None,
+           jobs: int = DEFAULT_JOBS, chunk_rows: int = CHUNK_ROWS) -> str:
+    """Write a backup under ``dest``; returns its directory"""
+    base = None
+    if incremental or base_dir:
+        base_dir = base_dir or _latest_backup(dest)
+        if base_dir is None:
+            raise ValueError(f"No finished backup in {dest} to base an incremental backup on")
+        base = _read_manifest(base_dir)
+
+    started = datetime.utcnow()
+    kind = 'incremental' if base else 'full'
+    name = f"studybuddy_{started:%Y%m%d_%H%M%S}_{kind}"
+    backup_dir = os.path.join(dest, name)
+    partial_dir = backup_dir + '.partial'
+    os.makedirs(partial_dir)
+
+    def since(table: Table) -> Optional[datetime]:
+        watermark = base and base['tables'].get(table.name, {}).get('watermark')
+        return datetime.fromisoformat(watermark) - INCREMENTAL_OVERLAP if watermark else None
+
+    tables = Base.metadata.sorted_tables
+    entries: Dict[str, Dict[str, Any]] = {}
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as coordinator:
+            coordinator = coordinator.execution_options(isolation_level='REPEATABLE READ')
+            snapshot = coordinator.execute(text("SELECT pg_export_snapshot()")).scalar()
+
+            def dump(table: Table) -> Dict[str, Any]:
+                with engine.connect() as conn:
+                    conn = conn.execution_options(isolation_level='REPEATABLE READ')
+                    conn.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot}'"))
+                    return _dump_table(conn, table, partial_dir, chunk_rows, since(table))
+
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                entries = dict(zip([table.name for table in tables], pool.map(dump, tables)))
+    else:
+        from models import db_manager
+        read_engine = db_manager.read_engine if db_manager.engine is engine else engine
+        with read_engine.connect() as conn:
+            for table in tables:
+                entries[table.name] = _dump_table(conn, table, partial_dir, chunk_rows, since(table))
+
+    if base:
+        # Keep the previous watermark for tables without new rows
+        for table_name, entry in entries.items():
+            if entry['watermark'] is None and entry['watermarkColumns']:
+                entry['watermark'] = base['tables'].get(table_name, {}).get('watermark')
+
+    manifest = {
+        'format': 'studybuddy-backup',
+        'version': FORMAT_VERSION,
+        'kind': kind,
+        'base': os.path.basename(os.path.normpath(base_dir)) if base else None,
+        'createdAt': started.isoformat(),
+        'durationSeconds': round((datetime.utcnow() - started).total_seconds(), 1),
+        'backend': engine.dialect.name,
+        'schemaVersion': current_version(engine),
+        'tables': entries,
+    }
+    with open(os.path.join(partial_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(partial_dir, backup_dir)
+    return backup_dir
+
+
+def verify(backup_dir: str) -> List[str]:
+    """Chunks whose checksum or presence does not match the manifest"""
+    problems = []
+    for entry in _read_manifest(backup_dir)['tables'].values():
+        for chunk in entry['chunks']:
+            path = os.path.join(backup_dir, chunk['file'])
+            if not os.path.isfile(path):
+                problems.append(f"{chunk['file']}: missing")
+            elif _sha256(path) != chunk['sha256']:
+                problems.append(f"{chunk['file']}: checksum mismatch")
+    return problems
+
+
+# Restore -----------------------------------------------------------------
+
+def _backup_chain(backup_dir: str) -> List[str]:
+    """Directories to apply, the full backup first"""
+    chain = [backup_dir]
+    while True:
+        manifest = _read_manifest(chain[0])
+        if manifest['kind'] == 'full':
+            return chain
+        chain.insert(0, os.path.join(os.path.dirname(os.path.normpath(chain[0])), manifest['base']))
+
+
+def _load_levels() -> List[List[Table]]:
+    """Tables grouped so each group only references tables in earlier groups"""
+    levels: List[List[Table]] = []
+    placed: Dict[str, int] = {}
+    for table in Base.metadata.sorted_tables:
+        parents = {fk.column.table.name for fk in table.foreign_keys} - {table.name}
+        level = max((placed[parent] + 1 for parent in parents), default=0)
+        placed[table.name] = level
+        while len(levels) <= level:
+            levels.append([])
+        levels[level].append(table)
+    return levels
+
+
+def _decoder(table: Table) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Turns the JSON values of a row back into what the column types expect"""
+    parsers = {}
+    for column in table.columns:
+        if isinstance(column.type, DateTime):
+            parsers[column.name] = datetime.fromisoformat
+        elif isinstance(column.type, Date):
+            parsers[column.name] = date.fromisoformat
+
+    def decode(row: Dict[str, Any]) -> Dict[str, Any]:
+        for name, parse in parsers.items():
+            if row.get(name) is not None:
+                row[name] = parse(row[name])
+        return row
+    return decode
+
+
+def _load_chunk(engine: Engine, table: Table, path: str, upsert: bool) -> int:
+    decode = _decoder(table)
+    with gzip.open(path, 'rt') as f:
+        rows = [decode(json.loads(line)) for line in f if line.strip()]
+    if not rows:
+        return 0
+    if upsert:
+        stmt = dialect_insert(engine, table)
+        keys = [column.name for column in table.primary_key.columns]
+        updates = {column.name: stmt.excluded[column.name] for column in table.columns if column.name not in keys}
+        stmt = (stmt.on_conflict_do_update(index_elements=keys, set_=updates) if updates
+                else stmt.on_conflict_do_nothing(index_elements=keys))
+    else:
+        stmt = insert(table)
+    with engine.begin() as conn:
+        conn.execute(stmt, rows)
+    return len(rows)
+
+
+def _secondary_indexes(conn: Connection, table: Table) -> List[tuple]:
+    """(name, CREATE statement) of the non-unique indexes on ``table``"""
+    if conn.dialect.name == 'postgresql':
+        return [tuple(row) for row in conn.execute(text("""
+            SELECT i.indexname, i.indexdef FROM pg_indexes i
+            WHERE i.schemaname = current_schema() AND i.tablename = :table
+              AND i.indexdef NOT LIKE 'CREATE UNIQUE%'
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = (quote_ident(i.schemaname) || '.' || quote_ident(i.indexname))::regclass)
+        """), {'table': table.name})]
+    return [tuple(row) for row in conn.execute(text(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :table "
+        "AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%'"
+    ), {'table': table.name})]
+
+
+def restore(engine: Engine, backup_dir: str, jobs: int = DEFAULT_JOBS, truncate: bool = False,
+            progress: Callable[[str], None] = lambda message: None) -> Dict[str, int]:
+    """Load a backup (and the backups it builds on) into ``engine``; returns rows loaded per table"""
+    from models import db_manager
+
+    chain = _backup_chain(backup_dir)
+    for directory in chain:
+        problems = verify(directory)
+        if problems:
+            raise ValueError(f"{directory} is damaged: {'; '.join(problems[:5])}")
+
+    if engine is db_manager.engine:
+        db_manager.create_tables()
+    manifests = [_read_manifest(directory) for directory in chain]
+    schema_version = current_version(engine)
+    if manifests[-1]['schemaVersion'] != schema_version:
+        raise ValueError(f"Backup has schema version {manifests[-1]['schemaVersion']}, "
+                         f"the database {schema_version}; run both at the same release")
+
+    tables = Base.metadata.sorted_tables
+    with engine.begin() as conn:
+        if truncate:
+            if engine.dialect.name == 'postgresql':
+                conn.execute(text(f"TRUNCATE TABLE {', '.join(table.name for table in tables)}"))
+            else:
+                for table in reversed(tables):
+                    conn.execute(table.delete())
+        elif any(conn.execute(select(func.count()).select_from(table)).scalar() for table in tables):
+            raise ValueError("The database already has data; restore with --truncate to replace it")
+        indexes = {table.name: _secondary_indexes(conn, table) for table in tables}
+        for table_indexes in indexes.values():
+            for name, _ddl in table_indexes:
+                conn.execute(text(f'DROP INDEX "{name}"'))
+        if engine.dialect.name == 'postgresql':
+            for table in tables:
+                conn.execute(text(f'ALTER TABLE "{table.name}" DISABLE TRIGGER USER'))
+    progress(f"Dropped {sum(map(len, indexes.values()))} secondary indexes")
+
+    try:
+        loaded = _load_chain(engine, chain, manifests, indexes, jobs, progress)
+    finally:
+        if engine.dialect.name == 'postgresql':
+            with engine.begin() as conn:
+                for table in tables:
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ENABLE TRIGGER USER'))
+
+    with engine.begin() as conn:
+        if len(chain) > 1:
+            progress(f"Recomputed summaries for {rebuild_chat_summaries(conn)} chats")
+        conn.execute(text("ANALYZE"))
+    return loaded
+
+
+def _load_chain(engine: Engine, chain: List[str], manifests: List[Dict[str, Any]],
+                indexes: Dict[str, List[tuple]], jobs: int, progress: Callable[[str], None]) -> Dict[str, int]:
+    loaded = {table.name: 0 for table in Base.metadata.sorted_tables}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for position, (directory, manifest) in enumerate(zip(chain, manifests)):
+            upsert = position > 0
+            for level in _load_levels():
+                work = [(table, os.path.join(directory, chunk['file']))
+                        for table in level for chunk in manifest['tables'].get(table.name, {}).get('chunks', [])]
+                for (table, _path), rows in zip(work, pool.map(
+                        lambda item: _load_chunk(engine, item[0], item[1], upsert), work)):
+                    loaded[table.name] += rows
+            progress(f"Loaded {os.path.basename(directory)}")
+            if position == 0:
+                def rebuild(statements: List[tuple]):
+                    with engine.begin() as conn:
+                        for _name, ddl in statements:
+                            conn.execute(text(ddl))
+                list(pool.map(rebuild, [statements for statements in indexes.values() if statements]))
+                progress("Rebuilt secondary indexes")
+    return loaded
+
+
+def main(argv: Optional[List[str]] = None):
+    from models import db_manager
+
+    parser = argparse.ArgumentParser(description='Parallel logical backup and restore')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backup_parser = subparsers.add_parser('backup')
+    backup_parser.add_argument('--dest', default=os.getenv('BACKUP_DIR', 'backups'))
+    backup_parser.add_argument('--incremental', action='store_true', help='Only rows changed since the latest backup in --dest')
+    backup_parser.add_argument('--base', help='Backup directory to base the incremental backup on')
+    backup_parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS)
+    backup_parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    restore_parser = subparsers.add_parser('restore')
+    restore_parser.add_argument('backup_dir')
+    restore_parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS)
+    restore_parser.add_argument('--truncate', action='store_true', help='Delete existing data first')
+    verify_parser = subparsers.add_parser('verify')
+    verify_parser.add_argument('backup_dir')
+    args = parser.parse_args(argv)
+
+    if args.command == 'backup':
+        backup_dir = backup(db_manager.engine, args.dest, incremental=args.incremental, base_dir=args.base,
+                            jobs=args.jobs, chunk_rows=args.chunk_rows)
+        manifest = _read_manifest(backup_dir)
+        rows = sum(entry['rows'] for entry in manifest['tables'].values())
+        print(f"✓ {manifest['kind'].capitalize()} backup of {rows} rows in {manifest['durationSeconds']}s: {backup_dir}")
+    elif args.command == 'restore':
+        loaded = restore(db_manager.engine, args.backup_dir, jobs=args.jobs, truncate=args.truncate,
+                         progress=lambda message: print(f"  {message}"))
+        print(f"✓ Restored {sum(loaded.values())} rows into {len(loaded)} tables")
+    else:
+        problems = verify(args.backup_dir)
+        for problem in problems:
+            print(f"✗ {problem}")
+        if not problems:
+            print(f"✓ {args.backup_dir} matches its manifest")
+
+
+if __name__ == '__main__':
+    main()
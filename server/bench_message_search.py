@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark for message full-text search
+
+Seeds synthetic chats and messages into the database pointed to by
+DATABASE_URL (use a scratch database!) and reports search latency
+percentiles against the 50 ms target.
+
+    DATABASE_URL=postgresql://... python bench_message_search.py --messages 2000000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import insert, text
+
+from models import db_manager, User, Chat, Message, generate_uuid
+from message_search import ensure_search_index, search_messages
+
+TARGET_MS = 50.0
+
+VOCABULARY = (
+    "fraction decimal multiply divide add subtract equation variable triangle angle "
+    "perimeter area volume graph slope intercept prime factor multiple denominator numerator "
+    "percent ratio probability mean median mode estimate rounding place value thousand "
+    "photosynthesis planet gravity energy sentence paragraph noun verb adjective history "
+    "president colony river mountain continent weather cloud rain ecosystem habitat cell"
+).split()
+
+
+def seed(message_count: int, users: int, chats_per_user: int, batch_size: int = 5000):
+    rng = random.Random(42)
+    user_ids = [generate_uuid() for _ in range(users)]
+    chat_ids = []
+    with db_manager.engine.begin() as conn:
+        conn.execute(insert(User), [
+            {'id': user_id, 'name': f'Bench {i}', 'email': f'bench-{user_id}@example.com',
+             'age': 10, 'grade': '4'}
+            for i, user_id in enumerate(user_ids)
+        ])
+        chat_rows = []
+        for user_id in user_ids:
+            for _ in range(chats_per_user):
+                chat_id = generate_uuid()
+                chat_ids.append((chat_id, user_id))
+                chat_rows.append({'id': chat_id, 'title': 'Benchmark chat', 'user_id': user_id})
+        conn.execute(insert(Chat), chat_rows)
+
+    inserted = 0
+    while inserted < message_count:
+        rows = []
+        for _ in range(min(batch_size, message_count - inserted)):
+            chat_id, _user_id = rng.choice(chat_ids)
+            words = rng.choices(VOCABULARY, k=rng.randint(8, 60))
+            rows.append({'id': generate_uuid(), 'chat_id': chat_id,
+                         'role': rng.choice(('user', 'assistant')), 'content': ' '.join(words)})
+        with db_manager.engine.begin() as conn:
+            conn.execute(insert(Message), rows)
+        inserted += len(rows)
+        print(f"\rSeeded {inserted}/{message_count} messages", end='', file=sys.stderr)
+    print(file=sys.stderr)
+
+    if db_manager.engine.dialect.name == 'postgresql':
+        with db_manager.engine.begin() as conn:
+            conn.execute(text("ANALYZE messages"))
+            conn.execute(text("ANALYZE chats"))
+    return chat_ids
+
+
+def run_queries(chat_ids, queries: int):
+    rng = random.Random(7)
+    timings = {'global': [], 'user': [], 'chat': []}
+    session = db_manager.get_session()
+    try:
+        for i in range(queries):
+            terms = ' '.join(rng.sample(VOCABULARY, rng.randint(1, 3)))
+            chat_id, user_id = rng.choice(chat_ids)
+            scope = ('global', 'user', 'chat')[i % 3]
+            kwargs = {'user_id': user_id} if scope == 'user' else {'chat_id': chat_id} if scope == 'chat' else {}
+            start = time.perf_counter()
+            search_messages(session, terms, limit=20, offset=rng.choice((0, 0, 20)), **kwargs)
+            timings[scope].append((time.perf_counter() - start) * 1000)
+    finally:
+        session.close()
+    return timings
+
+
+def report(timings):
+    ok = True
+    for scope, values in timings.items():
+        values.sort()
+        p50 = statistics.median(values)
+        p95 = values[int(len(values) * 0.95) - 1]
+        p99 = values[int(len(values) * 0.99) - 1]
+        within = p95 <= TARGET_MS
+        ok = ok and within
+        print(f"{scope:>6}: n={len(values)} p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms "
+              f"{'OK' if within else 'OVER'} (target p95 <= {TARGET_MS:.0f}ms)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--chats-per-user', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=300)
+    args = parser.parse_args()
+
+    db_manager.create_tables()
+    ensure_search_index(db_manager.engine)
+    chat_ids = seed(args.messages, args.users, args.chats_per_user)
+    sys.exit(0 if report(run_queries(chat_ids, args.queries)) else 1)
+
+
+if __name__ == '__main__':
+    main()
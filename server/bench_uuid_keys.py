@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark for UUID key schemes on messages- and assessment_attempts-shaped tables
+
+Creates scratch ``bench_<table>_<scheme>`` tables with the same keys and
+indexes as ``messages`` and ``assessment_attempts`` in the database pointed
+to by DATABASE_URL, inserts the same rows keyed by each scheme, and reports
+insert throughput and index sizes. The scratch tables are dropped
+afterwards unless ``--keep`` is given.
+
+Schemes: random uuid4 text (the old keys), time-ordered uuid7 text, and on
+PostgreSQL uuid7 as a native 16-byte ``uuid``.
+
+    DATABASE_URL=postgresql://... python bench_uuid_keys.py --rows 500000
+"""
+import argparse
+import random
+import time
+import uuid
+from typing import Dict, List
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, Index, Integer, MetaData, String, Table, Text, func, insert, text
+)
+from sqlalchemy.dialects import postgresql
+
+from models import db_manager, uuid7
+
+VOCABULARY = "fraction decimal multiply divide prime factor photosynthesis planet gravity energy".split()
+
+
+def _schemes(dialect: str):
+    schemes = {
+        'uuid4_text': (lambda: str(uuid.uuid4()), String(36)),
+        'uuid7_text': (lambda: str(uuid7()), String(36)),
+    }
+    if dialect == 'postgresql':
+        schemes['uuid7_native'] = (lambda: str(uuid7()), postgresql.UUID(as_uuid=False))
+    return schemes
+
+
+def _tables(metadata: MetaData, scheme: str, key_type) -> Dict[str, Table]:
+    messages = Table(
+        f'bench_messages_{scheme}', metadata,
+        Column('id', key_type, primary_key=True),
+        Column('chat_id', key_type, nullable=False),
+        Column('role', String, nullable=False),
+        Column('content', Text, nullable=False),
+        Column('created_at', DateTime, server_default=func.now()),
+        Index(f'ix_bench_messages_{scheme}_chat', 'chat_id', 'created_at'),
+    )
+    attempts = Table(
+        f'bench_attempts_{scheme}', metadata,
+        Column('id', key_type, primary_key=True),
+        Column('user_id', key_type, nullable=False),
+        Column('item_id', key_type, nullable=False),
+        Column('sol_id', String, nullable=False),
+        Column('is_correct', Boolean, nullable=False),
+        Column('score', Float, nullable=False),
+        Column('duration_seconds', Integer),
+        Column('created_at', DateTime, server_default=func.now()),
+        Index(f'ix_bench_attempts_{scheme}_user_item', 'user_id', 'item_id'),
+    )
+    return {'messages': messages, 'assessment_attempts': attempts}
+
+
+def _rows(kind: str, count: int, new_id, parents: List[str], rng: random.Random) -> List[dict]:
+    if kind == 'messages':
+        return [{'id': new_id(), 'chat_id': rng.choice(parents), 'role': rng.choice(('user', 'assistant')),
+                 'content': ' '.join(rng.choices(VOCABULARY, k=rng.randint(8, 40)))} for _ in range(count)]
+    return [{'id': new_id(), 'user_id': rng.choice(parents), 'item_id': rng.choice(parents),
+             'sol_id': 'mathematics-4-4.2a', 'is_correct': rng.random() < 0.6, 'score': 1.0,
+             'duration_seconds': rng.randint(5, 120)} for _ in range(count)]
+
+
+def _index_sizes(conn, table: Table) -> Dict[str, int]:
+    if conn.dialect.name == 'postgresql':
+        rows = conn.execute(text(
+            "SELECT indexrelid::regclass::text, pg_relation_size(indexrelid) FROM pg_index "
+            "WHERE indrelid = CAST(:table AS regclass)"
+        ), {'table': table.name}).all()
+    else:
+        rows = conn.execute(text(
+            "SELECT name, sum(pgsize) FROM dbstat WHERE name IN "
+            "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table) GROUP BY name"
+        ), {'table': table.name}).all()
+    return {name: int(size) for name, size in rows}
+
+
+def run(rows: int, batch_size: int, keep: bool):
+    engine = db_manager.engine
+    metadata = MetaData()
+    results = []
+    for scheme, (new_id, key_type) in _schemes(engine.dialect.name).items():
+        tables = _tables(metadata, scheme, key_type)
+        metadata.create_all(engine, tables=list(tables.values()))
+        for kind, table in tables.items():
+            rng = random.Random(42)  # Same payloads for every scheme
+            parents = [new_id() for _ in range(1000)]
+            started = time.perf_counter()
+            for start in range(0, rows, batch_size):
+                with engine.begin() as conn:
+                    conn.execute(insert(table), _rows(kind, min(batch_size, rows - start), new_id, parents, rng))
+            elapsed = time.perf_counter() - started
+            with engine.begin() as conn:
+                if engine.dialect.name == 'postgresql':
+                    conn.execute(text(f"ANALYZE {table.name}"))
+                sizes = _index_sizes(conn, table)
+            results.append({'table': kind, 'scheme': scheme, 'rowsPerSecond': rows / elapsed, 'indexes': sizes})
+    if not keep:
+        metadata.drop_all(engine)
+    return results
+
+
+def _label(index_name: str) -> str:
+    return 'pkey' if index_name.endswith('_pkey') or index_name.startswith('sqlite_autoindex') else 'secondary'
+
+
+def report(results):
+    for result in results:
+        indexes = ', '.join(f"{_label(name)}={size / 1024 / 1024:.1f}MiB"
+                            for name, size in sorted(result['indexes'].items(), key=lambda kv: _label(kv[0])))
+        print(f"{result['table']:>19} {result['scheme']:>12}: {result['rowsPerSecond']:>9.0f} rows/s  {indexes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch tables for inspection')
+    args = parser.parse_args()
+    report(run(args.rows, args.batch_size, args.keep))
+
+
+if __name__ == '__main__':
+    main()
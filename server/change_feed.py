@@ -0,0 +1,282 @@
+"""
+Live feed of newly created chat messages for server-sent events
+
+On PostgreSQL an ``AFTER INSERT`` trigger on ``messages`` (schema migration
+8) sends ``pg_notify('message_events', {id, chatId, userId})``, so messages
+written by any process, including the Node server, are announced once
+their transaction commits. A listener thread holds one ``LISTEN``
+connection per service process, loads each announced message once and fans
+it out to the local subscribers.
+
+SQLite has no NOTIFY, and only this process writes to it, so an ORM hook
+collects the messages inserted in a session and dispatches them once the
+session commits.
+
+Subscribers are bounded queues keyed by ``chat:<id>`` or ``user:<id>``. A
+slow client whose queue is full is disconnected rather than buffering
+without limit; it reconnects with ``Last-Event-ID`` and catches up via
+``replay_messages``, which pages through everything it missed. The stream
+subscribes before it replays, so nothing committed in between is lost, and
+live events already sent by the replay are skipped.
+"""
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import and_, event, or_, select as sql_select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from message_context import serialize_message
+from models import Chat, Message
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'message_events'
+QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15
+MAX_SUBSCRIBERS = int(os.getenv('CHANGE_FEED_MAX_SUBSCRIBERS', '200'))
+REPLAY_PAGE_SIZE = 100
+
+POSTGRES_TRIGGER_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION notify_message_created() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{CHANNEL}', json_build_object(
+            'id', NEW.id,
+            'chatId', NEW.chat_id,
+            'userId', (SELECT user_id FROM chats WHERE id = NEW.chat_id)
+        )::text);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS messages_notify_created ON messages",
+    "CREATE TRIGGER messages_notify_created AFTER INSERT ON messages "
+    "FOR EACH ROW EXECUTE FUNCTION notify_message_created()",
+]
+
+
+def ensure_change_feed_trigger(engine: Engine):
+    """Install the NOTIFY trigger on PostgreSQL (SQLite uses the in-process hook instead)"""
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as conn:
+        for statement in POSTGRES_TRIGGER_DDL:
+            conn.execute(text(statement))
+
+
+class Subscription:
+    def __init__(self, keys: Set[str]):
+        self.keys = keys
+        self.queue: 'queue.Queue[Optional[Dict[str, Any]]]' = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = False
+
+
+class ChangeFeed:
+    """Process-wide fan-out of message events to SSE subscribers"""
+
+    def __init__(self, session_factory, engine: Engine):
+        self.session_factory = session_factory
+        self.engine = engine
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.published = 0
+
+    def _count(self) -> int:
+        return len({sub for subs in self._subscribers.values() for sub in subs})
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def subscribe(self, chat_id: Optional[str] = None, user_id: Optional[str] = None) -> Optional[Subscription]:
+        """A new subscription, or None when MAX_SUBSCRIBERS are already connected"""
+        keys = {f"chat:{chat_id}"} if chat_id else {f"user:{user_id}"}
+        subscription = Subscription(keys)
+        with self._lock:
+            if self._count() >= MAX_SUBSCRIBERS:
+                return None
+            for key in keys:
+                self._subscribers.setdefault(key, set()).add(subscription)
+        self._ensure_listener()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for key in subscription.keys:
+                subs = self._subscribers.get(key)
+                if subs is not None:
+                    subs.discard(subscription)
+                    if not subs:
+                        del self._subscribers[key]
+
+    def _targets(self, chat_id: str, user_id: Optional[str]) -> Set[Subscription]:
+        with self._lock:
+            return set(self._subscribers.get(f"chat:{chat_id}", ())) | set(self._subscribers.get(f"user:{user_id}", ()))
+
+    def dispatch(self, announcements: List[Dict[str, Any]]):
+        """Load the announced messages once and deliver them to matching subscribers"""
+        wanted = [a for a in announcements if self._targets(a['chatId'], a.get('userId'))]
+        if not wanted:
+            return
+        session = self.session_factory()
+        try:
+            messages = {
+                str(message.id): serialize_message(message)
+                for message in session.query(Message).filter(Message.id.in_([a['id'] for a in wanted]))
+            }
+        finally:
+            session.close()
+        for announcement in wanted:
+            message = messages.get(str(announcement['id']))
+            if message is None:
+                continue
+            payload = {'type': 'message.created', 'userId': announcement.get('userId'), 'message': message}
+            for subscription in self._targets(announcement['chatId'], announcement.get('userId')):
+                try:
+                    subscription.queue.put_nowait(payload)
+                except queue.Full:
+                    subscription.dropped = True  # Client falls too far behind; it reconnects and replays
+                    self.unsubscribe(subscription)
+            self.published += 1
+
+    # PostgreSQL LISTEN ---------------------------------------------------
+
+    def _ensure_listener(self):
+        if self.engine.dialect.name != 'postgresql' or (self._listener and self._listener.is_alive()):
+            return
+        with self._lock:
+            if self._listener and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='change-feed-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                connection = raw.driver_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                backoff = 1.0
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], KEEPALIVE_SECONDS) == ([], [], []):
+                        continue
+                    connection.poll()
+                    announcements = []
+                    while connection.notifies:
+                        announcements.append(json.loads(connection.notifies.pop(0).payload))
+                    if announcements:
+                        self.dispatch(announcements)
+            except Exception:
+                logger.exception("Change feed listener failed; reconnecting in %.0fs", backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if raw is not None:
+                    raw.invalidate()  # LISTEN state must not leak back into the pool
+
+    def stop(self):
+        self._stop.set()
+
+
+def install_sqlite_hook(feed: ChangeFeed):
+    """Dispatch messages inserted through the ORM once their session commits (non-PostgreSQL only)"""
+    if feed.engine.dialect.name == 'postgresql':
+        return
+
+    @event.listens_for(Message, 'after_insert')
+    def _message_inserted(_mapper, connection, target):
+        session = Session.object_session(target)
+        if session is None:
+            return
+        user_id = connection.execute(sql_select(Chat.user_id).where(Chat.id == target.chat_id)).scalar()
+        session.info.setdefault('change_feed', []).append(
+            {'id': target.id, 'chatId': target.chat_id, 'userId': user_id}
+        )
+
+    @event.listens_for(Session, 'after_commit')
+    def _session_committed(session):
+        announcements = session.info.pop('change_feed', None)
+        if announcements:
+            feed.dispatch(announcements)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _session_rolled_back(session):
+        session.info.pop('change_feed', None)
+
+
+def messages_since(session: Session, last_event_id: str, chat_id: Optional[str] = None,
+                   user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """The first ``REPLAY_PAGE_SIZE`` messages in scope created after ``last_event_id``"""
+    if session.query(Message.id).filter(Message.id == last_event_id).first() is None:
+        return []
+    # Compared in SQL against the stored value: SQLite keeps server timestamps as
+    # whole-second text, which a bound datetime parameter would not match
+    last = sql_select(Message.created_at).where(Message.id == last_event_id).scalar_subquery()
+    # Ties on created_at fall back to the time-ordered id
+    query = session.query(Message).filter(or_(
+        Message.created_at > last, and_(Message.created_at == last, Message.id > last_event_id)
+    ))
+    if chat_id:
+        query = query.filter(Message.chat_id == chat_id)
+    else:
+        query = query.join(Chat, Chat.id == Message.chat_id).filter(Chat.user_id == user_id)
+    return [serialize_message(message)
+            for message in query.order_by(Message.created_at, Message.id).limit(REPLAY_PAGE_SIZE)]
+
+
+def replay_messages(session_factory: Callable[[], Session], last_event_id: str, chat_id: Optional[str] = None,
+                    user_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Every message in scope after ``last_event_id``, a page per short-lived session"""
+    while True:
+        session = session_factory()
+        try:
+            page = messages_since(session, last_event_id, chat_id=chat_id, user_id=user_id)
+        finally:
+            session.close()
+        yield from page
+        if len(page) < REPLAY_PAGE_SIZE:
+            return
+        last_event_id = page[-1]['id']
+
+
+def format_event(payload: Dict[str, Any]) -> str:
+    return f"id: {payload['message']['id']}\nevent: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+
+
+def event_stream(subscription: Subscription, replay: Iterable[Dict[str, Any]],
+                 user_id: Optional[str] = None) -> Iterator[str]:
+    """SSE body: replayed messages, then live events with periodic keepalive comments
+
+    ``subscription`` must be taken before ``replay`` starts reading, so a
+    message committed meanwhile is queued as well as replayed; the queued
+    copy is skipped. The caller releases the subscription when the response
+    closes, since a generator that never started never runs its cleanup.
+    """
+    yield "retry: 3000\n\n"
+    replayed: Set[str] = set()
+    for message in replay:
+        replayed.add(str(message['id']))
+        yield format_event({'type': 'message.created', 'userId': user_id, 'message': message})
+    while not subscription.dropped:
+        try:
+            payload = subscription.queue.get(timeout=KEEPALIVE_SECONDS)
+        except queue.Empty:
+            yield ": keepalive\n\n"
+            continue
+        if str(payload['message']['id']) in replayed:
+            continue
+        yield format_event(payload)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Denormalized message summaries on ``chats`` for the chat sidebar
+
+Each chat carries ``message_count``, ``last_message_at`` and
+``last_message_preview``, so listing a user's chats is one query over the
+(user_id, updated_at) index with no per-chat lookups in ``messages``.
+
+On PostgreSQL an ``AFTER INSERT OR DELETE`` trigger on ``messages``
+(schema migration 14) keeps them current in the writing transaction, so
+messages written by the Node server are counted too. Elsewhere a session
+``after_flush`` hook does the same for writes made through the ORM:
+inserted messages add to the count and replace the preview with one UPDATE
+per chat, and deletions recompute the chat from its newest remaining
+message over the (chat_id, created_at) index. ``rebuild`` resynchronizes
+every chat.
+
+    python chat_summaries.py rebuild
+"""
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, func, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from models import Chat, Message
+
+PREVIEW_LENGTH = 140
+
+chats = Chat.__table__
+
+POSTGRES_TRIGGER_DDL = [
+    # Same text as message_preview
+    f"""
+    CREATE OR REPLACE FUNCTION chat_message_preview(content text) RETURNS text AS $$
+        SELECT CASE WHEN length(collapsed) <= {PREVIEW_LENGTH} THEN collapsed
+                    ELSE rtrim(left(collapsed, {PREVIEW_LENGTH - 1})) || '…' END
+        FROM (SELECT btrim(regexp_replace(content, '\\s+', ' ', 'g')) AS collapsed) AS normalized
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION update_chat_summary() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            UPDATE chats SET
+                message_count = message_count + 1,
+                last_message_preview = CASE WHEN last_message_at IS NULL OR NEW.created_at >= last_message_at
+                    THEN chat_message_preview(NEW.content) ELSE last_message_preview END,
+                last_message_at = GREATEST(last_message_at, NEW.created_at),
+                updated_at = now()
+            WHERE id = NEW.chat_id;
+            RETURN NEW;
+        END IF;
+        -- Only a removed newest message needs a lookup; removing a message does not move the chat up the list
+        UPDATE chats SET
+            message_count = GREATEST(message_count - 1, 0),
+            last_message_at = CASE WHEN OLD.created_at < last_message_at THEN last_message_at
+                ELSE (SELECT created_at FROM messages WHERE chat_id = OLD.chat_id
+                      ORDER BY created_at DESC, id DESC LIMIT 1) END,
+            last_message_preview = CASE WHEN OLD.created_at < last_message_at THEN last_message_preview
+                ELSE chat_message_preview((SELECT content FROM messages WHERE chat_id = OLD.chat_id
+                                           ORDER BY created_at DESC, id DESC LIMIT 1)) END
+        WHERE id = OLD.chat_id;
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS messages_chat_summary ON messages",
+    "CREATE TRIGGER messages_chat_summary AFTER INSERT OR DELETE ON messages "
+    "FOR EACH ROW EXECUTE FUNCTION update_chat_summary()",
+]
+
+
+def message_preview(content: Optional[str]) -> Optional[str]:
+    """Single-line prefix of a message for the sidebar"""
+    if content is None:
+        return None
+    preview = ' '.join(content.split())
+    return preview if len(preview) <= PREVIEW_LENGTH else preview[:PREVIEW_LENGTH - 1].rstrip() + '…'
+
+
+def _created_at(message_id):
+    # Copied in SQL so last_message_at keeps the stored value (and format on SQLite) of messages.created_at
+    return select(Message.created_at).where(Message.id == message_id).scalar_subquery()
+
+
+def refresh_chat_summary(connection: Connection, chat_id) -> None:
+    """Recompute one chat's summary from its messages"""
+    count = connection.execute(
+        select(func.count()).select_from(Message).where(Message.chat_id == chat_id)
+    ).scalar()
+    latest = connection.execute(
+        select(Message.id, Message.content).where(Message.chat_id == chat_id)
+        .order_by(Message.created_at.desc(), Message.id.desc()).limit(1)
+    ).first()
+    connection.execute(update(chats).where(chats.c.id == chat_id).values(
+        message_count=count,
+        last_message_at=_created_at(latest.id) if latest else None,
+        last_message_preview=message_preview(latest.content) if latest else None,
+        updated_at=chats.c.updated_at,  # Removing a message does not move the chat up the list
+    ))
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_chat_summaries(session: Session, _flush_context):
+    if session.get_bind().dialect.name == 'postgresql':
+        return  # Maintained by the messages trigger
+    added: Dict[object, List[Message]] = defaultdict(list)
+    for obj in session.new:
+        if isinstance(obj, Message):
+            added[obj.chat_id].append(obj)
+    deleted_chats = {obj.id for obj in session.deleted if isinstance(obj, Chat)}
+    changed = {obj.chat_id for obj in session.deleted if isinstance(obj, Message)} - deleted_chats
+    if not added and not changed:
+        return
+
+    connection = session.connection()
+    for chat_id, messages in added.items():
+        if chat_id in changed:
+            continue  # Recomputed below
+        latest = max(messages, key=lambda message: message.id)  # ids are time-ordered (UUIDv7)
+        connection.execute(update(chats).where(chats.c.id == chat_id).values(
+            message_count=chats.c.message_count + len(messages),
+            last_message_at=_created_at(latest.id),
+            last_message_preview=message_preview(latest.content),
+        ))
+    for chat_id in changed:
+        refresh_chat_summary(connection, chat_id)
+
+
+def rebuild_chat_summaries(connection: Connection, only_missing: bool = False) -> int:
+    """Recompute summaries for every chat (or those never summarized); returns the number of chats"""
+    query = select(chats.c.id)
+    if only_missing:
+        query = query.where(chats.c.last_message_at.is_(None))
+    chat_ids = connection.execute(query).scalars().all()
+    for chat_id in chat_ids:
+        refresh_chat_summary(connection, chat_id)
+    return len(chat_ids)
+
+
+def ensure_chat_summary_schema(engine: Engine):
+    """Add, index and backfill the summary columns on databases created before they existed"""
+    columns = {column['name'] for column in inspect(engine).get_columns('chats')}
+    with engine.begin() as conn:
+        if 'message_count' not in columns:
+            conn.execute(text("ALTER TABLE chats ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0"))
+        if 'last_message_at' not in columns:
+            conn.execute(text("ALTER TABLE chats ADD COLUMN last_message_at TIMESTAMP"))
+        if 'last_message_preview' not in columns:
+            conn.execute(text("ALTER TABLE chats ADD COLUMN last_message_preview VARCHAR"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chats_user_id_updated_at ON chats (user_id, updated_at)"))
+        rebuild_chat_summaries(conn, only_missing=True)
+
+
+def ensure_chat_summary_trigger(engine: Engine):
+    """Install the summary trigger on PostgreSQL and resynchronize chats written without it"""
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as conn:
+        for statement in POSTGRES_TRIGGER_DDL:
+            conn.execute(text(statement))
+        rebuild_chat_summaries(conn)
+
+
+def main(argv: Optional[List[str]] = None):
+    from models import db_manager
+
+    parser = argparse.ArgumentParser(description='Maintain chat sidebar summaries')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.parse_args(argv)
+
+    with db_manager.engine.begin() as conn:
+        print(f"✓ Rebuilt summaries for {rebuild_chat_summaries(conn)} chats")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Cohort rollups: per-grade, per-strand and per-standard aggregates for class views
+
+``cohort_rollups`` holds one row per (grade, strand, sol_id, day) with
+additive activity sums (attempts, correct, score ratio, duration) and
+mastery deltas (new students, change in the EWMA sum, net students per
+mastery level). Grading adds its deltas in the same transaction as the
+attempt, so a cohort report only reads rollup rows: its cost depends on the
+number of standards and days, not on the number of students.
+
+Attempts count toward the student's grade when they were graded, recorded
+on the attempt and on the mastery row. When a promoted student next
+answers a standard, their standing on it moves from the old grade's
+distribution to the new one.
+
+    python cohort_rollups.py rebuild    # recompute every row from assessment_attempts
+"""
+import argparse
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models import AssessmentAttempt, CohortRollup, MasteryProgress, SolStandard, User
+from sql_compat import dialect_insert
+
+SUM_COLUMNS = (
+    'attempt_count', 'correct_count', 'score_ratio_sum', 'duration_sum', 'duration_count',
+    'new_students', 'ewma_delta', 'beginning_delta', 'developing_delta', 'proficient_delta', 'advanced_delta',
+)
+LEVELS = ('beginning', 'developing', 'proficient', 'advanced')
+
+MasterySnapshot = Tuple[int, float, str]  # (attempt_count, ewma_score, mastery_level)
+RollupKey = Tuple[Optional[str], str, date]  # (grade, sol_id, day)
+
+
+def mastery_snapshot(progress: MasteryProgress) -> MasterySnapshot:
+    return progress.attempt_count, progress.ewma_score, progress.mastery_level
+
+
+def _deltas(is_correct: bool, score_ratio: float, duration_seconds: Optional[int],
+            before: MasterySnapshot, after: MasterySnapshot) -> Dict[str, float]:
+    deltas = dict.fromkeys(SUM_COLUMNS, 0)
+    deltas.update({
+        'attempt_count': 1,
+        'correct_count': 1 if is_correct else 0,
+        'score_ratio_sum': score_ratio,
+        'duration_sum': duration_seconds or 0,
+        'duration_count': 1 if duration_seconds is not None else 0,
+    })
+    if before[0]:
+        deltas['ewma_delta'] = after[1] - before[1]
+        deltas[f"{before[2]}_delta"] -= 1
+    else:
+        deltas['new_students'] = 1
+        deltas['ewma_delta'] = after[1]
+    deltas[f"{after[2]}_delta"] += 1
+    return deltas
+
+
+def _membership(state: MasterySnapshot, sign: int) -> Dict[str, float]:
+    """Deltas that add (sign=1) or remove (sign=-1) one student's mastery state from a rollup"""
+    deltas = dict.fromkeys(SUM_COLUMNS, 0)
+    deltas.update({'new_students': sign, 'ewma_delta': sign * state[1], f"{state[2]}_delta": sign})
+    return deltas
+
+
+def _attempt_deltas(rows: Dict[RollupKey, Dict[str, float]], sol_id: str, day: date,
+                    counted_in: Optional[str], grade: str, is_correct: bool, score_ratio: float,
+                    duration_seconds: Optional[int], before: MasterySnapshot, after: MasterySnapshot):
+    """Add one graded attempt to ``rows``, first moving the student's standing to ``grade`` if it changed
+
+    ``counted_in`` is the grade whose rollups hold the student's mastery
+    state for ``sol_id`` (None when it is in none), so a promoted student
+    leaves the old grade's distribution on the day of their first attempt
+    in the new grade instead of being counted in both.
+    """
+    if before[0] and counted_in != grade:
+        if counted_in is not None:
+            for column, value in _membership(before, -1).items():
+                rows[(counted_in, sol_id, day)][column] += value
+        for column, value in _membership(before, 1).items():
+            rows[(grade, sol_id, day)][column] += value
+    for column, value in _deltas(is_correct, score_ratio, duration_seconds, before, after).items():
+        rows[(grade, sol_id, day)][column] += value
+
+
+def _new_rows() -> Dict[RollupKey, Dict[str, float]]:
+    return defaultdict(lambda: dict.fromkeys(SUM_COLUMNS, 0))
+
+
+class RollupBatch:
+    """Collects one user's rollup deltas and upserts them with the grading transaction"""
+
+    def __init__(self, session: Session, user_id: str):
+        self.session = session
+        self.grade = session.query(User.grade).filter(User.id == user_id).scalar()
+        self.rows = _new_rows()
+
+    def add(self, attempt: AssessmentAttempt, day: date, before: MasterySnapshot, after: MasteryProgress):
+        """Count a graded ``attempt`` whose mastery went from ``before`` to ``after``
+
+        Stamps the student's current grade on the attempt and the mastery
+        row, which is what ``rebuild_rollups`` replays from.
+        """
+        if self.grade is None:
+            return
+        _attempt_deltas(self.rows, attempt.sol_id, day, after.grade, self.grade, attempt.is_correct,
+                        attempt.score / attempt.max_score, attempt.duration_seconds,
+                        before, mastery_snapshot(after))
+        attempt.grade = after.grade = self.grade
+
+    def flush(self):
+        if not self.rows:
+            return
+        strands = dict(self.session.query(SolStandard.id, SolStandard.strand).filter(
+            SolStandard.id.in_({sol_id for _grade, sol_id, _day in self.rows})
+        ))
+        upsert_rollups(self.session, (
+            {'grade': grade, 'strand': strands.get(sol_id, ''), 'sol_id': sol_id, 'day': day, **sums}
+            for (grade, sol_id, day), sums in self.rows.items()
+        ))
+        self.rows.clear()
+
+
+def upsert_rollups(session: Session, rows: Iterable[Dict[str, Any]]):
+    """Add ``rows`` onto existing rollup rows (caller commits)"""
+    rows = list(rows)
+    if not rows:
+        return
+    table = CohortRollup.__table__
+    stmt = dialect_insert(session, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.grade, table.c.strand, table.c.sol_id, table.c.day],
+        set_={column: table.c[column] + stmt.excluded[column] for column in SUM_COLUMNS}
+    )
+    session.execute(stmt, rows)
+
+
+def rebuild_rollups(session: Session, batch_size: int = 10000) -> int:
+    """Recompute every rollup by replaying graded attempts in the order they were graded
+
+    Mastery is folded per (user, standard) in ``coalesce(graded_at,
+    created_at)`` order, the order grading applied it (constructed responses
+    are graded after later MCQ attempts). Each attempt counts toward the grade
+    stamped on it when it was graded (the student's current grade for attempts
+    graded before grades were recorded), so a rebuild reproduces what grading
+    added incrementally.
+    """
+    from grading import EWMA_ALPHA, mastery_level  # grading imports this module
+
+    rows = _new_rows()
+    attempts = session.query(
+        AssessmentAttempt.user_id, AssessmentAttempt.sol_id, AssessmentAttempt.created_at,
+        AssessmentAttempt.is_correct, AssessmentAttempt.score, AssessmentAttempt.max_score,
+        AssessmentAttempt.duration_seconds, func.coalesce(AssessmentAttempt.grade, User.grade)
+    ).join(User, User.id == AssessmentAttempt.user_id).filter(
+        AssessmentAttempt.grading_status == 'graded'
+    ).order_by(
+        func.coalesce(AssessmentAttempt.graded_at, AssessmentAttempt.created_at), AssessmentAttempt.id
+    ).yield_per(batch_size)
+
+    state: Dict[Tuple[str, str], Tuple[MasterySnapshot, Optional[str]]] = {}
+    for user_id, sol_id, created_at, is_correct, score, max_score, duration, grade in attempts:
+        ratio = score / max_score if max_score else 0.0
+        before, counted_in = state.get((user_id, sol_id), ((0, 0.0, 'beginning'), None))
+        ewma = EWMA_ALPHA * ratio + (1 - EWMA_ALPHA) * before[1] if before[0] else ratio
+        after = (before[0] + 1, ewma, mastery_level(ewma))
+        state[(user_id, sol_id)] = after, grade
+        _attempt_deltas(rows, sol_id, (created_at or datetime.utcnow()).date(), counted_in, grade,
+                        is_correct, ratio, duration, before, after)
+
+    strands = dict(session.query(SolStandard.id, SolStandard.strand))
+    session.query(CohortRollup).delete(synchronize_session=False)
+    session.bulk_insert_mappings(CohortRollup, [
+        {'grade': grade, 'strand': strands.get(sol_id, ''), 'sol_id': sol_id, 'day': day, **sums}
+        for (grade, sol_id, day), sums in rows.items()
+    ])
+    session.commit()
+    return len(rows)
+
+
+def ensure_rollup_grade_schema(engine: Engine):
+    """Add the recorded grade columns and stamp existing rows with each student's current grade"""
+    with engine.begin() as conn:
+        for table in ('assessment_attempts', 'mastery_progress'):
+            if 'grade' not in {column['name'] for column in inspect(conn).get_columns(table)}:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN grade VARCHAR"))
+            conn.execute(text(
+                f"UPDATE {table} SET grade = (SELECT users.grade FROM users WHERE users.id = {table}.user_id) "
+                f"WHERE grade IS NULL"
+            ))
+
+
+def cohort_report(session: Session, grade: str, strand: Optional[str] = None, sol_prefix: Optional[str] = None,
+                  start: Optional[date] = None, end: Optional[date] = None):
+    """Per-standard activity in [start, end] and mastery distribution as of ``end`` for a grade"""
+    in_range = CohortRollup.day >= start if start else None
+
+    def ranged(column):
+        return func.sum(case((in_range, column), else_=0)) if in_range is not None else func.sum(column)
+
+    query = session.query(
+        CohortRollup.sol_id, CohortRollup.strand,
+        ranged(CohortRollup.attempt_count), ranged(CohortRollup.correct_count),
+        ranged(CohortRollup.score_ratio_sum), ranged(CohortRollup.duration_sum), ranged(CohortRollup.duration_count),
+        func.sum(CohortRollup.new_students), func.sum(CohortRollup.ewma_delta),
+        *[func.sum(getattr(CohortRollup, f"{level}_delta")) for level in LEVELS]
+    ).filter(CohortRollup.grade == grade)
+    if strand:
+        query = query.filter(CohortRollup.strand == strand)
+    if sol_prefix:
+        query = query.filter(CohortRollup.sol_id.startswith(sol_prefix))
+    if end:
+        query = query.filter(CohortRollup.day <= end)
+
+    standards = []
+    for row in query.group_by(CohortRollup.sol_id, CohortRollup.strand).order_by(CohortRollup.sol_id):
+        sol_id, strand_name, attempts, correct, ratio_sum, duration_sum, duration_count, students, ewma_sum = row[:9]
+        standards.append({
+            'solId': sol_id,
+            'strand': strand_name,
+            'attempts': int(attempts or 0),
+            'accuracy': correct / attempts if attempts else None,
+            'meanScore': ratio_sum / attempts if attempts else None,
+            'meanDurationSeconds': duration_sum / duration_count if duration_count else None,
+            'students': int(students or 0),
+            'meanMastery': ewma_sum / students if students else None,
+            'masteryLevels': {level: int(count or 0) for level, count in zip(LEVELS, row[9:])},
+        })
+    return {
+        'grade': grade,
+        'strand': strand,
+        'from': start.isoformat() if start else None,
+        'to': end.isoformat() if end else None,
+        'standards': standards,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    from models import db_manager
+
+    parser = argparse.ArgumentParser(description='Maintain cohort rollups')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.parse_args(argv)
+
+    session = db_manager.get_session()
+    try:
+        print(f"✓ Rebuilt {rebuild_rollups(session)} cohort rollup rows")
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Transparent compression for large text and JSON columns
+
+``CompressedText`` and ``CompressedJSON`` behave like ``Text`` and ``JSON``.
+When their column is listed in ``COMPRESS_COLUMNS`` (e.g.
+``assessment_items.payload,messages.content`` or ``all``), values of at
+least ``COMPRESS_MIN_BYTES`` are stored as ``"\\x01" + codec + base64`` if
+that is smaller than the original. Reads check for the marker, so rows
+written before compression was enabled (or after it is disabled again)
+read unchanged.
+
+Only columns that nothing but this service reads may be compressed. The
+Node app reads ``SHARED_COLUMNS`` directly through Drizzle and the
+full-text index reads ``messages.content`` in SQL, so those columns are
+never compressed whatever ``COMPRESS_COLUMNS`` says; values compressed by
+earlier releases still decode here and are rewritten as plain text by
+schema migration 10 (``decompress_shared_columns``).
+
+The codec is zstd when the optional ``zstandard`` package is installed
+(override with ``COMPRESS_CODEC=zlib``), otherwise zlib.
+
+    python compression.py report      # storage saved, plus database read/write latency with and without compression
+    python compression.py backfill    # compress existing rows of the enabled columns
+"""
+import argparse
+import base64
+import json
+import os
+import time
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import JSON, Text, cast, literal, select
+from sqlalchemy.types import TypeDecorator
+
+MARKER = '\x01'
+CODEC_ZLIB = 'z'
+CODEC_ZSTD = 's'
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+COMPRESS_COLUMNS = {name.strip() for name in os.getenv('COMPRESS_COLUMNS', '').split(',') if name.strip()}
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+
+# Columns read outside this service (or by SQL that needs the text); never compressed
+SHARED_COLUMNS = {
+    'messages.content': 'read by the Node chat UI through Drizzle and indexed for message search',
+    'assessment_items.payload': 'read by the Node app through Drizzle',
+}
+
+
+@lru_cache(maxsize=1)
+def _zstd():
+    try:
+        import zstandard  # Optional dependency, better ratio and speed than zlib
+    except ImportError:
+        return None
+    return zstandard
+
+
+def default_codec() -> str:
+    requested = os.getenv('COMPRESS_CODEC')
+    if requested == 'zlib' or _zstd() is None:
+        return CODEC_ZLIB
+    return CODEC_ZSTD
+
+
+def is_compressed(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(MARKER)
+
+
+def compress_text(value: str, codec: Optional[str] = None, min_bytes: int = COMPRESS_MIN_BYTES) -> str:
+    """Encoded form of ``value``, or ``value`` itself when compression would not pay off"""
+    raw = value.encode('utf-8')
+    if len(raw) < min_bytes:
+        return value
+    codec = codec or default_codec()
+    if codec == CODEC_ZSTD:
+        packed = _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        packed = zlib.compress(raw, ZLIB_LEVEL)
+    encoded = MARKER + codec + base64.b64encode(packed).decode('ascii')
+    return encoded if len(encoded) < len(raw) else value
+
+
+def decompress_text(value: Optional[str]) -> Optional[str]:
+    if not is_compressed(value):
+        return value
+    codec, packed = value[1], base64.b64decode(value[2:])
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(packed).decode('utf-8')
+    if codec == CODEC_ZSTD:
+        if _zstd() is None:
+            raise RuntimeError("Value was compressed with zstd; install the 'zstandard' package to read it")
+        return _zstd().ZstdDecompressor().decompress(packed).decode('utf-8')
+    raise ValueError(f"Unknown compression codec {codec!r}")
+
+
+def column_enabled(column_name: str) -> bool:
+    if column_name in SHARED_COLUMNS:
+        return False
+    return 'all' in COMPRESS_COLUMNS or column_name in COMPRESS_COLUMNS
+
+
+class CompressedText(TypeDecorator):
+    """``Text`` that compresses large values when ``column_name`` is enabled"""
+    impl = Text
+    cache_ok = True
+
+    def __init__(self, column_name: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.column_name = column_name
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not column_enabled(self.column_name):
+            return value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+
+class CompressedJSON(TypeDecorator):
+    """``JSON`` that stores large documents as a compressed JSON string when enabled"""
+    impl = JSON
+    cache_ok = True
+
+    def __init__(self, column_name: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.column_name = column_name
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not column_enabled(self.column_name):
+            return value
+        serialized = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        encoded = compress_text(serialized)
+        return encoded if encoded is not serialized else value
+
+    def process_result_value(self, value, dialect):
+        return json.loads(decompress_text(value)) if is_compressed(value) else value
+
+
+def _compressed_columns():
+    from models import Base
+
+    # Duck-typed: run as a script, this module is __main__ while models imported ``compression``
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, TypeDecorator) and hasattr(column.type, 'column_name'):
+                yield table, column
+
+
+def _is_json(column) -> bool:
+    return isinstance(column.type.impl, JSON)
+
+
+def _raw(column):
+    """The stored representation of a compressed column, bypassing the type"""
+    return cast(column, Text)
+
+
+def _key(table):
+    return list(table.primary_key.columns)[0]
+
+
+def _plain_value(column, logical: str):
+    """``logical`` as bound to the column without compression"""
+    return json.loads(logical) if _is_json(column) else logical
+
+
+def _time_per_row(run, rows: int) -> float:
+    started = time.perf_counter()
+    run()
+    return (time.perf_counter() - started) / max(rows, 1) * 1e6
+
+
+def _database_latency(conn, table, column, keys: List[Any], logical: List[str]) -> Dict[str, float]:
+    """Per-row database read and write time for the sampled rows, stored compressed vs plain
+
+    Inside a transaction that is rolled back, the sampled values are written
+    plain and read back by key through the column type, then the same for
+    their compressed form, so both timings include the database round trip
+    and the storage of the larger or smaller value.
+    """
+    key = _key(table)
+    forms = {
+        'Plain': [_plain_value(column, value) for value in logical],
+        'Compressed': [compress_text(value, min_bytes=0) for value in logical],
+    }
+    latency = {}
+    transaction = conn.begin()
+    try:
+        # The first pass warms the page cache so neither form pays for it
+        for form, values in list(forms.items()) * 2:
+            latency[f'dbWrite{form}MicrosPerRow'] = _time_per_row(lambda: [
+                conn.execute(table.update().where(key == k).values({column.name: literal(v, column.type.impl)}))
+                for k, v in zip(keys, values)
+            ], len(keys))
+            latency[f'dbRead{form}MicrosPerRow'] = _time_per_row(lambda: [
+                conn.execute(select(column).where(key == k)).all() for k in keys
+            ], len(keys))
+    finally:
+        transaction.rollback()
+    return {name: round(value, 1) for name, value in latency.items()}
+
+
+def storage_report(engine, sample_size: int = 200) -> List[Dict[str, Any]]:
+    """Stored vs logical size per compressed column, plus database read/write latency on a sample
+
+    The sample is the first ``sample_size`` rows of at least
+    ``COMPRESS_MIN_BYTES``, the ones compression applies to. Write timings
+    need a write transaction; it is rolled back, so nothing changes.
+    """
+    report = []
+    with engine.connect() as conn:
+        for table, column in _compressed_columns():
+            rows = compressed = stored_chars = logical_chars = 0
+            sample_keys, sample = [], []
+            query = select(_key(table), _raw(column))
+            for row_key, raw in conn.execution_options(yield_per=1000).execute(query):
+                if raw is None:
+                    continue
+                logical = _logical(column, raw)
+                rows += 1
+                compressed += is_compressed(_unwrap(column, raw))
+                stored_chars += len(raw)
+                logical_chars += len(logical)
+                if len(sample) < sample_size and len(logical.encode('utf-8')) >= COMPRESS_MIN_BYTES:
+                    sample_keys.append(row_key)
+                    sample.append(logical)
+            conn.rollback()  # End the scan's read transaction before timing
+
+            name = f"{table.name}.{column.name}"
+            entry = {
+                'column': name,
+                'enabled': column_enabled(name),
+                'shared': SHARED_COLUMNS.get(name),
+                'rows': rows,
+                'compressedRows': compressed,
+                'storedChars': stored_chars,
+                'logicalChars': logical_chars,
+                'savedPercent': round(100.0 * (1 - stored_chars / logical_chars), 1) if logical_chars else 0.0,
+                'sampledRows': len(sample),
+            }
+            if sample:
+                entry.update(_database_latency(conn, table, column, sample_keys, sample))
+            report.append(entry)
+    return report
+
+
+def _unwrap(column, raw: Optional[str]) -> Optional[str]:
+    """JSON columns hold the compressed form as a JSON string literal"""
+    if raw is not None and _is_json(column) and raw.startswith('"'):
+        value = json.loads(raw)
+        return value if isinstance(value, str) else raw
+    return raw
+
+
+def _logical(column, raw: Optional[str]) -> str:
+    value = _unwrap(column, raw)
+    if value is None:
+        return ''
+    if _is_json(column):
+        return decompress_text(value) if is_compressed(value) else raw
+    return decompress_text(value)
+
+
+def _rewrite(engine, table, column, batch_size: int, wanted) -> int:
+    """Rewrite values for which ``wanted(stored, logical)`` holds through ``column``'s type; returns the count"""
+    key = _key(table)
+    count = 0
+    last_key = None
+    while True:
+        with engine.begin() as conn:
+            query = select(key, _raw(column)).order_by(key).limit(batch_size)
+            if last_key is not None:
+                query = query.where(key > last_key)
+            rows = conn.execute(query).all()
+            if not rows:
+                return count
+            for row_key, raw in rows:
+                if raw is None:
+                    continue
+                logical = _logical(column, raw)
+                if not wanted(_unwrap(column, raw), logical):
+                    continue
+                conn.execute(table.update().where(key == row_key).values({column.name: _plain_value(column, logical)}))
+                count += 1
+            last_key = rows[-1][0]
+
+
+def backfill(engine, batch_size: int = 500) -> Dict[str, int]:
+    """Rewrite uncompressed values of every enabled column through its type"""
+    rewritten = {}
+    for table, column in _compressed_columns():
+        name = f"{table.name}.{column.name}"
+        if not column_enabled(name):
+            continue
+        rewritten[name] = _rewrite(engine, table, column, batch_size,
+                                   lambda stored, logical: not is_compressed(stored) and is_compressed(compress_text(logical)))
+    return rewritten
+
+
+def decompress_shared_columns(engine, batch_size: int = 500) -> Dict[str, int]:
+    """Store compressed values of ``SHARED_COLUMNS`` as plain text again"""
+    rewritten = {}
+    for table, column in _compressed_columns():
+        name = f"{table.name}.{column.name}"
+        if name in SHARED_COLUMNS:
+            rewritten[name] = _rewrite(engine, table, column, batch_size, lambda stored, _value: is_compressed(stored))
+    return rewritten
+
+
+def main(argv: Optional[List[str]] = None):
+    from models import db_manager
+
+    parser = argparse.ArgumentParser(description='Report on or backfill compressed columns')
+    parser.add_argument('command', choices=['report', 'backfill'])
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    print(f"Codec: {'zstd' if default_codec() == CODEC_ZSTD else 'zlib'}, "
+          f"threshold {COMPRESS_MIN_BYTES} bytes, enabled: {', '.join(sorted(COMPRESS_COLUMNS)) or 'none'}")
+    if args.command == 'backfill':
+        for name, count in backfill(db_manager.engine, args.batch_size).items():
+            print(f"✓ {name}: rewrote {count} rows")
+    for entry in storage_report(db_manager.engine):
+        line = (f"{entry['column']}: {entry['compressedRows']}/{entry['rows']} rows compressed, "
+                f"{entry['storedChars']} chars stored for {entry['logicalChars']} ({entry['savedPercent']}% saved)")
+        if entry['shared']:
+            line += f"; never compressed ({entry['shared']})"
+        if entry['sampledRows']:
+            line += (f"; per row over {entry['sampledRows']} rows, compressed vs plain: "
+                     f"read {entry['dbReadCompressedMicrosPerRow']} vs {entry['dbReadPlainMicrosPerRow']} µs, "
+                     f"write {entry['dbWriteCompressedMicrosPerRow']} vs {entry['dbWritePlainMicrosPerRow']} µs")
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Queued grading of constructed-response (CR) attempts
+
+Submitting a CR response stores an ``AssessmentAttempt`` with
+``grading_status='pending'`` and returns at once. A pool of worker threads
+claims pending attempts with ``SELECT ... FOR UPDATE SKIP LOCKED`` (so
+workers never block on or double-claim each other's rows), marks them
+``grading`` and commits before calling the scorer, so no row lock is held
+during the slow model call. The score and feedback are then written back
+with an UPDATE guarded on the claim still being this worker's, and the
+mastery, item statistics and rollup updates only follow when it matched.
+
+Claims left behind by a crashed worker are reclaimed after
+``CLAIM_TIMEOUT_SECONDS``; a response whose scoring keeps failing is marked
+``failed`` after ``MAX_GRADING_ATTEMPTS``.
+
+    python cr_grading.py --workers 4 --scorer stub     # run a worker pool in the foreground
+    python cr_grading.py --drain --scorer stub         # grade everything pending, report throughput
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import case, func, inspect, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from cohort_rollups import RollupBatch, mastery_snapshot
+from grading import ability, apply_mastery_update, invalidate_recommendations, load_mastery
+from item_stats import record_attempt_statistics
+from models import AssessmentAttempt, AssessmentItem
+
+CR_MAX_SCORE = 4.0
+PASSING_SCORE = 3.0
+CLAIM_BATCH_SIZE = 4
+CLAIM_TIMEOUT_SECONDS = 300
+MAX_GRADING_ATTEMPTS = 3
+POLL_INTERVAL_SECONDS = 1.0
+
+
+def ensure_grading_queue_schema(engine: Engine):
+    """Add the grading queue columns and index to pre-existing databases"""
+    columns = {column['name'] for column in inspect(engine).get_columns('assessment_attempts')}
+    added = {
+        'grading_status': "VARCHAR(16) NOT NULL DEFAULT 'graded'",
+        'grading_attempts': "INTEGER NOT NULL DEFAULT 0",
+        'grading_error': "TEXT",
+        'claimed_at': "TIMESTAMP",
+        'graded_at': "TIMESTAMP",
+    }
+    with engine.begin() as conn:
+        for name, ddl in added.items():
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE assessment_attempts ADD COLUMN {name} {ddl}"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_assessment_attempts_grading_queue "
+            "ON assessment_attempts (grading_status, created_at)"
+        ))
+
+
+Scorer = Callable[[AssessmentItem, Any], Dict[str, Any]]
+
+
+class StubScorer:
+    """Deterministic offline scorer: overlap of the response with the item's sample answer
+
+    ``latency`` simulates a model call so worker-pool throughput can be measured.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def __call__(self, item: AssessmentItem, response: Any) -> Dict[str, Any]:
+        if self.latency:
+            time.sleep(self.latency)
+        words = set(str(response).lower().split())
+        sample = set(str((item.payload or {}).get('sample_answer', '')).lower().split())
+        overlap = len(words & sample) / len(sample) if sample else 0.0
+        score = float(min(CR_MAX_SCORE, 1 + int(overlap * CR_MAX_SCORE)))
+        return {'score': score, 'feedback': f"Matched {overlap:.0%} of the sample answer."}
+
+
+class OpenAIScorer:
+    """Scores against the item's rubric with the prompt used by /api/sol/submit-answer"""
+
+    def __init__(self, model: str = 'gpt-4o'):
+        from openai import OpenAI  # Optional dependency, only needed when this scorer is used
+
+        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.model = model
+
+    def __call__(self, item: AssessmentItem, response: Any) -> Dict[str, Any]:
+        scoring_prompt = (
+            "Score this student response using the provided rubric.\n\n"
+            f"Question: {item.stem}\n\n"
+            f"Rubric:\n{json.dumps((item.payload or {}).get('rubric'), indent=2)}\n\n"
+            f"Student Response: {response}\n\n"
+            "Provide a score from 1-4 and brief feedback. Respond with JSON:\n"
+            '{\n  "score": <number 1-4>,\n'
+            '  "feedback": "<encouraging feedback with specific suggestions>"\n}'
+        )
+        completion = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {'role': 'system', 'content': 'You are a fair and encouraging teacher scoring student responses.'},
+                {'role': 'user', 'content': scoring_prompt}
+            ],
+            temperature=0.3,
+            max_tokens=300,
+            response_format={'type': 'json_object'}
+        )
+        data = json.loads(completion.choices[0].message.content)
+        return {
+            'score': float(min(CR_MAX_SCORE, max(1.0, float(data.get('score', 1))))),
+            'feedback': data.get('feedback') or 'Good effort! Keep working on this topic.'
+        }
+
+
+def submit_constructed_response(session: Session, user_id: str, item: AssessmentItem, response: Any,
+                                duration_seconds: Optional[int] = None) -> AssessmentAttempt:
+    """Queue a CR response for grading and return the pending attempt"""
+    attempt = AssessmentAttempt(
+        user_id=user_id,
+        item_id=item.id,
+        sol_id=item.sol_id,
+        user_response=response,
+        is_correct=False,
+        score=0.0,
+        max_score=CR_MAX_SCORE,
+        duration_seconds=duration_seconds,
+        grading_status='pending'
+    )
+    session.add(attempt)
+    session.commit()
+    session.refresh(attempt)
+    return attempt
+
+
+def claim_attempts(session: Session, limit: int = CLAIM_BATCH_SIZE) -> List[str]:
+    """Atomically move up to ``limit`` claimable attempts to 'grading'; returns their ids"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)
+    candidates = session.query(AssessmentAttempt.id).filter(
+        or_(AssessmentAttempt.grading_status == 'pending',
+            (AssessmentAttempt.grading_status == 'grading') & (AssessmentAttempt.claimed_at < stale))
+    ).order_by(AssessmentAttempt.created_at).limit(limit).with_for_update(skip_locked=True).all()
+
+    claimed = []
+    for (attempt_id,) in candidates:
+        # Guarded update: backends without SKIP LOCKED (SQLite) may hand two workers the same row
+        updated = session.query(AssessmentAttempt).filter(
+            AssessmentAttempt.id == attempt_id,
+            or_(AssessmentAttempt.grading_status == 'pending',
+                (AssessmentAttempt.grading_status == 'grading') & (AssessmentAttempt.claimed_at < stale))
+        ).update({
+            AssessmentAttempt.grading_status: 'grading',
+            AssessmentAttempt.claimed_at: now,
+            AssessmentAttempt.grading_attempts: AssessmentAttempt.grading_attempts + 1,
+        }, synchronize_session=False)
+        if updated:
+            claimed.append(attempt_id)
+    session.commit()
+    return claimed
+
+
+def _claim_is_current(attempt: AssessmentAttempt, claimed_at: datetime):
+    """Filter matching ``attempt`` only while it is still held by the claim made at ``claimed_at``"""
+    return (AssessmentAttempt.id == attempt.id) & (AssessmentAttempt.grading_status == 'grading') & \
+        (AssessmentAttempt.claimed_at == claimed_at)
+
+
+def _write_result(session: Session, attempt: AssessmentAttempt, claimed_at: datetime,
+                  result: Dict[str, Any]) -> bool:
+    """Store the score if the claim is still ours; returns False (writing nothing) when it is not
+
+    A claim that outlived ``CLAIM_TIMEOUT_SECONDS`` may have been reclaimed
+    and graded by another worker, so the status change is a guarded UPDATE
+    and the mastery, item statistics and rollups are only updated after it
+    matched the row.
+    """
+    now = datetime.utcnow()
+    score = float(result['score'])
+    updated = session.query(AssessmentAttempt).filter(_claim_is_current(attempt, claimed_at)).update({
+        AssessmentAttempt.score: score,
+        AssessmentAttempt.is_correct: score >= PASSING_SCORE,
+        AssessmentAttempt.feedback: result.get('feedback'),
+        AssessmentAttempt.grading_status: 'graded',
+        AssessmentAttempt.grading_error: None,
+        AssessmentAttempt.graded_at: now,
+    }, synchronize_session='fetch')
+    if not updated:
+        return False
+
+    progress = load_mastery(session, attempt.user_id, [attempt.sol_id])[attempt.sol_id]
+    record_attempt_statistics(
+        session, attempt.item_id, attempt.is_correct, attempt.score, attempt.max_score,
+        attempt.duration_seconds, ability(progress)
+    )
+    before = mastery_snapshot(progress)
+    apply_mastery_update(progress, score / attempt.max_score, now)
+
+    # Counted on the day the student answered, not the day the grader caught up
+    rollups = RollupBatch(session, attempt.user_id)
+    rollups.add(attempt, (attempt.created_at or now).date(), before, progress)
+    rollups.flush()
+    invalidate_recommendations(session, attempt.user_id)
+    return True
+
+
+def grade_claimed(session: Session, attempt_id: str, scorer: Scorer) -> bool:
+    """Score one claimed attempt and persist the outcome; returns True when graded"""
+    attempt = session.query(AssessmentAttempt).filter(AssessmentAttempt.id == attempt_id).one()
+    item = session.query(AssessmentItem).filter(AssessmentItem.id == attempt.item_id).one()
+    claimed_at, response = attempt.claimed_at, attempt.user_response
+    session.expunge(item)  # Keeps its loaded fields readable by the scorer without a refresh
+    session.commit()  # End the read transaction so nothing is held during scoring
+
+    try:
+        graded = _write_result(session, attempt, claimed_at, scorer(item, response))
+        session.commit()
+        return graded
+    except Exception as e:
+        session.rollback()
+        session.query(AssessmentAttempt).filter(_claim_is_current(attempt, claimed_at)).update({
+            AssessmentAttempt.grading_status: case(
+                (AssessmentAttempt.grading_attempts >= MAX_GRADING_ATTEMPTS, 'failed'), else_='pending'
+            ),
+            AssessmentAttempt.grading_error: str(e),
+        }, synchronize_session=False)
+        session.commit()
+        return False
+
+
+def grade_pending(session: Session, scorer: Scorer, limit: int = CLAIM_BATCH_SIZE) -> int:
+    """Claim and grade one batch; returns the number of attempts graded"""
+    return sum(grade_claimed(session, attempt_id, scorer) for attempt_id in claim_attempts(session, limit))
+
+
+def queue_status(session: Session) -> Dict[str, int]:
+    rows = session.query(AssessmentAttempt.grading_status, func.count(AssessmentAttempt.id)).filter(
+        AssessmentAttempt.grading_status != 'graded'
+    ).group_by(AssessmentAttempt.grading_status)
+    return {'pending': 0, 'grading': 0, 'failed': 0, **{status: count for status, count in rows}}
+
+
+class GradingWorker(threading.Thread):
+    """Claims and grades batches until stopped, polling while the queue is empty"""
+
+    def __init__(self, session_factory: Callable[[], Session], scorer: Scorer, stop_event: threading.Event,
+                 name: str, poll_interval: float = POLL_INTERVAL_SECONDS, exit_when_empty: bool = False):
+        super().__init__(name=name, daemon=True)
+        self.session_factory = session_factory
+        self.scorer = scorer
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval
+        self.exit_when_empty = exit_when_empty
+        self.graded = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            session = self.session_factory()
+            try:
+                graded = grade_pending(session, self.scorer)
+                self.graded += graded
+            except Exception as e:
+                session.rollback()
+                graded = 0
+                print(f"CR grading failed: {e}")
+            finally:
+                session.close()
+            if not graded:
+                if self.exit_when_empty:
+                    return
+                self.stop_event.wait(self.poll_interval)
+
+
+class GradingWorkerPool:
+    """``workers`` grading threads sharing one stop event"""
+
+    def __init__(self, session_factory: Callable[[], Session], scorer: Scorer, workers: int = 2,
+                 poll_interval: float = POLL_INTERVAL_SECONDS, exit_when_empty: bool = False):
+        self.stop_event = threading.Event()
+        self.workers = [
+            GradingWorker(session_factory, scorer, self.stop_event, f"cr-grading-{i}",
+                          poll_interval=poll_interval, exit_when_empty=exit_when_empty)
+            for i in range(workers)
+        ]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def join(self, timeout: Optional[float] = None):
+        for worker in self.workers:
+            worker.join(timeout)
+
+    def stop(self, timeout: Optional[float] = None):
+        self.stop_event.set()
+        self.join(timeout)
+
+    @property
+    def graded(self) -> int:
+        return sum(worker.graded for worker in self.workers)
+
+
+def make_scorer(name: str, latency: float = 0.0) -> Scorer:
+    return OpenAIScorer() if name == 'openai' else StubScorer(latency=latency)
+
+
+def main(argv: Optional[List[str]] = None):
+    from models import db_manager
+
+    parser = argparse.ArgumentParser(description='Grade queued constructed-response attempts')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--scorer', choices=['stub', 'openai'], default='stub')
+    parser.add_argument('--stub-latency', type=float, default=0.0,
+                        help='Seconds the stub scorer sleeps per response (simulates a model call)')
+    parser.add_argument('--drain', action='store_true', help='Exit once the queue is empty')
+    args = parser.parse_args(argv)
+
+    session = db_manager.get_session()
+    try:
+        print(f"Queue: {queue_status(session)}")
+    finally:
+        session.close()
+
+    pool = GradingWorkerPool(db_manager.get_session, make_scorer(args.scorer, args.stub_latency),
+                             workers=args.workers, exit_when_empty=args.drain)
+    started = time.perf_counter()
+    pool.start()
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        pool.stop()
+    elapsed = time.perf_counter() - started
+    print(f"✓ Graded {pool.graded} responses with {args.workers} workers "
+          f"in {elapsed:.2f}s ({pool.graded / elapsed:.1f}/s)")
+
+
+if __name__ == '__main__':
+    main()
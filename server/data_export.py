@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Streaming export of everything stored about one user
+
+Produces a zip archive with one NDJSON file per table (profile, chats,
+messages, assessment attempts, mastery progress, recommendations) and a
+``manifest.json`` with row counts. Each table is read through a
+server-side cursor (``stream_results``) ``EXPORT_BATCH_SIZE`` rows at a
+time and deflated straight into the output, so memory use does not grow
+with the length of a student's history. All tables are read in one
+transaction (``REPEATABLE READ`` on PostgreSQL, a WAL snapshot on SQLite)
+so the files agree with each other.
+
+    python data_export.py <user_id> [--out export.zip]
+"""
+import argparse
+import io
+import json
+import sys
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+from models import AssessmentAttempt, Chat, MasteryProgress, Message, User, UserRecommendation
+
+EXPORT_BATCH_SIZE = 500
+EXCLUDED_COLUMNS = {'users': {'password'}}
+
+
+def _export_queries(user_id: str) -> List[Tuple[str, Select]]:
+    """(file name, query) per exported table, in archive order"""
+    users, chats, messages = User.__table__, Chat.__table__, Message.__table__
+    attempts, mastery = AssessmentAttempt.__table__, MasteryProgress.__table__
+    recommendations = UserRecommendation.__table__
+    return [
+        ('profile', select(*[column for column in users.c if column.name not in EXCLUDED_COLUMNS['users']])
+         .where(users.c.id == user_id)),
+        ('chats', select(chats).where(chats.c.user_id == user_id).order_by(chats.c.created_at)),
+        ('messages', select(messages).join_from(messages, chats, chats.c.id == messages.c.chat_id)
+         .where(chats.c.user_id == user_id).order_by(messages.c.chat_id, messages.c.created_at)),
+        ('assessment_attempts', select(attempts).where(attempts.c.user_id == user_id).order_by(attempts.c.created_at)),
+        ('mastery_progress', select(mastery).where(mastery.c.user_id == user_id)),
+        ('recommendations', select(recommendations).where(recommendations.c.user_id == user_id)),
+    ]
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable write target whose bytes are handed to the response as they are produced"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_archive(engine: Engine, user_id: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Zip archive bytes for ``user_id``, yielded as each batch of rows is compressed"""
+    sink = _ChunkSink()
+    counts = {}
+    exported_at = datetime.utcnow()
+    with engine.connect() as conn:
+        if engine.dialect.name == 'postgresql':
+            conn = conn.execution_options(isolation_level='REPEATABLE READ')
+        # The sink cannot seek, so zipfile writes sizes in data descriptors after each entry
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, query in _export_queries(user_id):
+                counts[name] = 0
+                info = zipfile.ZipInfo(f"{name}.ndjson", date_time=exported_at.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with archive.open(info, 'w', force_zip64=True) as entry:
+                    result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+                    keys = list(result.keys())
+                    for chunk in result.partitions():
+                        entry.write(''.join(
+                            json.dumps(dict(zip(keys, row)), default=_json_default) + '\n' for row in chunk
+                        ).encode())
+                        counts[name] += len(chunk)
+                        yield sink.drain()
+            manifest = zipfile.ZipInfo('manifest.json', date_time=exported_at.timetuple()[:6])
+            archive.writestr(manifest, json.dumps({
+                'userId': user_id,
+                'exportedAt': exported_at.isoformat(),
+                'format': 'ndjson',
+                'files': {f"{name}.ndjson": count for name, count in counts.items()},
+            }, indent=2))
+    yield sink.drain()
+
+
+def export_filename(user_id: str) -> str:
+    return f"studybuddy-export-{user_id}-{datetime.utcnow():%Y%m%d}.zip"
+
+
+def main(argv: Optional[List[str]] = None):
+    from models import db_manager
+
+    parser = argparse.ArgumentParser(description="Export all of a user's data as a zip of NDJSON files")
+    parser.add_argument('user_id')
+    parser.add_argument('--out', help='Defaults to studybuddy-export-<user>-<date>.zip; - for stdout')
+    args = parser.parse_args(argv)
+
+    out = args.out or export_filename(args.user_id)
+    target = sys.stdout.buffer if out == '-' else open(out, 'wb')
+    try:
+        for chunk in export_archive(db_manager.read_engine, args.user_id):
+            target.write(chunk)
+    finally:
+        if target is not sys.stdout.buffer:
+            target.close()
+    if out != '-':
+        print(f"✓ Exported user {args.user_id} to {out}")
+
+
+if __name__ == '__main__':
+    main()
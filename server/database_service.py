@@ -8,125 +8,182 @@ import sys
 import json
 from datetime import datetime
 from typing import Dict, List, Any, Optional
-from flask import Flask, request, jsonify
-from sqlalchemy import create_engine, Column, String, Integer, Text, JSON, DateTime, Boolean, Float, ForeignKey, func
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-import uuid
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from models import (
+    db_manager, User, Chat, Message, SolStandard,
+    AssessmentItem, AssessmentAttempt, MasteryProgress, ItemStatistics, is_uuid
+)
+from message_search import search_messages
+from message_context import count_tokens, get_context_window, serialize_message
+from sol_hierarchy import get_hierarchy
+from sol_prerequisites import ensure_prerequisite_closure, get_remediation_chain
+from grading import grade_batch, serialize_attempt
+from cohort_rollups import cohort_report, rebuild_rollups
+from data_export import export_archive, export_filename
+from roster_import import FORMATS as ROSTER_FORMATS, detect_format, import_roster
+import response_cache
+from cr_grading import (
+    GradingWorkerPool, make_scorer, queue_status, submit_constructed_response
+)
+from item_stats import recompute_item_statistics, retire_items, serialize_statistics
+from admission import AdmissionController, configure_statement_timeouts, route_statement_timeout, statement_timeout_ms
+import chat_summaries  # noqa: F401 - keeps chat summaries current on message writes
+from change_feed import ChangeFeed, event_stream, install_sqlite_hook, replay_messages
+from memory_profile import LIST_BATCH_SIZE, LOW_MEMORY, memory_report
+from item_pool import (
+    pick_item, pool_status, serialize_item, set_targets,
+    ItemPoolRefillWorker, OpenAIItemGenerator, StubItemGenerator
+)
 
 # Initialize Flask app for database API
 app = Flask(__name__)
 
-# SQLAlchemy setup
-Base = declarative_base()
-
-def generate_uuid():
-    return str(uuid.uuid4())
-
-# Database Models
-class User(Base):
-    __tablename__ = 'users'
-    
-    id = Column(String, primary_key=True, default=generate_uuid)
-    name = Column(String, nullable=False)
-    email = Column(String, nullable=False, unique=True)
-    age = Column(Integer, nullable=False)
-    grade = Column(String, nullable=False)
-    password = Column(String, nullable=True)
-    created_at = Column(DateTime, server_default=func.now())
-    
-    chats = relationship("Chat", back_populates="user")
-    assessment_attempts = relationship("AssessmentAttempt", back_populates="user")
-
-class Chat(Base):
-    __tablename__ = 'chats'
-    
-    id = Column(String, primary_key=True, default=generate_uuid)
-    title = Column(String, nullable=False)
-    user_id = Column(String, ForeignKey('users.id'), nullable=False)
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
-    
-    user = relationship("User", back_populates="chats")
-    messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
-
-class Message(Base):
-    __tablename__ = 'messages'
-    
-    id = Column(String, primary_key=True, default=generate_uuid)
-    chat_id = Column(String, ForeignKey('chats.id'), nullable=False)
-    role = Column(String, nullable=False)
-    content = Column(Text, nullable=False)
-    created_at = Column(DateTime, server_default=func.now())
-    
-    chat = relationship("Chat", back_populates="messages")
-
-class SolStandard(Base):
-    __tablename__ = 'sol_standards'
-    
-    id = Column(String, primary_key=True)
-    subject = Column(String, nullable=False)
-    grade = Column(String, nullable=False)
-    strand = Column(String, nullable=False)
-    description = Column(Text, nullable=False)
-    created_at = Column(DateTime, server_default=func.now())
-    
-    assessment_items = relationship("AssessmentItem", back_populates="sol_standard")
-    assessment_attempts = relationship("AssessmentAttempt", back_populates="sol_standard")
-
-class AssessmentItem(Base):
-    __tablename__ = 'assessment_items'
-    
-    id = Column(String, primary_key=True, default=generate_uuid)
-    sol_id = Column(String, ForeignKey('sol_standards.id'), nullable=False)
-    item_type = Column(String, nullable=False)
-    difficulty = Column(String, nullable=False)
-    dok = Column(Integer, nullable=False)
-    stem = Column(Text, nullable=False)
-    payload = Column(JSON, nullable=False)
-    created_at = Column(DateTime, server_default=func.now())
-    
-    sol_standard = relationship("SolStandard", back_populates="assessment_items")
-    attempts = relationship("AssessmentAttempt", back_populates="assessment_item")
-
-class AssessmentAttempt(Base):
-    __tablename__ = 'assessment_attempts'
-    
-    id = Column(String, primary_key=True, default=generate_uuid)
-    user_id = Column(String, ForeignKey('users.id'), nullable=False)
-    item_id = Column(String, ForeignKey('assessment_items.id'), nullable=False)
-    sol_id = Column(String, ForeignKey('sol_standards.id'), nullable=False)
-    user_response = Column(JSON, nullable=False)
-    is_correct = Column(Boolean, nullable=False)
-    score = Column(Float, nullable=False)
-    max_score = Column(Float, nullable=False)
-    feedback = Column(Text, nullable=True)
-    duration_seconds = Column(Integer, nullable=True)
-    created_at = Column(DateTime, server_default=func.now())
-    
-    user = relationship("User", back_populates="assessment_attempts")
-    assessment_item = relationship("AssessmentItem", back_populates="attempts")
-    sol_standard = relationship("SolStandard", back_populates="assessment_attempts")
-
-# Database setup
-DATABASE_URL = os.getenv('DATABASE_URL')
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is required")
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Database setup (models and engine are shared with models.py)
+engine = db_manager.engine
+SessionLocal = db_manager.SessionLocal
+
+# Admission control: per-user and global rate limits, bounded in-flight requests
+admission = AdmissionController.from_env()
+configure_statement_timeouts(engine)
+ADMISSION_EXEMPT_ENDPOINTS = {'health_check', 'static'}
+LONG_LIVED_ENDPOINTS = {'stream_messages', 'export_user_data'}  # Rate limited, but don't occupy an in-flight slot
+
+# Live message events for SSE clients (LISTEN/NOTIFY on PostgreSQL, commit hook on SQLite)
+message_feed = ChangeFeed(db_manager.get_read_session, engine)
+install_sqlite_hook(message_feed)
+
+def request_user_id() -> Optional[str]:
+    """The user a request acts for, if it names one"""
+    user_id = request.headers.get('X-User-Id') or request.args.get('userId')
+    if not user_id and request.view_args:
+        user_id = request.view_args.get('user_id')
+    if not user_id and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            user_id = body.get('userId')
+    return str(user_id) if user_id else None
+
+@app.before_request
+def admit_request():
+    if request.endpoint in ADMISSION_EXEMPT_ENDPOINTS:
+        return None
+    long_lived = request.endpoint in LONG_LIVED_ENDPOINTS
+    rejection = admission.admit(request_user_id(), hold_slot=not long_lived)
+    if rejection:
+        status, error, retry_after = rejection
+        response = jsonify({"error": error})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, status
+    if long_lived:
+        return None
+    g.admitted = True
+    g.statement_timeout_token = statement_timeout_ms.set(route_statement_timeout(request.endpoint))
+    return None
+
+# Ids are native uuid columns on PostgreSQL, where a malformed one fails the query instead of matching nothing
+ID_PATH_PARAMETERS = {'user_id': 'User', 'message_id': 'Message', 'attempt_id': 'Attempt', 'item_id': 'Item'}
+ID_REQUEST_FIELDS = ('userId', 'userIds', 'chatId', 'itemId', 'lastEventId')
+
+@app.before_request
+def validate_ids():
+    for name, value in (request.view_args or {}).items():
+        if name in ID_PATH_PARAMETERS and not is_uuid(value):
+            return jsonify({"error": f"{ID_PATH_PARAMETERS[name]} not found"}), 404
+    body = request.get_json(silent=True) if request.is_json else None
+    for field in ID_REQUEST_FIELDS:
+        for source, value in (('Query parameter', request.args.get(field)),
+                              ('Body field', body.get(field) if isinstance(body, dict) else None)):
+            if value is None:
+                continue
+            if isinstance(value, list) and not all(is_uuid(id_value) for id_value in value):
+                return jsonify({"error": f"{source} '{field}' must be a list of UUIDs"}), 400
+            if not isinstance(value, list) and not is_uuid(value):
+                return jsonify({"error": f"{source} '{field}' must be a UUID"}), 400
+    return None
+
+@app.teardown_request
+def finish_request(_exc):
+    if g.pop('admitted', False):
+        statement_timeout_ms.reset(g.pop('statement_timeout_token'))
+        admission.release()
 
 # Initialize database
 def init_database():
-    Base.metadata.create_all(bind=engine)
+    db_manager.create_tables()
+    session = get_session()
+    try:
+        ensure_prerequisite_closure(session)
+    finally:
+        session.close()
 
 def get_session():
     return SessionLocal()
 
+def get_read_session():
+    return db_manager.get_read_session()
+
+def list_response(session, query, serialize):
+    """JSON array of ``serialize(row)`` for each row of ``query``; closes ``session``
+
+    Rows are fetched LIST_BATCH_SIZE at a time and detached once serialized,
+    so the identity map never holds more than one batch. The low-memory
+    profile also streams the array instead of building the whole body.
+    """
+    def generate():
+        try:
+            yield '['
+            for i, row in enumerate(query.yield_per(LIST_BATCH_SIZE)):
+                yield (',' if i else '') + app.json.dumps(serialize(row))
+                session.expunge(row)
+            yield ']'
+        finally:
+            session.close()
+
+    if LOW_MEMORY:
+        return Response(stream_with_context(generate()), mimetype='application/json')
+    return Response(''.join(generate()), mimetype='application/json')
+
+def serialize_user(user):
+    return {
+        'id': user.id,
+        'name': user.name,
+        'email': user.email,
+        'age': user.age,
+        'grade': user.grade,
+        'createdAt': user.created_at.isoformat() if user.created_at else None
+    }
+
+def serialize_chat(chat):
+    return {
+        'id': chat.id,
+        'title': chat.title,
+        'userId': chat.user_id,
+        'createdAt': chat.created_at.isoformat() if chat.created_at else None,
+        'updatedAt': chat.updated_at.isoformat() if chat.updated_at else None,
+        'messageCount': chat.message_count,
+        'lastMessageAt': chat.last_message_at.isoformat() if chat.last_message_at else None,
+        'lastMessagePreview': chat.last_message_preview
+    }
+
+def serialize_standard(standard):
+    return {
+        'id': standard.id,
+        'subject': standard.subject,
+        'grade': standard.grade,
+        'strand': standard.strand,
+        'description': standard.description,
+        'createdAt': standard.created_at.isoformat() if standard.created_at else None
+    }
+
 # API Routes
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy", "service": "database"})
+    health = {"status": "healthy", "service": "database", "backend": engine.dialect.name,
+              "memory": memory_report(), "admission": admission.stats(),
+              "changeFeed": {"subscribers": message_feed.subscriber_count, "published": message_feed.published}}
+    if db_manager.write_gate is not None:
+        health["queuedWriters"] = db_manager.write_gate.waiting
+    return jsonify(health)
 
 @app.route('/users', methods=['POST'])
 def create_user():
@@ -144,58 +201,64 @@ def create_user():
         session.commit()
         session.refresh(user)
         
-        return jsonify({
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'age': user.age,
-            'grade': user.grade,
-            'createdAt': user.created_at.isoformat() if user.created_at else None
-        })
+        return jsonify(serialize_user(user))
     except Exception as e:
         session.rollback()
         return jsonify({"error": str(e)}), 500
     finally:
         session.close()
 
-@app.route('/users', methods=['GET'])
-def get_all_users():
+@app.route('/users/import', methods=['POST'])
+def import_users():
+    """Bulk create/update users from a CSV or NDJSON roster (request body or multipart 'file')"""
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    fmt = request.args.get('format') or detect_format(upload.filename if upload else None,
+                                                      upload.mimetype if upload else request.mimetype)
+    if fmt not in ROSTER_FORMATS:
+        return jsonify({"error": f"Query parameter 'format' must be one of {', '.join(ROSTER_FORMATS)}"}), 400
+
     session = get_session()
     try:
-        users = session.query(User).all()
-        return jsonify([
-            {
-                'id': user.id,
-                'name': user.name,
-                'email': user.email,
-                'age': user.age,
-                'grade': user.grade,
-                'createdAt': user.created_at.isoformat() if user.created_at else None
-            }
-            for user in users
-        ])
+        report = import_roster(session, stream, fmt,
+                               update_existing=request.args.get('skipExisting', 'false').lower() != 'true')
+        return jsonify(report)
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
     finally:
         session.close()
 
+@app.route('/users', methods=['GET'])
+def get_all_users():
+    session = get_read_session()
+    return list_response(session, session.query(User), serialize_user)
+
 @app.route('/users/<user_id>', methods=['GET'])
 def get_user(user_id):
-    session = get_session()
+    session = get_read_session()
     try:
         user = session.query(User).filter(User.id == user_id).first()
         if not user:
             return jsonify({"error": "User not found"}), 404
         
-        return jsonify({
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'age': user.age,
-            'grade': user.grade,
-            'createdAt': user.created_at.isoformat() if user.created_at else None
-        })
+        return jsonify(serialize_user(user))
+    finally:
+        session.close()
+
+@app.route('/users/<user_id>/export', methods=['GET'])
+def export_user_data(user_id):
+    """Zip of NDJSON files with everything stored about the user, streamed as it is read"""
+    session = get_read_session()
+    try:
+        if session.query(User.id).filter(User.id == user_id).first() is None:
+            return jsonify({"error": "User not found"}), 404
     finally:
         session.close()
 
+    return Response(export_archive(db_manager.read_engine, user_id), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{export_filename(user_id)}"'})
+
 @app.route('/chats', methods=['POST'])
 def create_chat():
     session = get_session()
@@ -209,13 +272,7 @@ def create_chat():
         session.commit()
         session.refresh(chat)
         
-        return jsonify({
-            'id': chat.id,
-            'title': chat.title,
-            'userId': chat.user_id,
-            'createdAt': chat.created_at.isoformat() if chat.created_at else None,
-            'updatedAt': chat.updated_at.isoformat() if chat.updated_at else None
-        })
+        return jsonify(serialize_chat(chat))
     except Exception as e:
         session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -224,26 +281,12 @@ def create_chat():
 
 @app.route('/chats', methods=['GET'])
 def get_chats():
-    session = get_session()
-    try:
-        user_id = request.args.get('userId')
-        if user_id:
-            chats = session.query(Chat).filter(Chat.user_id == user_id).order_by(Chat.updated_at.desc()).all()
-        else:
-            chats = session.query(Chat).order_by(Chat.updated_at.desc()).all()
-        
-        return jsonify([
-            {
-                'id': chat.id,
-                'title': chat.title,
-                'userId': chat.user_id,
-                'createdAt': chat.created_at.isoformat() if chat.created_at else None,
-                'updatedAt': chat.updated_at.isoformat() if chat.updated_at else None
-            }
-            for chat in chats
-        ])
-    finally:
-        session.close()
+    session = get_read_session()
+    query = session.query(Chat)
+    user_id = request.args.get('userId')
+    if user_id:
+        query = query.filter(Chat.user_id == user_id)
+    return list_response(session, query.order_by(Chat.updated_at.desc()), serialize_chat)
 
 @app.route('/sol/standards', methods=['POST'])
 def create_sol_standard():
@@ -277,33 +320,486 @@ def create_sol_standard():
 
 @app.route('/sol/standards', methods=['GET'])
 def get_sol_standards():
+    session = get_read_session()
+    subject = request.args.get('subject')
+    grade = request.args.get('grade')
+
+    query = session.query(SolStandard)
+    if subject:
+        query = query.filter(SolStandard.subject == subject)
+    if grade:
+        query = query.filter(SolStandard.grade == grade)
+    return list_response(session, query, serialize_standard)
+
+@app.route('/messages', methods=['POST'])
+def create_message():
     session = get_session()
     try:
-        subject = request.args.get('subject')
-        grade = request.args.get('grade')
-        
-        query = session.query(SolStandard)
-        if subject:
-            query = query.filter(SolStandard.subject == subject)
-        if grade:
-            query = query.filter(SolStandard.grade == grade)
-        
-        standards = query.all()
-        return jsonify([
-            {
-                'id': standard.id,
-                'subject': standard.subject,
-                'grade': standard.grade,
-                'strand': standard.strand,
-                'description': standard.description,
-                'createdAt': standard.created_at.isoformat() if standard.created_at else None
-            }
-            for standard in standards
-        ])
+        data = request.json
+        message = Message(
+            chat_id=data['chatId'],
+            role=data['role'],
+            content=data['content'],
+            token_count=count_tokens(data['content'])
+        )
+        session.add(message)
+        session.commit()
+        session.refresh(message)
+        return jsonify(serialize_message(message))
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/messages/<message_id>', methods=['DELETE'])
+def delete_message(message_id):
+    session = get_session()
+    try:
+        message = session.query(Message).filter(Message.id == message_id).first()
+        if not message:
+            return jsonify({"error": "Message not found"}), 404
+        chat_id = message.chat_id
+        session.delete(message)
+        session.commit()
+        return jsonify(serialize_chat(session.query(Chat).filter(Chat.id == chat_id).one()))
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/messages', methods=['GET'])
+def get_messages():
+    chat_id = request.args.get('chatId')
+    if not chat_id:
+        return jsonify({"error": "Query parameter 'chatId' is required"}), 400
+
+    session = get_read_session()
+    query = session.query(Message).filter(Message.chat_id == chat_id).order_by(Message.created_at)
+    return list_response(session, query, serialize_message)
+
+@app.route('/messages/context', methods=['GET'])
+def get_message_context():
+    chat_id = request.args.get('chatId')
+    budget = request.args.get('budget', type=int)
+    if not chat_id or budget is None or budget < 0:
+        return jsonify({"error": "Query parameters 'chatId' and a non-negative 'budget' are required"}), 400
+
+    session = get_read_session()
+    try:
+        return jsonify(get_context_window(session, chat_id, budget,
+                                          max_messages=request.args.get('maxMessages', type=int)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/messages/stream', methods=['GET'])
+def stream_messages():
+    """Server-sent events for messages created in a chat (chatId) or any of a user's chats (userId)"""
+    chat_id = request.args.get('chatId')
+    user_id = request.args.get('userId')
+    if not chat_id and not user_id:
+        return jsonify({"error": "Query parameter 'chatId' or 'userId' is required"}), 400
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    if last_event_id and not is_uuid(last_event_id):
+        return jsonify({"error": "Last-Event-ID must be a message id"}), 400
+
+    # Subscribed first so nothing committed during the replay is missed; event_stream drops the overlap
+    subscription = message_feed.subscribe(chat_id=chat_id, user_id=user_id)
+    if subscription is None:
+        response = jsonify({"error": "Too many live subscribers"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    replay = replay_messages(get_read_session, last_event_id, chat_id=chat_id, user_id=user_id) if last_event_id else []
+    response = Response(event_stream(subscription, replay, user_id), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs even if the client disconnects before the body is first iterated
+    response.call_on_close(lambda: message_feed.unsubscribe(subscription))
+    return response
+
+@app.route('/messages/search', methods=['GET'])
+def search_chat_messages():
+    session = get_read_session()
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "Query parameter 'q' is required"}), 400
+
+        results = search_messages(
+            session,
+            query,
+            user_id=request.args.get('userId'),
+            chat_id=request.args.get('chatId'),
+            limit=request.args.get('limit', 20, type=int),
+            offset=request.args.get('offset', 0, type=int)
+        )
+        return jsonify(results)
+    finally:
+        session.close()
+
+@app.route('/sol/match', methods=['GET'])
+def match_sol_standards():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter 'q' is required"}), 400
+
+    grade = request.args.get('grade')
+    user_id = request.args.get('userId')
+    if not grade and user_id:
+        session = get_read_session()
+        try:
+            user = session.query(User).filter(User.id == user_id).first()
+            if not user:
+                return jsonify({"error": "User not found"}), 404
+            grade = user.grade
+        finally:
+            session.close()
+
+    from sol_matcher import get_matcher  # numpy-backed; loaded on first use
+
+    matches = get_matcher().match(
+        query,
+        grade=grade,
+        k=min(request.args.get('k', 5, type=int), 50),
+        include_substandards=request.args.get('substandards', 'true').lower() != 'false'
+    )
+    return jsonify(matches)
+
+@app.route('/sol/hierarchy', methods=['GET'])
+def get_sol_hierarchy():
+    depth = max(0, min(request.args.get('depth', 1, type=int), 4))
+    subtree = get_hierarchy().subtree(request.args.get('path'), depth=depth)
+    if subtree is None:
+        return jsonify({"error": "Standard path not found"}), 404
+    return jsonify(subtree)
+
+@app.route('/sol/autocomplete', methods=['GET'])
+def autocomplete_sol_ids():
+    prefix = request.args.get('prefix', '').strip()
+    if not prefix:
+        return jsonify([])
+    return jsonify(get_hierarchy().autocomplete(prefix, limit=request.args.get('limit', 10, type=int)))
+
+@app.route('/sol/remediation', methods=['GET'])
+def get_sol_remediation():
+    user_id = request.args.get('userId')
+    sol_id = request.args.get('solId')
+    if not user_id or not sol_id:
+        return jsonify({"error": "Query parameters 'userId' and 'solId' are required"}), 400
+
+    session = get_read_session()
+    try:
+        chain = get_remediation_chain(
+            session,
+            user_id,
+            sol_id,
+            threshold=request.args.get('threshold', 0.7, type=float),
+            max_depth=request.args.get('maxDepth', 3, type=int)
+        )
+        return jsonify(chain)
+    finally:
+        session.close()
+
+@app.route('/sol/items/next', methods=['GET'])
+def get_next_pool_item():
+    sol_id = request.args.get('solId')
+    item_type = request.args.get('itemType')
+    if not sol_id or not item_type:
+        return jsonify({"error": "Query parameters 'solId' and 'itemType' are required"}), 400
+
+    session = get_session()
+    try:
+        item = pick_item(
+            session,
+            sol_id,
+            item_type,
+            difficulty=request.args.get('difficulty', 'medium'),
+            dok=request.args.get('dok', 2, type=int),
+            user_id=request.args.get('userId')
+        )
+        if not item:
+            return jsonify({"error": "No unseen items available in pool"}), 404
+        return jsonify(serialize_item(item))
+    finally:
+        session.close()
+
+@app.route('/sol/pool/targets', methods=['PUT'])
+def update_pool_targets():
+    session = get_session()
+    try:
+        data = request.json
+        targets = data if isinstance(data, list) else [data]
+        return jsonify({"updated": set_targets(session, targets)})
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/sol/pool/status', methods=['GET'])
+def get_pool_status():
+    session = get_read_session()
+    try:
+        return jsonify(pool_status(session))
+    finally:
+        session.close()
+
+@app.route('/sol/attempts/batch', methods=['POST'])
+def grade_attempt_batch():
+    data = request.json
+    if not data or not data.get('userId') or not isinstance(data.get('responses'), list):
+        return jsonify({"error": "Body must contain 'userId' and a 'responses' list"}), 400
+    for index, entry in enumerate(data['responses']):
+        if not isinstance(entry, dict) or not is_uuid(entry.get('itemId')) or 'response' not in entry:
+            return jsonify({"error": f"responses[{index}] must contain an 'itemId' UUID and a 'response'"}), 400
+        duration = entry.get('durationSeconds')
+        if duration is not None and (not isinstance(duration, int) or isinstance(duration, bool) or duration < 0):
+            return jsonify({"error": f"responses[{index}].durationSeconds must be a non-negative integer"}), 400
+
+    session = get_session()
+    try:
+        return jsonify(grade_batch(session, data['userId'], data['responses']))
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/sol/attempts/constructed', methods=['POST'])
+def submit_constructed_attempt():
+    data = request.json
+    if not data or not data.get('userId') or not data.get('itemId') or 'response' not in data:
+        return jsonify({"error": "Body must contain 'userId', 'itemId' and 'response'"}), 400
+
+    session = get_session()
+    try:
+        item = session.query(AssessmentItem).filter(AssessmentItem.id == data['itemId']).first()
+        if not item:
+            return jsonify({"error": "Item not found"}), 404
+        if item.item_type != 'CR':
+            return jsonify({"error": "Only CR items are queued for grading"}), 400
+        attempt = submit_constructed_response(session, data['userId'], item, data['response'],
+                                              data.get('durationSeconds'))
+        return jsonify(serialize_attempt(attempt)), 202
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/sol/attempts/<attempt_id>', methods=['GET'])
+def get_attempt(attempt_id):
+    session = get_read_session()
+    try:
+        attempt = session.query(AssessmentAttempt).filter(AssessmentAttempt.id == attempt_id).first()
+        if not attempt:
+            return jsonify({"error": "Attempt not found"}), 404
+        return jsonify(serialize_attempt(attempt))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
     finally:
         session.close()
 
+@app.route('/sol/grading/status', methods=['GET'])
+def get_grading_status():
+    session = get_read_session()
+    try:
+        return jsonify(queue_status(session))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/sol/cohorts', methods=['GET'])
+def get_cohort_rollup():
+    grade = request.args.get('grade')
+    if not grade:
+        return jsonify({"error": "Query parameter 'grade' is required"}), 400
+    try:
+        start = request.args.get('from')
+        end = request.args.get('to')
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+        end = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+    except ValueError:
+        return jsonify({"error": "'from' and 'to' must be YYYY-MM-DD dates"}), 400
+
+    session = get_read_session()
+    try:
+        return jsonify(cohort_report(
+            session, grade, strand=request.args.get('strand'), sol_prefix=request.args.get('solId'),
+            start=start, end=end
+        ))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/sol/cohorts/rebuild', methods=['POST'])
+def rebuild_cohort_rollups():
+    session = get_session()
+    try:
+        return jsonify({"rows": rebuild_rollups(session)})
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/sol/items/<item_id>/statistics', methods=['GET'])
+def get_item_statistics(item_id):
+    session = get_read_session()
+    try:
+        stats = session.query(ItemStatistics).filter(ItemStatistics.item_id == item_id).first()
+        if not stats:
+            return jsonify({"error": "No statistics for item"}), 404
+        return jsonify(serialize_statistics(stats))
+    finally:
+        session.close()
+
+@app.route('/sol/items/statistics/recompute', methods=['POST'])
+def recompute_statistics():
+    session = get_session()
+    try:
+        return jsonify({"items": recompute_item_statistics(session)})
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/sol/items/retire', methods=['POST'])
+def retire_poor_items():
+    session = get_session()
+    try:
+        rules = request.get_json(silent=True) or {}
+        return jsonify({"retired": retire_items(session, rules)})
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/sol/recommendations/<user_id>', methods=['GET'])
+def get_user_recommendations(user_id):
+    session = get_session()
+    try:
+        from recommendations import get_recommendations  # numpy-backed; loaded on first use
+
+        recommendations = get_recommendations(session, user_id)
+        if not recommendations:
+            return jsonify({"error": "User not found"}), 404
+        return jsonify(recommendations)
+    finally:
+        session.close()
+
+@app.route('/sol/recommendations/refresh', methods=['POST'])
+def refresh_user_recommendations():
+    session = get_session()
+    try:
+        from recommendations import refresh_recommendations
+
+        data = request.get_json(silent=True) or {}
+        count = refresh_recommendations(session, data.get('userIds'))
+        return jsonify({"refreshed": count})
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+# Model response cache
+CACHE_KEY_FIELDS = ('prompt', 'grade', 'model', 'systemPromptVersion')
+
+@app.route('/cache/lookup', methods=['POST'])
+def cache_lookup():
+    data = request.json
+    if not data or any(field not in data for field in CACHE_KEY_FIELDS):
+        return jsonify({"error": f"Body must contain {', '.join(CACHE_KEY_FIELDS)}"}), 400
+
+    session = get_session()
+    try:
+        response = response_cache.lookup(session, data['prompt'], data['grade'], data['model'],
+                                         data['systemPromptVersion'])
+        return jsonify({"hit": response is not None, "response": response})
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/cache', methods=['POST'])
+def cache_store():
+    data = request.json
+    if not data or any(field not in data for field in CACHE_KEY_FIELDS + ('response',)):
+        return jsonify({"error": f"Body must contain {', '.join(CACHE_KEY_FIELDS)}, response"}), 400
+
+    session = get_session()
+    try:
+        key = response_cache.store(
+            session, data['prompt'], data['grade'], data['model'], data['systemPromptVersion'],
+            data['response'], ttl_seconds=int(data.get('ttlSeconds', response_cache.DEFAULT_TTL_SECONDS))
+        )
+        return jsonify({"key": key}), 201
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/cache', methods=['DELETE'])
+def cache_clear():
+    session = get_session()
+    try:
+        removed = response_cache.clear(session, request.args.get('systemPromptVersion'))
+        return jsonify({"removed": removed})
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/cache/metrics', methods=['GET'])
+def cache_metrics():
+    session = get_read_session()
+    try:
+        return jsonify(response_cache.cache_stats(session))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+def start_item_pool_worker():
+    """Start the pool refill worker when ITEM_POOL_GENERATOR is 'openai' or 'stub'"""
+    generator_name = os.getenv('ITEM_POOL_GENERATOR')
+    if not generator_name:
+        return None
+    generator = OpenAIItemGenerator() if generator_name == 'openai' else StubItemGenerator()
+    worker = ItemPoolRefillWorker(get_session, generator,
+                                  interval=float(os.getenv('ITEM_POOL_REFILL_INTERVAL', '60')))
+    worker.start()
+    return worker
+
+def start_grading_workers():
+    """Start the CR grading pool when CR_GRADING_SCORER is 'openai' or 'stub'"""
+    scorer_name = os.getenv('CR_GRADING_SCORER')
+    if not scorer_name:
+        return None
+    return GradingWorkerPool(get_session, make_scorer(scorer_name),
+                             workers=int(os.getenv('CR_GRADING_WORKERS', '2'))).start()
+
 if __name__ == '__main__':
     init_database()
+    if not LOW_MEMORY:
+        from sol_matcher import get_matcher
+
+        get_matcher()
+    get_hierarchy()
+    start_item_pool_worker()
+    start_grading_workers()
     print("SQLAlchemy database service starting on port 5001...")
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    # The debug reloader runs the service in a second process
+    app.run(host='0.0.0.0', port=5001, debug=not LOW_MEMORY)
\ No newline at end of file
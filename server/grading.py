@@ -0,0 +1,244 @@
+"""
+Batch grading engine for objective assessment items (MCQ and FIB)
+
+Answers are normalized before comparison (Unicode, case, whitespace, trailing
+punctuation) and numeric answers compare by value, so ``1/2``, ``0.5``,
+``.50`` and ``2/4`` are all equivalent, as are mixed numbers like ``1 1/2``
+and ``1.5``. ``grade_batch`` grades any number of responses for one user
+and persists every ``AssessmentAttempt``, the user's ``MasteryProgress``
+updates and the item statistics in a single transaction.
+"""
+import re
+import unicodedata
+from datetime import datetime
+from fractions import Fraction
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from cohort_rollups import RollupBatch, mastery_snapshot
+from models import AssessmentAttempt, AssessmentItem, MasteryProgress, UserRecommendation
+from item_stats import DEFAULT_ABILITY, record_attempt_statistics
+from sql_compat import dialect_insert
+
+OBJECTIVE_ITEM_TYPES = ('MCQ', 'FIB')
+EWMA_ALPHA = 0.3  # Same weighting as SQLAlchemyStorage.get_user_mastery_data
+
+MASTERY_LEVELS = [(0.4, 'beginning'), (0.7, 'developing'), (0.9, 'proficient')]
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_OPTION_LABEL_RE = re.compile(r'^\(?([a-z])\s*[\)\.:](?:\s+|$)')
+_NUMBER_RE = re.compile(r'^[+-]?(\d+(\.\d*)?|\.\d+)$')
+_FRACTION_RE = re.compile(r'^([+-])?(?:(\d+)\s+)?(\d+)\s*/\s*(\d+)$')
+_THOUSANDS_RE = re.compile(r'^[+-]?\d{1,3}(,\d{3})+(\.\d*)?$')
+
+
+def normalize_answer(value: Any) -> str:
+    value = unicodedata.normalize('NFKC', str(value)).casefold()
+    value = _WHITESPACE_RE.sub(' ', value).strip()
+    return value.rstrip('.!?;').strip() if not _NUMBER_RE.match(value) else value
+
+
+def parse_number(value: Any) -> Optional[Fraction]:
+    """Exact value of an integer, decimal, fraction or mixed number answer"""
+    text = normalize_answer(value).replace('\u2212', '-')
+    if _THOUSANDS_RE.match(text):
+        text = text.replace(',', '')
+    if _NUMBER_RE.match(text):
+        return Fraction(text)
+    match = _FRACTION_RE.match(text)
+    if match:
+        sign, whole, numerator, denominator = match.groups()
+        if int(denominator) == 0:
+            return None
+        number = int(whole or 0) + Fraction(int(numerator), int(denominator))
+        return -number if sign == '-' else number
+    return None
+
+
+def answers_equivalent(response: Any, expected: Any) -> bool:
+    response_number, expected_number = parse_number(response), parse_number(expected)
+    if response_number is not None and expected_number is not None:
+        return response_number == expected_number
+    return normalize_answer(response) == normalize_answer(expected)
+
+
+def _option_index(options: List[str], answer: Any) -> Optional[int]:
+    """Resolve an MCQ answer given as a letter ('B'), labelled option ('B) 7') or option text ('7')"""
+    normalized = normalize_answer(answer)
+    if len(normalized) == 1 and normalized.isalpha():
+        index = ord(normalized) - ord('a')
+        return index if index < len(options) else None
+    label = _OPTION_LABEL_RE.match(normalized)
+    if label:
+        index = ord(label.group(1)) - ord('a')
+        if index < len(options):
+            return index
+    for index, option in enumerate(options):
+        option_text = _OPTION_LABEL_RE.sub('', normalize_answer(option))
+        if answers_equivalent(normalized, option_text) or normalized == normalize_answer(option):
+            return index
+    return None
+
+
+def grade_mcq(payload: Dict[str, Any], response: Any) -> bool:
+    options = payload.get('options') or []
+    expected = payload.get('correct_answer')
+    if expected is None:
+        return False
+    if not options:
+        return answers_equivalent(response, expected)
+    response_index, expected_index = _option_index(options, response), _option_index(options, expected)
+    return response_index is not None and response_index == expected_index
+
+
+def grade_fib(payload: Dict[str, Any], response: Any) -> bool:
+    acceptable = payload.get('correct_answers') or [payload.get('correct_answer')]
+    return any(answer is not None and answers_equivalent(response, answer) for answer in acceptable)
+
+
+def grade_item(item: AssessmentItem, response: Any) -> Dict[str, Any]:
+    """Score one objective response; raises ValueError for non-objective items"""
+    payload = item.payload or {}
+    if item.item_type == 'MCQ':
+        is_correct = grade_mcq(payload, response)
+    elif item.item_type == 'FIB':
+        is_correct = grade_fib(payload, response)
+    else:
+        raise ValueError(f"{item.item_type} items cannot be graded objectively")
+    return {
+        'isCorrect': is_correct,
+        'score': 1.0 if is_correct else 0.0,
+        'maxScore': 1.0,
+        'feedback': payload.get('explanation', '')
+    }
+
+
+def mastery_level(ewma: float) -> str:
+    for upper, level in MASTERY_LEVELS:
+        if ewma < upper:
+            return level
+    return 'advanced'
+
+
+def load_mastery(session: Session, user_id: str, sol_ids) -> Dict[str, MasteryProgress]:
+    """The user's mastery rows for ``sol_ids``, created if missing and locked for update where supported
+
+    Missing rows are inserted with ``ON CONFLICT DO NOTHING`` first, so
+    concurrent graders for the same user and standard never race on the
+    unique (user_id, sol_id) index.
+    """
+    sol_ids = list(sol_ids)
+    if sol_ids:
+        table = MasteryProgress.__table__
+        stmt = dialect_insert(session, table).on_conflict_do_nothing(
+            index_elements=[table.c.user_id, table.c.sol_id]
+        )
+        session.execute(stmt, [{'user_id': user_id, 'sol_id': sol_id} for sol_id in sol_ids])
+    rows = session.query(MasteryProgress).filter(
+        MasteryProgress.user_id == user_id, MasteryProgress.sol_id.in_(sol_ids)
+    ).with_for_update().all()
+    return {row.sol_id: row for row in rows}
+
+
+def ability(progress: MasteryProgress) -> float:
+    """Ability estimate for item statistics: the EWMA before this attempt"""
+    return progress.ewma_score if progress.attempt_count else DEFAULT_ABILITY
+
+
+def apply_mastery_update(progress: MasteryProgress, score_ratio: float, attempted_at: datetime) -> MasteryProgress:
+    """Fold one scored attempt into a row returned by ``load_mastery`` (caller commits)"""
+    if progress.attempt_count:
+        progress.ewma_score = EWMA_ALPHA * score_ratio + (1 - EWMA_ALPHA) * progress.ewma_score
+    else:
+        progress.ewma_score = score_ratio
+    progress.attempt_count += 1
+    progress.last_attempt = attempted_at
+    progress.mastery_level = mastery_level(progress.ewma_score)
+    return progress
+
+
+def invalidate_recommendations(session: Session, user_id: str):
+    """Drop the user's cached practice queue after their mastery changed (caller commits)"""
+    session.query(UserRecommendation).filter(UserRecommendation.user_id == user_id).delete(synchronize_session=False)
+
+
+def serialize_attempt(attempt: AssessmentAttempt) -> Dict[str, Any]:
+    return {
+        'id': attempt.id,
+        'userId': attempt.user_id,
+        'itemId': attempt.item_id,
+        'solId': attempt.sol_id,
+        'userResponse': attempt.user_response,
+        'isCorrect': attempt.is_correct,
+        'score': attempt.score,
+        'maxScore': attempt.max_score,
+        'feedback': attempt.feedback,
+        'durationSeconds': attempt.duration_seconds,
+        'gradingStatus': attempt.grading_status,
+        'createdAt': attempt.created_at.isoformat() if attempt.created_at else None
+    }
+
+
+def grade_batch(session: Session, user_id: str, responses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Grade ``[{itemId, response, durationSeconds?}]`` and persist everything in one transaction
+
+    Returns one result per response, in order; responses that cannot be
+    graded (unknown item, non-objective type) get an ``error`` entry and
+    are not persisted.
+    """
+    results: List[Any] = []
+    try:
+        item_ids = {entry['itemId'] for entry in responses}
+        items = {item.id: item for item in session.query(AssessmentItem).filter(AssessmentItem.id.in_(item_ids))}
+        mastery = load_mastery(session, user_id, {item.sol_id for item in items.values()})
+        rollups = RollupBatch(session, user_id)
+        now = datetime.utcnow()
+
+        for entry in responses:
+            item = items.get(entry['itemId'])
+            if item is None:
+                results.append({'itemId': entry['itemId'], 'error': 'Item not found'})
+                continue
+            if item.item_type not in OBJECTIVE_ITEM_TYPES:
+                results.append({'itemId': item.id, 'error': f"{item.item_type} items are graded via /sol/attempts/constructed"})
+                continue
+
+            graded = grade_item(item, entry['response'])
+            attempt = AssessmentAttempt(
+                user_id=user_id,
+                item_id=item.id,
+                sol_id=item.sol_id,
+                user_response=entry['response'],
+                is_correct=graded['isCorrect'],
+                score=graded['score'],
+                max_score=graded['maxScore'],
+                feedback=graded['feedback'],
+                duration_seconds=entry.get('durationSeconds'),
+                created_at=now
+            )
+            session.add(attempt)
+
+            progress = mastery[item.sol_id]
+            record_attempt_statistics(
+                session, item.id, attempt.is_correct, attempt.score, attempt.max_score,
+                attempt.duration_seconds, ability(progress)
+            )
+            before = mastery_snapshot(progress)
+            apply_mastery_update(progress, graded['score'] / graded['maxScore'], now)
+            rollups.add(attempt, now.date(), before, progress)
+            results.append(attempt)
+
+        rollups.flush()
+        if any(isinstance(result, AssessmentAttempt) for result in results):
+            invalidate_recommendations(session, user_id)
+        session.flush()
+        # Serialized before the commit expires them, which would reload every attempt
+        serialized = [serialize_attempt(result) if isinstance(result, AssessmentAttempt) else result
+                      for result in results]
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return serialized
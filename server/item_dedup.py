@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Content-hash deduplication for assessment items
+
+Every item gets a ``content_hash`` over its pool bucket (standard, type,
+difficulty and DOK), normalized stem and normalized answer payload (option
+texts without their letters, and the correct answer(s) resolved to text),
+backed by a unique index. Inserting an item is a single ``INSERT ... ON
+CONFLICT (content_hash) DO UPDATE ... RETURNING id`` that yields the
+existing row's id for duplicates. The same question generated for another
+difficulty or DOK level is a new item, so it can fill that bucket.
+
+Near-duplicates that differ in wording are found offline by MinHash over
+word shingles with LSH banding, clustered per pool bucket.
+
+    python item_dedup.py              # report near-duplicate clusters
+    python item_dedup.py --retire     # also retire all but the oldest item of each cluster
+"""
+import argparse
+import hashlib
+import json
+import re
+import unicodedata
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models import AssessmentItem, generate_uuid
+from sql_compat import dialect_insert
+
+if TYPE_CHECKING:
+    import numpy as np  # Imported where used: only the near-duplicate job needs it
+
+_OPTION_LABEL_RE = re.compile(r'^\s*\(?[A-Za-z]\s*[\)\.:]\s+')
+_WHITESPACE_RE = re.compile(r'\s+')
+_WORD_RE = re.compile(r'\w+')
+
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 32
+NEAR_DUPLICATE_THRESHOLD = 0.8
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def normalize_text(value: Any) -> str:
+    value = unicodedata.normalize('NFKC', str(value)).casefold()
+    return _WHITESPACE_RE.sub(' ', value).strip().rstrip('.?!')
+
+
+def _answer_content(item_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """The answer-bearing parts of a payload, independent of option order and labels"""
+    content: Dict[str, Any] = {}
+    options = payload.get('options') or []
+    if options:
+        texts = [normalize_text(_OPTION_LABEL_RE.sub('', str(option))) for option in options]
+        content['options'] = sorted(texts)
+        answer = payload.get('correct_answer')
+        if isinstance(answer, str) and len(answer.strip()) == 1 and answer.strip().isalpha():
+            index = ord(answer.strip().upper()) - ord('A')
+            if 0 <= index < len(texts):
+                answer = texts[index]
+        if answer is not None:
+            content['answer'] = normalize_text(_OPTION_LABEL_RE.sub('', str(answer)))
+    answers = payload.get('correct_answers')
+    if answers:
+        content['answers'] = sorted(normalize_text(answer) for answer in answers)
+    elif item_type == 'FIB' and payload.get('correct_answer') is not None:
+        content['answers'] = [normalize_text(payload['correct_answer'])]
+    return content
+
+
+def content_hash(sol_id: str, item_type: str, difficulty: str, dok: int, stem: str,
+                 payload: Dict[str, Any]) -> str:
+    canonical = json.dumps({
+        'sol': sol_id,
+        'type': item_type,
+        'difficulty': difficulty,
+        'dok': int(dok),
+        'stem': normalize_text(stem),
+        'answer': _answer_content(item_type, payload or {}),
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def insert_item(session: Session, item_data: Dict[str, Any]) -> Tuple[str, bool]:
+    """Insert an item unless an identical one exists; returns (item id, created)
+
+    ``item_data`` uses the API's camelCase keys. The caller commits.
+    """
+    new_id = generate_uuid()
+    table = AssessmentItem.__table__
+    values = {
+        'id': new_id,
+        'sol_id': item_data['solId'],
+        'item_type': item_data['itemType'],
+        'difficulty': item_data['difficulty'],
+        'dok': item_data['dok'],
+        'stem': item_data['stem'],
+        'payload': item_data['payload'],
+        'content_hash': content_hash(item_data['solId'], item_data['itemType'], item_data['difficulty'],
+                                     item_data['dok'], item_data['stem'], item_data['payload']),
+    }
+    stmt = dialect_insert(session, table).values(**values)
+    # A no-op update makes RETURNING yield the existing row on conflict
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.content_hash],
+        set_={'content_hash': stmt.excluded.content_hash}
+    ).returning(table.c.id)
+    item_id = session.execute(stmt).scalar_one()
+    return item_id, item_id == new_id
+
+
+def _assign_hashes(conn, batch_size: int, only_missing: bool):
+    """Hash items oldest first; a row that duplicates an earlier one gets NULL"""
+    table = AssessmentItem.__table__
+    seen = set()
+    query = table.select().order_by(table.c.created_at, table.c.id)
+    if only_missing:
+        seen.update(row[0] for row in conn.execute(text(
+            "SELECT content_hash FROM assessment_items WHERE content_hash IS NOT NULL"
+        )))
+        query = query.where(table.c.content_hash.is_(None))
+    updates = []
+    for row in conn.execute(query).mappings():
+        digest = content_hash(row['sol_id'], row['item_type'], row['difficulty'], row['dok'],
+                              row['stem'], row['payload'])
+        if digest in seen:
+            digest = None
+        else:
+            seen.add(digest)
+        if digest != row['content_hash']:
+            updates.append({'item_id': row['id'], 'digest': digest})
+    for start in range(0, len(updates), batch_size):
+        conn.execute(text("UPDATE assessment_items SET content_hash = :digest WHERE id = :item_id"),
+                     updates[start:start + batch_size])
+
+
+def ensure_content_hash_schema(engine: Engine, batch_size: int = 1000):
+    """Add, backfill and uniquely index ``content_hash`` on pre-existing databases
+
+    Rows that duplicate an earlier row keep a NULL hash so the unique index can
+    be built; the near-duplicate pass reports them as exact duplicates.
+    """
+    columns = {column['name'] for column in inspect(engine).get_columns('assessment_items')}
+    with engine.begin() as conn:
+        if 'content_hash' not in columns:
+            conn.execute(text("ALTER TABLE assessment_items ADD COLUMN content_hash VARCHAR(64)"))
+        _assign_hashes(conn, batch_size, only_missing=True)
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_assessment_items_content_hash "
+            "ON assessment_items (content_hash)"
+        ))
+
+
+def rehash_items(engine: Engine, batch_size: int = 1000):
+    """Recompute every hash after the hashed fields changed (difficulty and DOK were added)
+
+    New-format hashes never equal old ones, so rows can be updated in place
+    under the unique index.
+    """
+    with engine.begin() as conn:
+        _assign_hashes(conn, batch_size, only_missing=False)
+
+
+def _shingles(value: str, size: int = 3) -> 'np.ndarray':
+    import numpy as np
+
+    words = _WORD_RE.findall(normalize_text(value))
+    if len(words) < size:
+        grams = {' '.join(words)} if words else set()
+    else:
+        grams = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.array([zlib.crc32(gram.encode('utf-8')) for gram in grams], dtype=np.uint64)
+
+
+def minhash_signatures(documents: List[str], permutations: int = MINHASH_PERMUTATIONS,
+                       seed: int = 1) -> 'np.ndarray':
+    """(documents x permutations) MinHash signatures using universal hashing mod 2^31 - 1"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, size=(permutations, 1), dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, size=(permutations, 1), dtype=np.uint64)
+    signatures = np.full((len(documents), permutations), _MERSENNE_PRIME, dtype=np.uint64)
+    for i, document in enumerate(documents):
+        shingles = _shingles(document) % _MERSENNE_PRIME
+        if shingles.size:
+            signatures[i] = ((a * shingles[np.newaxis, :] + b) % _MERSENNE_PRIME).min(axis=1)
+    return signatures
+
+
+def _cluster(signatures: 'np.ndarray', threshold: float, bands: int) -> List[List[int]]:
+    import numpy as np
+
+    rows_per_band = signatures.shape[1] // bands
+    parent = list(range(len(signatures)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    checked = set()
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = {}
+        chunk = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        for i in range(len(signatures)):
+            buckets.setdefault(chunk[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            for j in members[1:]:
+                pair = (members[0], j)
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                if np.mean(signatures[members[0]] == signatures[j]) >= threshold:
+                    parent[find(j)] = find(members[0])
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(signatures)):
+        clusters.setdefault(find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def find_near_duplicates(session: Session, threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                         bands: int = MINHASH_BANDS) -> List[Dict[str, Any]]:
+    """Clusters of near-identical items per (sol_id, item_type, difficulty, dok), oldest item first"""
+    groups: Dict[Tuple[str, str, str, int], List[AssessmentItem]] = {}
+    query = session.query(AssessmentItem).filter(AssessmentItem.is_retired.is_(False)).order_by(
+        AssessmentItem.sol_id, AssessmentItem.item_type, AssessmentItem.created_at
+    )
+    for item in query.yield_per(1000):
+        groups.setdefault((item.sol_id, item.item_type, item.difficulty, item.dok), []).append(item)
+
+    clusters = []
+    for (sol_id, item_type, difficulty, dok), items in groups.items():
+        if len(items) < 2:
+            continue
+        documents = [
+            f"{item.stem} {' '.join(str(v) for v in _answer_content(item_type, item.payload or {}).values())}"
+            for item in items
+        ]
+        for members in _cluster(minhash_signatures(documents), threshold, bands):
+            clusters.append({
+                'solId': sol_id,
+                'itemType': item_type,
+                'difficulty': difficulty,
+                'dok': dok,
+                'itemIds': [items[i].id for i in sorted(members)],
+                'stems': [items[i].stem for i in sorted(members)],
+            })
+    return clusters
+
+
+def retire_near_duplicates(session: Session, clusters: List[Dict[str, Any]]) -> int:
+    """Keep the oldest item of each cluster and retire the rest"""
+    duplicate_ids = [item_id for cluster in clusters for item_id in cluster['itemIds'][1:]]
+    if not duplicate_ids:
+        return 0
+    count = session.query(AssessmentItem).filter(AssessmentItem.id.in_(duplicate_ids)).update(
+        {AssessmentItem.is_retired: True}, synchronize_session=False
+    )
+    session.commit()
+    return count
+
+
+def main(argv: Optional[List[str]] = None):
+    from models import db_manager
+
+    parser = argparse.ArgumentParser(description='Report (and optionally retire) near-duplicate items')
+    parser.add_argument('--threshold', type=float, default=NEAR_DUPLICATE_THRESHOLD)
+    parser.add_argument('--retire', action='store_true')
+    args = parser.parse_args(argv)
+
+    session = db_manager.get_session()
+    try:
+        clusters = find_near_duplicates(session, threshold=args.threshold)
+        for cluster in clusters:
+            print(f"{cluster['solId']} {cluster['itemType']} {cluster['difficulty']} DOK {cluster['dok']}: "
+                  f"{len(cluster['itemIds'])} items")
+            for item_id, stem in zip(cluster['itemIds'], cluster['stems']):
+                print(f"    {item_id}  {stem[:80]}")
+        print(f"Found {len(clusters)} near-duplicate clusters")
+        if args.retire:
+            print(f"✓ Retired {retire_near_duplicates(session, clusters)} items")
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Pre-generated assessment item pool for StudyBuddy AI
+
+Keeps a target inventory of ``AssessmentItem`` rows per
+(sol_id, item_type, difficulty, dok) bucket so serving a practice item does
+not wait on a model call. Every item carries a uniform ``random_key``; a
+random pick seeks the bucket's composite index at a random point and takes
+the first item at or after it that the user has not attempted, which is
+O(log n) instead of ``ORDER BY random()`` over the whole bucket.
+
+A background ``ItemPoolRefillWorker`` tops buckets back up using a pluggable
+generator: ``StubItemGenerator`` is deterministic and offline (tests, local
+development) and ``OpenAIItemGenerator`` mirrors the prompts used by
+``/api/sol/generate-item``.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, func, inspect, or_, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from item_dedup import insert_item
+from models import AssessmentAttempt, AssessmentItem, ItemPoolTarget, SolStandard
+from sql_compat import random_unit
+
+DEFAULT_DOK = 2
+REFILL_INTERVAL_SECONDS = 60
+MAX_GENERATED_PER_BUCKET = 5  # Per refill pass, so one bucket cannot starve the rest
+
+
+def ensure_item_pool_schema(engine: Engine):
+    """Add pool columns and indexes to databases created before the pool existed"""
+    columns = {column['name'] for column in inspect(engine).get_columns('assessment_items')}
+    with engine.begin() as conn:
+        if 'random_key' not in columns:
+            conn.execute(text("ALTER TABLE assessment_items ADD COLUMN random_key FLOAT"))
+            conn.execute(update(AssessmentItem.__table__).values(random_key=random_unit()))
+        if 'is_retired' not in columns:
+            conn.execute(text("ALTER TABLE assessment_items ADD COLUMN is_retired BOOLEAN NOT NULL DEFAULT false"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_assessment_items_pool "
+            "ON assessment_items (sol_id, item_type, difficulty, dok, random_key)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_assessment_attempts_user_item "
+            "ON assessment_attempts (user_id, item_id)"
+        ))
+
+
+def ensure_random_key_default(engine: Engine):
+    """Give ``random_key`` a server-side default and key rows inserted without one
+
+    The Node app inserts items without ``random_key``, so the column needs a
+    database default there. SQLite cannot alter a column's default; its rows
+    only come from the ORM, which always sets one, so backfilling is enough.
+    """
+    with engine.begin() as conn:
+        table = AssessmentItem.__table__
+        conn.execute(update(table).where(table.c.random_key.is_(None)).values(random_key=random_unit()))
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text("ALTER TABLE assessment_items ALTER COLUMN random_key SET DEFAULT random()"))
+            conn.execute(text("ALTER TABLE assessment_items ALTER COLUMN random_key SET NOT NULL"))
+
+
+def serialize_item(item: AssessmentItem) -> Dict[str, Any]:
+    return {
+        'id': item.id,
+        'solId': item.sol_id,
+        'itemType': item.item_type,
+        'difficulty': item.difficulty,
+        'dok': item.dok,
+        'stem': item.stem,
+        'payload': item.payload,
+        'createdAt': item.created_at.isoformat() if item.created_at else None
+    }
+
+
+def _bucket_filter(sol_id: str, item_type: str, difficulty: str, dok: int):
+    return and_(
+        AssessmentItem.sol_id == sol_id,
+        AssessmentItem.item_type == item_type,
+        AssessmentItem.difficulty == difficulty,
+        AssessmentItem.dok == dok,
+        AssessmentItem.is_retired.is_(False),
+    )
+
+
+def pick_item(session: Session, sol_id: str, item_type: str, difficulty: str = 'medium',
+              dok: int = DEFAULT_DOK, user_id: Optional[str] = None) -> Optional[AssessmentItem]:
+    """Random unseen item from a bucket via an index seek, or None if the pool is exhausted"""
+    query = session.query(AssessmentItem).filter(_bucket_filter(sol_id, item_type, difficulty, dok))
+    if user_id:
+        attempted = session.query(AssessmentAttempt.id).filter(
+            AssessmentAttempt.user_id == user_id,
+            AssessmentAttempt.item_id == AssessmentItem.id
+        )
+        query = query.filter(~attempted.exists())
+
+    point = random.random()
+    item = query.filter(AssessmentItem.random_key >= point).order_by(AssessmentItem.random_key).first()
+    if item is None:
+        # Wrap around the key space; only reached when nothing sits above the seek point.
+        # Unkeyed rows (inserted before their migration backfill) are still servable here.
+        item = query.filter(or_(AssessmentItem.random_key < point, AssessmentItem.random_key.is_(None))) \
+            .order_by(AssessmentItem.random_key).first()
+    return item
+
+
+def set_targets(session: Session, targets: List[Dict[str, Any]]) -> int:
+    """Create or update bucket targets from ``{solId, itemType, difficulty, dok, target}`` dicts"""
+    for target in targets:
+        session.merge(ItemPoolTarget(
+            sol_id=target['solId'],
+            item_type=target['itemType'],
+            difficulty=target.get('difficulty', 'medium'),
+            dok=target.get('dok', DEFAULT_DOK),
+            target=int(target['target'])
+        ))
+    session.commit()
+    return len(targets)
+
+
+def pool_status(session: Session) -> List[Dict[str, Any]]:
+    """Active (non-retired) inventory against target for every configured bucket"""
+    inventory = session.query(
+        AssessmentItem.sol_id, AssessmentItem.item_type, AssessmentItem.difficulty, AssessmentItem.dok,
+        func.count(AssessmentItem.id).label('inventory')
+    ).filter(AssessmentItem.is_retired.is_(False)).group_by(
+        AssessmentItem.sol_id, AssessmentItem.item_type, AssessmentItem.difficulty, AssessmentItem.dok
+    ).subquery()
+
+    rows = session.query(ItemPoolTarget, func.coalesce(inventory.c.inventory, 0)).outerjoin(
+        inventory,
+        and_(
+            inventory.c.sol_id == ItemPoolTarget.sol_id,
+            inventory.c.item_type == ItemPoolTarget.item_type,
+            inventory.c.difficulty == ItemPoolTarget.difficulty,
+            inventory.c.dok == ItemPoolTarget.dok,
+        )
+    ).all()
+
+    return [
+        {
+            'solId': target.sol_id,
+            'itemType': target.item_type,
+            'difficulty': target.difficulty,
+            'dok': target.dok,
+            'target': target.target,
+            'inventory': count,
+            'deficit': max(0, target.target - count)
+        }
+        for target, count in rows
+    ]
+
+
+ItemGenerator = Callable[[Dict[str, Any], str, str, int], Dict[str, Any]]
+
+
+class StubItemGenerator:
+    """Deterministic offline generator: same inputs and call count give the same item"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, standard: Dict[str, Any], item_type: str, difficulty: str, dok: int) -> Dict[str, Any]:
+        self.calls += 1
+        seed = f"{standard['id']}|{item_type}|{difficulty}|{dok}|{self.calls}"
+        n = int(hashlib.sha256(seed.encode()).hexdigest()[:6], 16) % 90 + 10
+        question = f"[{standard['id']} #{self.calls}] What is {n} + {n}?"
+        if item_type == 'MCQ':
+            payload = {'question': question,
+                       'options': [f"A) {2 * n}", f"B) {2 * n + 1}", f"C) {n}", f"D) {2 * n - 1}"],
+                       'correct_answer': 'A', 'explanation': f"{n} + {n} = {2 * n}"}
+        elif item_type == 'FIB':
+            payload = {'question': question.replace('?', ' __blank__'),
+                       'correct_answers': [str(2 * n)], 'explanation': f"{n} + {n} = {2 * n}"}
+        else:
+            payload = {'question': f"{question} Explain how you know.",
+                       'rubric': {'excellent': 'Correct sum with a clear explanation',
+                                  'good': 'Correct sum with a partial explanation',
+                                  'satisfactory': 'Correct sum without explanation',
+                                  'needs_improvement': 'Incorrect sum'},
+                       'sample_answer': f"{2 * n}, because {n} doubled is {2 * n}."}
+        return {'stem': payload['question'], 'payload': {**payload, 'generatedBy': 'stub'}}
+
+
+class OpenAIItemGenerator:
+    """Generates items with the OpenAI chat API using the /api/sol/generate-item formats"""
+
+    FORMATS = {
+        'MCQ': '{"question": "Clear question text", "options": ["A) Option 1", "B) Option 2", '
+               '"C) Option 3", "D) Option 4"], "correct_answer": "A", "explanation": "Why this is correct"}',
+        'FIB': '{"question": "Question with __blank__ to fill in", '
+               '"correct_answers": ["acceptable answer 1"], "explanation": "What makes a good answer"}',
+        'CR': '{"question": "Open-ended question", "rubric": {"excellent": "4 points criteria", '
+              '"good": "3 points criteria", "satisfactory": "2 points criteria", '
+              '"needs_improvement": "1 point criteria"}, "sample_answer": "Example of excellent response"}',
+    }
+
+    def __init__(self, model: str = 'gpt-4o'):
+        from openai import OpenAI  # Optional dependency, only needed when this generator is used
+
+        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.model = model
+
+    def __call__(self, standard: Dict[str, Any], item_type: str, difficulty: str, dok: int) -> Dict[str, Any]:
+        system_prompt = (
+            "You are an expert educational assessment creator specializing in Virginia Standards "
+            f"of Learning (SOL) aligned questions.\n\nCreate a {difficulty} difficulty {item_type} question "
+            f"at Depth of Knowledge level {dok} for Grade {standard['grade']} students aligned to:\n"
+            f"Standard: {standard['id']}\nSubject: {standard['subject']}\n"
+            f"Description: {standard['description']}\n\n"
+            f"Respond with only valid JSON matching this structure:\n{self.FORMATS[item_type]}"
+        )
+        completion = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': f"Generate a {item_type} question for: {standard['description']}"}
+            ],
+            temperature=0.7,
+            max_tokens=1000,
+            response_format={'type': 'json_object'}
+        )
+        data = json.loads(completion.choices[0].message.content)
+        return {'stem': data['question'], 'payload': {**data, 'generatedBy': f"openai-{self.model}"}}
+
+
+def refill_once(session: Session, generator: ItemGenerator,
+                max_per_bucket: int = MAX_GENERATED_PER_BUCKET) -> int:
+    """Generate items for every bucket below target; returns the number of new items
+
+    Generated duplicates of existing items are dropped by the content hash and
+    simply leave the deficit for the next pass.
+    """
+    created = 0
+    for bucket in pool_status(session):
+        if bucket['deficit'] <= 0:
+            continue
+        standard = session.query(SolStandard).filter(SolStandard.id == bucket['solId']).first()
+        if standard is None:
+            continue
+        standard_data = {'id': standard.id, 'subject': standard.subject, 'grade': standard.grade,
+                         'strand': standard.strand, 'description': standard.description}
+        session.commit()  # Generation can take seconds; don't hold a transaction (SQLite's write slot) meanwhile
+        for _ in range(min(bucket['deficit'], max_per_bucket)):
+            generated = generator(standard_data, bucket['itemType'], bucket['difficulty'], bucket['dok'])
+            _item_id, is_new = insert_item(session, {
+                'solId': bucket['solId'],
+                'itemType': bucket['itemType'],
+                'difficulty': bucket['difficulty'],
+                'dok': bucket['dok'],
+                'stem': generated['stem'],
+                'payload': generated['payload']
+            })
+            session.commit()
+            created += int(is_new)
+    return created
+
+
+class ItemPoolRefillWorker(threading.Thread):
+    """Daemon thread that periodically tops every bucket back up to its target"""
+
+    def __init__(self, session_factory: Callable[[], Session], generator: ItemGenerator,
+                 interval: float = REFILL_INTERVAL_SECONDS):
+        super().__init__(name='item-pool-refill', daemon=True)
+        self.session_factory = session_factory
+        self.generator = generator
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            session = self.session_factory()
+            try:
+                created = refill_once(session, self.generator)
+                if created:
+                    print(f"Item pool: generated {created} items")
+            except Exception as e:
+                session.rollback()
+                print(f"Item pool refill failed: {e}")
+            finally:
+                session.close()
+            self._stop_event.wait(self.interval)
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop_event.set()
+        self.join(timeout)
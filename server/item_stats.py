@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Per-item assessment statistics for StudyBuddy AI
+
+``item_statistics`` keeps running sums per ``AssessmentItem`` that are
+updated in the same transaction as each recorded attempt, so difficulty
+(p-value), mean score ratio, mean duration and point-biserial
+discrimination are available without scanning ``assessment_attempts``.
+
+Discrimination correlates correctness with an ability estimate for the
+student: their mastery EWMA on the standard just before the attempt
+(``DEFAULT_ABILITY`` before their first). Incremental updates read it from
+``mastery_progress``; the backfill replays each student's attempts in the
+order they were graded to get the same values.
+
+    python item_stats.py recompute    # rebuild every item's statistics
+    python item_stats.py retire       # retire items outside the thresholds
+"""
+import math
+import sys
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import AssessmentAttempt, AssessmentItem, ItemStatistics, MasteryProgress
+from sql_compat import dialect_insert
+
+DEFAULT_ABILITY = 0.5
+
+RETIREMENT_RULES = {
+    'min_attempts': 30,
+    'min_p_value': 0.1,      # Almost nobody gets it right: too hard or broken key
+    'max_p_value': 0.95,     # Almost everybody gets it right: too easy
+    'min_discrimination': 0.1,
+}
+
+
+def point_biserial(n: float, sum_x: float, sum_y: float, sum_y2: float, sum_xy: float) -> Optional[float]:
+    """Pearson correlation of binary x with y from running sums (x * x == x)"""
+    var_x = n * sum_x - sum_x * sum_x
+    var_y = n * sum_y2 - sum_y * sum_y
+    if n < 2 or var_x <= 0 or var_y <= 0:
+        return None
+    return (n * sum_xy - sum_x * sum_y) / math.sqrt(var_x * var_y)
+
+
+def _derived(row) -> Dict[str, Any]:
+    n = row.attempt_count
+    return {
+        'p_value': row.correct_count / n if n else None,
+        'mean_score': row.score_ratio_sum / n if n else None,
+        'mean_duration': row.duration_sum / row.duration_count if row.duration_count else None,
+        'discrimination': point_biserial(n, row.correct_count, row.ability_sum,
+                                         row.ability_sq_sum, row.correct_ability_sum),
+    }
+
+
+def current_ability(session: Session, user_id: str, sol_id: str) -> float:
+    ewma = session.query(MasteryProgress.ewma_score).filter(
+        MasteryProgress.user_id == user_id, MasteryProgress.sol_id == sol_id
+    ).filter(MasteryProgress.attempt_count > 0).scalar()
+    return DEFAULT_ABILITY if ewma is None else ewma
+
+
+def record_attempt_statistics(session: Session, item_id: str, is_correct: bool, score: float,
+                              max_score: float, duration_seconds: Optional[int], ability: float):
+    """Fold one attempt into the item's running statistics (caller commits)"""
+    x = 1 if is_correct else 0
+    increments = {
+        'attempt_count': 1,
+        'correct_count': x,
+        'score_ratio_sum': score / max_score if max_score else 0.0,
+        'duration_sum': duration_seconds or 0,
+        'duration_count': 1 if duration_seconds is not None else 0,
+        'ability_sum': ability,
+        'ability_sq_sum': ability * ability,
+        'correct_ability_sum': x * ability,
+    }
+    table = ItemStatistics.__table__
+    stmt = dialect_insert(session, table).values(item_id=item_id, updated_at=datetime.utcnow(), **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.item_id],
+        set_={
+            **{column: table.c[column] + stmt.excluded[column] for column in increments},
+            'updated_at': stmt.excluded.updated_at,
+        }
+    ).returning(*table.c)
+    row = session.execute(stmt).one()
+    session.execute(table.update().where(table.c.item_id == item_id).values(**_derived(row)))
+
+
+def recompute_item_statistics(session: Session) -> int:
+    """Rebuild all statistics from assessment_attempts with vectorized group-bys"""
+    import numpy as np  # Only the batch jobs need numpy; keep it out of the service's idle footprint
+
+    from grading import EWMA_ALPHA  # grading imports this module
+
+    # Replayed in the order grading applied the mastery updates (CR attempts when they were scored)
+    graded_order = func.coalesce(AssessmentAttempt.graded_at, AssessmentAttempt.created_at)
+    rows = session.query(
+        AssessmentAttempt.item_id, AssessmentAttempt.user_id, AssessmentAttempt.sol_id,
+        AssessmentAttempt.is_correct, AssessmentAttempt.score, AssessmentAttempt.max_score,
+        AssessmentAttempt.duration_seconds
+    ).filter(AssessmentAttempt.grading_status == 'graded').order_by(
+        AssessmentAttempt.user_id, AssessmentAttempt.sol_id, graded_order, AssessmentAttempt.id
+    ).yield_per(10000)
+    item_ids, correct, ratio, duration, ability = [], [], [], [], []
+    ewma: Dict[tuple, float] = {}
+    for item_id, user_id, sol_id, is_correct, score, max_score, duration_seconds in rows:
+        r = score / max_score if max_score else 0.0
+        previous = ewma.get((user_id, sol_id))
+        item_ids.append(item_id)
+        correct.append(1.0 if is_correct else 0.0)
+        ratio.append(r)
+        duration.append(np.nan if duration_seconds is None else duration_seconds)
+        ability.append(DEFAULT_ABILITY if previous is None else previous)
+        ewma[(user_id, sol_id)] = r if previous is None else EWMA_ALPHA * r + (1 - EWMA_ALPHA) * previous
+
+    session.query(ItemStatistics).delete()
+    if not item_ids:
+        session.commit()
+        return 0
+
+    items, item_idx = np.unique(np.array(item_ids, dtype=object), return_inverse=True)
+    x = np.array(correct)
+    r = np.array(ratio)
+    d = np.array(duration, dtype=np.float64)
+    y = np.array(ability)
+    has_duration = ~np.isnan(d)
+
+    size = len(items)
+    sums = {
+        'attempt_count': np.bincount(item_idx, minlength=size),
+        'correct_count': np.bincount(item_idx, weights=x, minlength=size),
+        'score_ratio_sum': np.bincount(item_idx, weights=r, minlength=size),
+        'duration_sum': np.bincount(item_idx, weights=np.nan_to_num(d), minlength=size),
+        'duration_count': np.bincount(item_idx, weights=has_duration, minlength=size),
+        'ability_sum': np.bincount(item_idx, weights=y, minlength=size),
+        'ability_sq_sum': np.bincount(item_idx, weights=y * y, minlength=size),
+        'correct_ability_sum': np.bincount(item_idx, weights=x * y, minlength=size),
+    }
+    n = sums['attempt_count'].astype(np.float64)
+    var_x = n * sums['correct_count'] - sums['correct_count'] ** 2
+    var_y = n * sums['ability_sq_sum'] - sums['ability_sum'] ** 2
+    cov = n * sums['correct_ability_sum'] - sums['correct_count'] * sums['ability_sum']
+    valid = (n >= 2) & (var_x > 0) & (var_y > 0)
+    discrimination = np.divide(cov, np.sqrt(np.where(valid, var_x * var_y, 1.0)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_duration = sums['duration_sum'] / sums['duration_count']
+
+    now = datetime.utcnow()
+    session.bulk_insert_mappings(ItemStatistics, [
+        {
+            'item_id': items[i],
+            'attempt_count': int(sums['attempt_count'][i]),
+            'correct_count': int(sums['correct_count'][i]),
+            'score_ratio_sum': float(sums['score_ratio_sum'][i]),
+            'duration_sum': float(sums['duration_sum'][i]),
+            'duration_count': int(sums['duration_count'][i]),
+            'ability_sum': float(sums['ability_sum'][i]),
+            'ability_sq_sum': float(sums['ability_sq_sum'][i]),
+            'correct_ability_sum': float(sums['correct_ability_sum'][i]),
+            'p_value': float(sums['correct_count'][i] / n[i]),
+            'mean_score': float(sums['score_ratio_sum'][i] / n[i]),
+            'mean_duration': float(mean_duration[i]) if sums['duration_count'][i] else None,
+            'discrimination': float(discrimination[i]) if valid[i] else None,
+            'updated_at': now,
+        }
+        for i in range(size)
+    ])
+    session.commit()
+    return size
+
+
+def retire_items(session: Session, rules: Optional[Dict[str, float]] = None) -> int:
+    """Retire items whose statistics fall outside ``rules``; returns the number retired"""
+    rules = {**RETIREMENT_RULES, **(rules or {})}
+    flagged = session.query(ItemStatistics.item_id).filter(
+        ItemStatistics.attempt_count >= rules['min_attempts'],
+        (ItemStatistics.p_value < rules['min_p_value'])
+        | (ItemStatistics.p_value > rules['max_p_value'])
+        | (ItemStatistics.discrimination < rules['min_discrimination'])
+    )
+    count = session.query(AssessmentItem).filter(
+        AssessmentItem.id.in_(flagged.scalar_subquery()),
+        AssessmentItem.is_retired.is_(False)
+    ).update({AssessmentItem.is_retired: True}, synchronize_session=False)
+    session.commit()
+    return count
+
+
+def serialize_statistics(stats: ItemStatistics) -> Dict[str, Any]:
+    return {
+        'itemId': stats.item_id,
+        'attemptCount': stats.attempt_count,
+        'pValue': stats.p_value,
+        'meanScore': stats.mean_score,
+        'meanDurationSeconds': stats.mean_duration,
+        'discrimination': stats.discrimination,
+        'updatedAt': stats.updated_at.isoformat() if stats.updated_at else None
+    }
+
+
+if __name__ == '__main__':
+    from models import db_manager
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'recompute'
+    session = db_manager.get_session()
+    try:
+        if command == 'recompute':
+            print(f"✓ Recomputed statistics for {recompute_item_statistics(session)} items")
+        elif command == 'retire':
+            print(f"✓ Retired {retire_items(session)} items")
+        else:
+            print(f"Unknown command: {command} (expected 'recompute' or 'retire')")
+            sys.exit(1)
+    finally:
+        session.close()
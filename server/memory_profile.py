@@ -0,0 +1,58 @@
+"""
+Low-memory operating profile for the data service
+
+Enabled with ``DATA_SERVICE_PROFILE=low-memory`` for small devices where
+the data service shares 1-2 GB with PostgreSQL and Node. It shrinks the
+connection pool and SQLite page cache, streams list responses instead of
+building them in memory, defers the numpy-backed matcher until it is first
+used and runs without the debug reloader's second process. The budget it
+is measured against is documented in DOCKER_DEPLOYMENT.md.
+"""
+import os
+import resource
+from typing import Any, Dict, Optional
+
+from sqlalchemy.engine import make_url
+
+LOW_MEMORY = os.getenv('DATA_SERVICE_PROFILE', '').lower() == 'low-memory'
+LIST_BATCH_SIZE = int(os.getenv('LIST_BATCH_SIZE', '100' if LOW_MEMORY else '1000'))
+MEMORY_BUDGET_MB = float(os.getenv('MEMORY_BUDGET_MB', '120' if LOW_MEMORY else '0')) or None
+SQLITE_CACHE_SIZE_KB = '2048' if LOW_MEMORY else '16384'
+
+
+def engine_options(database_url: str) -> Dict[str, Any]:
+    """Extra ``create_engine`` arguments for the active profile"""
+    if not LOW_MEMORY:
+        return {}
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}  # In-memory databases use a single-connection pool
+    return {'pool_size': 2, 'max_overflow': 2, 'pool_recycle': 300}
+
+
+def current_rss_kb() -> Optional[int]:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+
+
+def memory_report() -> Dict[str, Any]:
+    rss = current_rss_kb()
+    report = {
+        'profile': 'low-memory' if LOW_MEMORY else 'default',
+        'rssMiB': round(rss / 1024, 1) if rss is not None else None,
+        'peakRssMiB': round(peak_rss_kb() / 1024, 1),
+        'budgetMiB': MEMORY_BUDGET_MB,
+    }
+    if MEMORY_BUDGET_MB and rss is not None:
+        report['withinBudget'] = rss / 1024 <= MEMORY_BUDGET_MB
+    return report
@@ -0,0 +1,105 @@
+"""
+Token-budgeted conversation context for StudyBuddy AI
+
+Every ``Message`` stores its ``token_count`` at insert time. Building the
+context for a model request then scans the chat newest-first over the
+(chat_id, created_at) index, streaming rows and stopping as soon as the
+next message would exceed the budget, instead of loading the whole chat.
+
+Token counts use tiktoken when it is installed and otherwise a
+characters-per-token estimate; either way each message also pays the chat
+format's per-message overhead.
+"""
+import math
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from compression import decompress_text
+from models import Message
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators in the chat completion format
+CHARS_PER_TOKEN = 4.0
+TOKENIZER_ENCODING = 'o200k_base'  # gpt-4o
+SCAN_BATCH_SIZE = 64
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken  # Optional dependency, exact counts when available
+    except ImportError:
+        return None
+    return tiktoken.get_encoding(TOKENIZER_ENCODING)
+
+
+def count_tokens(content: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        tokens = len(encoding.encode(content or ''))
+    else:
+        tokens = math.ceil(len(content or '') / CHARS_PER_TOKEN)
+    return tokens + MESSAGE_OVERHEAD_TOKENS
+
+
+def ensure_token_count_schema(engine: Engine, batch_size: int = 1000):
+    """Add and backfill ``messages.token_count`` on databases created before it existed"""
+    columns = {column['name'] for column in inspect(engine).get_columns('messages')}
+    with engine.begin() as conn:
+        if 'token_count' not in columns:
+            conn.execute(text("ALTER TABLE messages ADD COLUMN token_count INTEGER"))
+        while True:
+            rows = conn.execute(text(
+                "SELECT id, content FROM messages WHERE token_count IS NULL LIMIT :limit"
+            ), {'limit': batch_size}).all()
+            if not rows:
+                break
+            conn.execute(text("UPDATE messages SET token_count = :tokens WHERE id = :message_id"),
+                         [{'message_id': row[0], 'tokens': count_tokens(decompress_text(row[1]))}
+                          for row in rows])
+
+
+def serialize_message(message) -> Dict[str, Any]:
+    """Serialize a ``Message`` or a row with the same column names"""
+    return {
+        'id': message.id,
+        'chatId': message.chat_id,
+        'role': message.role,
+        'content': message.content,
+        'tokenCount': message.token_count,
+        'timestamp': message.created_at.isoformat() if message.created_at else None
+    }
+
+
+def get_context_window(session: Session, chat_id: str, budget: int,
+                       max_messages: Optional[int] = None) -> Dict[str, Any]:
+    """The most recent messages of a chat whose token counts fit in ``budget``, oldest first"""
+    # Plain columns rather than entities: no identity map or relationship loading while streaming
+    query = session.query(
+        Message.id, Message.chat_id, Message.role, Message.content, Message.token_count, Message.created_at
+    ).filter(Message.chat_id == chat_id).order_by(
+        Message.created_at.desc(), Message.id.desc()
+    ).execution_options(stream_results=True, yield_per=SCAN_BATCH_SIZE)
+
+    selected = []
+    total = 0
+    truncated = False
+    for message in query:
+        tokens = message.token_count if message.token_count is not None else count_tokens(message.content)
+        if total + tokens > budget or (max_messages is not None and len(selected) >= max_messages):
+            truncated = True
+            break
+        total += tokens
+        selected.append(message)
+
+    selected.reverse()
+    return {
+        'chatId': chat_id,
+        'budget': budget,
+        'totalTokens': total,
+        'truncated': truncated,
+        'messages': [serialize_message(message) for message in selected]
+    }
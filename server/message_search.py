@@ -0,0 +1,200 @@
+"""
+Full-text search over chat messages for StudyBuddy AI
+
+PostgreSQL deployments use a generated ``tsvector`` column on ``messages``
+with a GIN index. SQLite deployments use an FTS5 external-content table
+kept in sync with ``messages`` by triggers. Both backends expose the same
+``search_messages`` API returning ranked, paginated hits with snippets.
+
+``messages.content`` is never compressed (see ``compression.SHARED_COLUMNS``).
+Values compressed by earlier releases are indexed as empty text until
+schema migration 10 rewrites them as plain text, which reindexes them.
+"""
+import html
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import DateTime, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+SEARCH_CONFIG = 'english'
+SNIPPET_START = '<mark>'
+SNIPPET_STOP = '</mark>'
+# Private-use markers the database puts around matches; the snippet is
+# HTML-escaped before they become SNIPPET_START/SNIPPET_STOP
+_MATCH_START = '\ue000'
+_MATCH_STOP = '\ue001'
+MAX_PAGE_SIZE = 100
+
+# Compressed values start with chr(1) and are not indexed
+_POSTGRES_INDEXED_CONTENT = "CASE WHEN left(content, 1) = chr(1) THEN '' ELSE coalesce(content, '') END"
+_SQLITE_NEW_CONTENT = "CASE WHEN substr(new.content, 1, 1) = char(1) THEN '' ELSE new.content END"
+_SQLITE_OLD_CONTENT = "CASE WHEN substr(old.content, 1, 1) = char(1) THEN '' ELSE old.content END"
+
+_POSTGRES_DDL = [
+    f"""
+    ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', {_POSTGRES_INDEXED_CONTENT})) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_messages_chat_id_created_at ON messages (chat_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_chats_user_id ON chats (user_id)",
+]
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='rowid', tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, {_SQLITE_NEW_CONTENT});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, {_SQLITE_OLD_CONTENT});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, {_SQLITE_OLD_CONTENT});
+        INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, {_SQLITE_NEW_CONTENT});
+    END
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_messages_chat_id_created_at ON messages (chat_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_chats_user_id ON chats (user_id)",
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_search_index(engine: Engine):
+    """Create the search column/index (PostgreSQL) or FTS5 table (SQLite) if missing"""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == 'postgresql':
+            for statement in _POSTGRES_DDL:
+                conn.execute(text(statement))
+        elif dialect == 'sqlite':
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+            )).first()
+            for statement in _SQLITE_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # Index rows that were inserted before the FTS table existed
+                conn.execute(text(
+                    "INSERT INTO messages_fts(rowid, content) SELECT rowid, "
+                    "CASE WHEN substr(content, 1, 1) = char(1) THEN '' ELSE content END FROM messages"
+                ))
+        else:
+            raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+
+def _fts5_query(query: str) -> str:
+    """Turn free text into an FTS5 query that ANDs every term as a literal"""
+    return ' '.join(f'"{token}"' for token in _TOKEN_RE.findall(query))
+
+
+def _scope_clause(user_id: Optional[str], chat_id: Optional[str]) -> str:
+    clauses = []
+    if user_id:
+        clauses.append("c.user_id = :user_id")
+    if chat_id:
+        clauses.append("m.chat_id = :chat_id")
+    return ''.join(f" AND {clause}" for clause in clauses)
+
+
+def _postgres_search_sql(scope: str) -> str:
+    # Rank and paginate first, then build headlines only for the returned page
+    return f"""
+        SELECT hit.id, hit.chat_id, hit.user_id, hit.role, hit.created_at, hit.rank,
+               ts_headline('{SEARCH_CONFIG}', m.content, websearch_to_tsquery('{SEARCH_CONFIG}', :query),
+                           :headline_options)
+                   AS snippet
+        FROM (
+            SELECT m.id, m.chat_id, c.user_id, m.role, m.created_at,
+                   ts_rank_cd(m.search_vector, q) AS rank
+            FROM messages m
+            JOIN chats c ON c.id = m.chat_id,
+                 websearch_to_tsquery('{SEARCH_CONFIG}', :query) q
+            WHERE m.search_vector @@ q{scope}
+            ORDER BY rank DESC, m.created_at DESC
+            LIMIT :limit OFFSET :offset
+        ) hit
+        JOIN messages m ON m.id = hit.id
+        ORDER BY hit.rank DESC, hit.created_at DESC
+    """
+
+
+def _sqlite_search_sql(scope: str) -> str:
+    return f"""
+        SELECT m.id, m.chat_id, c.user_id, m.role, m.created_at,
+               -bm25(messages_fts) AS rank,
+               snippet(messages_fts, 0, :match_start, :match_stop, '...', 20) AS snippet
+        FROM messages_fts
+        JOIN messages m ON m.rowid = messages_fts.rowid
+        JOIN chats c ON c.id = m.chat_id
+        WHERE messages_fts MATCH :query{scope}
+        ORDER BY bm25(messages_fts), m.created_at DESC
+        LIMIT :limit OFFSET :offset
+    """
+
+
+def _highlight(snippet: Optional[str]) -> Optional[str]:
+    """Escape message text for HTML, then turn the match markers into ``<mark>`` tags"""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(_MATCH_START, SNIPPET_START).replace(_MATCH_STOP, SNIPPET_STOP)
+
+
+def search_messages(session: Session, query: str, user_id: Optional[str] = None,
+                    chat_id: Optional[str] = None, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """Search message content, optionally scoped to a user and/or chat
+
+    Returns ``{'hits': [...], 'limit': n, 'offset': n, 'hasMore': bool}`` where
+    hits are ordered by relevance (best first) and carry a snippet of
+    HTML-escaped content with matches wrapped in ``<mark>``.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    offset = max(0, int(offset))
+    dialect = session.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        search_query = query
+        sql = _postgres_search_sql(_scope_clause(user_id, chat_id))
+    elif dialect == 'sqlite':
+        search_query = _fts5_query(query)
+        sql = _sqlite_search_sql(_scope_clause(user_id, chat_id))
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+    if not search_query.strip():
+        return {'hits': [], 'limit': limit, 'offset': offset, 'hasMore': False}
+
+    # Fetch one extra row to report whether another page exists without a COUNT(*)
+    params = {'query': search_query, 'user_id': user_id, 'chat_id': chat_id,
+              'limit': limit + 1, 'offset': offset, 'match_start': _MATCH_START, 'match_stop': _MATCH_STOP,
+              'headline_options': f"StartSel={_MATCH_START}, StopSel={_MATCH_STOP}, "
+                                  f"MaxWords=30, MinWords=10, MaxFragments=2"}
+    # Typed so SQLite's text timestamps come back as datetimes, as on PostgreSQL
+    statement = text(sql).columns(created_at=DateTime)
+    rows = session.execute(statement, params).mappings().all()
+
+    hits: List[Dict[str, Any]] = []
+    for row in rows[:limit]:
+        created_at = row['created_at']
+        hits.append({
+            'id': row['id'],
+            'chatId': row['chat_id'],
+            'userId': row['user_id'],
+            'role': row['role'],
+            'rank': float(row['rank']),
+            'snippet': _highlight(row['snippet']),
+            'timestamp': created_at.isoformat() if created_at else None
+        })
+
+    return {'hits': hits, 'limit': limit, 'offset': offset, 'hasMore': len(rows) > limit}
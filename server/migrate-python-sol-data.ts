@@ -9,19 +9,19 @@ async function migratePythonSolData() {
 
     const standardsToInsert = [];
 
-    // File mappings with their expected variable names and formats
+    // File mappings with their expected variable names (same as DATASET_FILES in server/sol_data.py)
     const fileConfigs = [
-      { file: "ALG_MATH_SOL.py", grade: "Algebra1", variable: "algebra1_data", format: "algebra" },
-      { file: "ALG2_MATH_SOL.py", grade: "Algebra2", variable: "a2_data", format: "algebra" },
-      { file: "AFDA_MATH_SOL.py", grade: "AFDA", variable: "afda_data", format: "algebra" },
-      { file: "TRIG_MATH_SOL.py", grade: "Trigonometry", variable: "trig_data", format: "algebra" },
-      { file: "1_MATH_SOL.py", grade: "1", variable: "grade1_standards", format: "grade" },
-      { file: "2_MATH_SOL.py", grade: "2", variable: "grade2_standards", format: "grade" },
-      { file: "3_MATH_SOL.py", grade: "3", variable: "standards_data", format: "grade" },
-      { file: "4_MATH_SOL.py", grade: "4", variable: "grade4_standards", format: "grade" },
-      { file: "5_MATH_SOL.py", grade: "5", variable: "grade5_standards", format: "grade" },
-      { file: "6_MATH_SOL.py", grade: "6", variable: "grade6_standards", format: "grade" },
-      { file: "7_MATH_SOL.py", grade: "7", variable: "grade7_data", format: "grade" },
+      { file: "ALG_MATH_SOL.py", grade: "Algebra1", variable: "algebra1_data" },
+      { file: "ALG2_MATH_SOL.py", grade: "Algebra2", variable: "a2_data" },
+      { file: "AFDA_MATH_SOL.py", grade: "AFDA", variable: "afda_data" },
+      { file: "TRIG_MATH_SOL.py", grade: "Trigonometry", variable: "trig_data" },
+      { file: "1_MATH_SOL.py", grade: "1", variable: "grade1_standards" },
+      { file: "2_MATH_SOL.py", grade: "2", variable: "grade2_standards" },
+      { file: "3_MATH_SOL.py", grade: "3", variable: "standards_data" },
+      { file: "4_MATH_SOL.py", grade: "4", variable: "grade4_standards" },
+      { file: "5_MATH_SOL.py", grade: "5", variable: "grade5_standards" },
+      { file: "6_MATH_SOL.py", grade: "6", variable: "grade6_standards" },
+      { file: "7_MATH_SOL.py", grade: "7", variable: "grade7_data" },
     ];
 
     for (const config of fileConfigs) {
@@ -68,135 +68,127 @@ async function migratePythonSolData() {
   }
 }
 
-function parseFile(content: string, config: any, subject: string) {
-  const standards = [];
-
-  try {
-    if (config.format === "algebra") {
-      // Parse algebra format: ("code", "description", ["sub1", "sub2"])
-      const match = content.match(new RegExp(`${config.variable}\\s*=\\s*\\[([\\s\\S]*?)\\n\\]`));
-      if (!match) {
-        console.log(`Could not find ${config.variable} in file`);
-        return standards;
-      }
-
-      const dataContent = match[1];
-
-      // Split by main tuples - look for patterns like ("A.EO.1", "description", [
-      const tupleMatches = dataContent.split(/(?=\s*\(\s*"[A-Z]\.[A-Z]+\.\d+")/).filter(part => part.trim());
-
-      for (const tupleContent of tupleMatches) {
-        const tupleMatch = tupleContent.match(/\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*,\s*\[([\s\S]*?)\]\s*\)/);
-        if (tupleMatch) {
-          const [, code, description, subStandardsStr] = tupleMatch;
-
-          // Add main standard
-          standards.push({
-            id: `${subject}-${config.grade}-${code}`,
-            subject: subject,
-            grade: config.grade,
-            strand: extractStrand(code),
-            description: description.trim()
-          });
-
-          // Extract sub-standards
-          const subMatches = subStandardsStr.match(/"([^"]+)"/g);
-          if (subMatches) {
-            subMatches.forEach(subMatch => {
-              const subDescription = subMatch.replace(/"/g, '');
-              const subCode = extractSubStandardCode(subDescription, code);
-
-              standards.push({
-                id: `${subject}-${config.grade}-${subCode}`,
-                subject: subject,
-                grade: config.grade,
-                strand: extractStrand(code),
-                description: subDescription.trim()
-              });
-            });
-          }
-        }
+type Literal = string | Literal[];
+
+const STRAND_NAMES: Record<string, string> = {
+  NS: "Number and Number Sense",
+  CE: "Computation and Estimation",
+  MG: "Measurement and Geometry",
+  PS: "Probability and Statistics",
+  PFA: "Patterns, Functions, and Algebra",
+  EO: "Expressions and Operations",
+  EI: "Equations and Inequalities",
+  F: "Functions",
+  ST: "Statistics",
+  AF: "Algebra and Functions",
+  DA: "Data Analysis",
+  TT: "Triangle Trigonometry",
+  CT: "Circular Trigonometry",
+  GT: "Graphs of Trigonometric Functions",
+  IE: "Identities and Equations",
+};
+
+const CODE_PATTERN = /^([A-Z0-9]+)\.([A-Z]+)\.(\d+)/;
+const LABELED_SUB_PATTERN = /^([A-Z0-9]+\.[A-Z]+\.\d+\.[a-z]+)\s+([\s\S]*)$/;
+
+// Reads the list assigned to `variable`. The dataset files hold only string,
+// tuple and list literals (comments allowed), read here as nested arrays.
+function readLiteral(content: string, variable: string): Literal[] {
+  const start = content.search(new RegExp(`^${variable}\\s*=\\s*\\[`, "m"));
+  if (start === -1) {
+    throw new Error(`${variable} not found`);
+  }
+  let pos = content.indexOf("[", start);
+
+  const skip = () => {
+    while (pos < content.length) {
+      if (/\s/.test(content[pos])) {
+        pos++;
+      } else if (content[pos] === "#") {
+        const newline = content.indexOf("\n", pos);
+        pos = newline === -1 ? content.length : newline;
+      } else {
+        break;
       }
-    } else if (config.format === "grade") {
-      // Parse grade format: ("strand", "code", "description", [("subcode", "subdesc")])
-      const match = content.match(new RegExp(`${config.variable}\\s*=\\s*\\[([\\s\\S]*?)\\n\\]`));
-      if (!match) {
-        console.log(`Could not find ${config.variable} in file`);
-        return standards;
+    }
+  };
+
+  const parse = (): Literal => {
+    skip();
+    const open = content[pos];
+    if (open === "[" || open === "(") {
+      const close = open === "[" ? "]" : ")";
+      const items: Literal[] = [];
+      pos++;
+      for (skip(); content[pos] !== close; skip()) {
+        items.push(parse());
+        skip();
+        if (content[pos] === ",") pos++;
       }
-
-      const dataContent = match[1];
-
-      // Split by main tuples - look for patterns starting with ("
-      const tupleMatches = dataContent.split(/(?=\s*\(\s*"[^"]*"\s*,\s*"[^"]*"\s*,\s*"[^"]*"\s*,\s*\[)/).filter(part => part.trim());
-
-      for (const tupleContent of tupleMatches) {
-        const tupleMatch = tupleContent.match(/\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*,\s*"([^"]+)"\s*,\s*\[([\s\S]*?)\]\s*\)/);
-        if (tupleMatch) {
-          const [, strand, code, description, subStandardsStr] = tupleMatch;
-
-          // Add main standard
-          standards.push({
-            id: `${subject}-${config.grade}-${code}`,
-            subject: subject,
-            grade: config.grade,
-            strand: strand.trim(),
-            description: description.trim()
-          });
-
-          // Extract sub-standards
-          const subTupleMatches = subStandardsStr.match(/\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)/g);
-          if (subTupleMatches) {
-            subTupleMatches.forEach(subTuple => {
-              const subMatch = subTuple.match(/\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)/);
-              if (subMatch) {
-                const [, subCode, subDescription] = subMatch;
-
-                standards.push({
-                  id: `${subject}-${config.grade}-${subCode}`,
-                  subject: subject,
-                  grade: config.grade,
-                  strand: strand.trim(),
-                  description: subDescription.trim()
-                });
-              }
-            });
-          }
-        }
+      pos++;
+      return items;
+    }
+    if (open === '"') {
+      // Adjacent string literals concatenate, as in Python
+      let value = "";
+      while (content[pos] === '"') {
+        const end = content.indexOf('"', pos + 1);
+        value += content.slice(pos + 1, end);
+        pos = end + 1;
+        skip();
       }
+      return value;
     }
-  } catch (error) {
-    console.error(`Error parsing ${config.file}:`, error);
-  }
+    throw new Error(`Unexpected ${JSON.stringify(open)} at offset ${pos}`);
+  };
 
-  return standards;
+  return parse() as Literal[];
 }
 
-function extractStrand(code: string): string {
-  if (code.startsWith("A.EO")) return "Expressions and Operations";
-  if (code.startsWith("A.EI")) return "Equations and Inequalities";
-  if (code.startsWith("A.F")) return "Functions";
-  if (code.startsWith("A.ST")) return "Statistics";
-  if (code.includes(".NS.")) return "Number and Number Sense";
-  if (code.includes(".CE.")) return "Computation and Estimation";
-  if (code.includes(".MG.")) return "Measurement and Geometry";
-  if (code.includes(".PS.")) return "Probability and Statistics";
-  if (code.includes(".PFA.")) return "Patterns, Functions, and Algebra";
-  return "General";
+// Same records and ids as load_standards() in server/sol_data.py, which the
+// Python data service reads the datasets with
+function parseEntry(entry: Literal[], grade: string, subject: string) {
+  let strand: string, code: string, description: string, subs: Literal[];
+  if (entry.length === 4) {
+    [strand, code, description, subs] = entry as [string, string, string, Literal[]];
+  } else {
+    [code, description, subs] = entry as [string, string, Literal[]];
+    strand = STRAND_NAMES[code.match(CODE_PATTERN)?.[2] ?? ""] ?? "General";
+  }
+
+  const record = (recordCode: string, recordDescription: string) => ({
+    id: `${subject}-${grade}-${recordCode}`,
+    subject: subject,
+    grade: grade,
+    strand: strand.trim(),
+    description: recordDescription.trim(),
+  });
+
+  const standards = [record(code, description)];
+  subs.forEach((sub, index) => {
+    if (Array.isArray(sub)) {
+      standards.push(record(sub[0] as string, sub[1] as string));
+      return;
+    }
+    const labeled = sub.match(LABELED_SUB_PATTERN);
+    // Unlabeled sub-standards (grade 6) are lettered in listed order
+    standards.push(labeled ? record(labeled[1], labeled[2]) : record(`${code}.${String.fromCharCode(97 + index)}`, sub));
+  });
+  return standards;
 }
 
-function extractSubStandardCode(description: string, parentCode: string): string {
-  // Try to extract code from description like "A.EO.1.a"
-  const match = description.match(/^([A-Z]+\.[A-Z]+\.\d+\.[a-z]+)/);
-  if (match) return match[1];
+function parseFile(content: string, config: any, subject: string) {
+  const standards = [];
 
-  // Try to extract code like "2.NS.1.a"
-  const gradeMatch = description.match(/^(\d+\.[A-Z]+\.\d+\.[a-z]+)/);
-  if (gradeMatch) return gradeMatch[1];
+  try {
+    for (const entry of readLiteral(content, config.variable)) {
+      standards.push(...parseEntry(entry as Literal[], config.grade, subject));
+    }
+  } catch (error) {
+    console.error(`Error parsing ${config.file}:`, error);
+  }
 
-  // Generate a code based on parent + increment
-  const words = description.split(' ').slice(0, 2);
-  return `${parentCode}.${words.join('_').toLowerCase().replace(/[^a-z0-9_]/g, '')}`.substring(0, 50);
+  return standards;
 }
 
 // Run the migration if this file is executed directly
@@ -5,7 +5,6 @@ Migration script to transition from current PostgreSQL setup to SQLAlchemy ORM
 import os
 import sys
 import asyncio
-import psycopg2
 from sqlalchemy import create_engine, text
 from models import db_manager, User, Chat, Message, SolStandard, AssessmentItem, AssessmentAttempt
 
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Convert VARCHAR UUID keys to native ``uuid`` columns on PostgreSQL
+
+Models declare every UUID primary and foreign key as ``GUID``, which is a
+16-byte ``uuid`` on PostgreSQL. Databases created before that still hold
+36-character VARCHAR keys; this script converts them in one transaction:
+
+  1. refuse if any value is not a valid UUID
+  2. drop the foreign keys touching the affected columns
+  3. ``ALTER COLUMN ... TYPE uuid USING col::uuid`` (indexes are rebuilt)
+  4. recreate the foreign keys from their saved definitions
+
+Existing uuid4 values are kept as they are; only keys generated from now on
+are time-ordered (see ``models.uuid7``). SQLite stores UUIDs as text either
+way, so there is nothing to migrate there.
+
+``shared/schema.ts`` declares the same columns as ``uuid``, so run this
+before ``npm run db:push`` on an older database; drizzle-kit would
+otherwise try to change the column types itself, without the foreign key
+handling above.
+
+    python migrate_uuid_keys.py --dry-run
+    python migrate_uuid_keys.py
+"""
+import argparse
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from models import Base, GUID, UUID_PATTERN
+
+
+def guid_columns() -> Dict[str, List[str]]:
+    columns: Dict[str, List[str]] = {}
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, GUID):
+                columns.setdefault(table.name, []).append(column.name)
+    return columns
+
+
+def pending_columns(conn) -> Dict[str, List[str]]:
+    """GUID columns that are not yet ``uuid`` in the database"""
+    rows = conn.execute(text(
+        "SELECT table_name, column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema()"
+    )).all()
+    types = {(table, column): data_type for table, column, data_type in rows}
+    pending: Dict[str, List[str]] = {}
+    for table, columns in guid_columns().items():
+        for column in columns:
+            data_type = types.get((table, column))
+            if data_type is not None and data_type != 'uuid':
+                pending.setdefault(table, []).append(column)
+    return pending
+
+
+def migrate(engine: Engine, dry_run: bool = False) -> Dict[str, List[str]]:
+    if engine.dialect.name != 'postgresql':
+        print(f"{engine.dialect.name} stores UUIDs as text; nothing to migrate")
+        return {}
+
+    with engine.begin() as conn:
+        pending = pending_columns(conn)
+        if not pending:
+            print("✓ All UUID keys are already native uuid columns")
+            return {}
+
+        for table, columns in pending.items():
+            for column in columns:
+                invalid = conn.execute(text(
+                    f"SELECT count(*) FROM {table} WHERE {column} IS NOT NULL AND {column} !~ :pattern"
+                ), {'pattern': UUID_PATTERN}).scalar()
+                if invalid:
+                    raise ValueError(f"{table}.{column} has {invalid} values that are not UUIDs")
+
+        foreign_keys = conn.execute(text(
+            "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE contype = 'f' AND (conrelid::regclass::text = ANY(:tables) "
+            "OR confrelid::regclass::text = ANY(:tables))"
+        ), {'tables': list(pending)}).all()
+
+        for table, columns in pending.items():
+            print(f"{table}: {', '.join(columns)} -> uuid")
+        print(f"Recreating {len(foreign_keys)} foreign keys")
+        if dry_run:
+            conn.rollback()
+            return pending
+
+        for table, name, _definition in foreign_keys:
+            conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+        for table, columns in pending.items():
+            alterations = ', '.join(f"ALTER COLUMN {column} TYPE uuid USING {column}::uuid" for column in columns)
+            conn.execute(text(f"ALTER TABLE {table} {alterations}"))
+        for table, name, definition in foreign_keys:
+            conn.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}'))
+    print("✓ UUID keys migrated")
+    return pending
+
+
+def main(argv: Optional[List[str]] = None):
+    from models import db_manager
+
+    parser = argparse.ArgumentParser(description='Convert VARCHAR UUID keys to native uuid columns')
+    parser.add_argument('--dry-run', action='store_true', help='Show what would change without altering anything')
+    args = parser.parse_args(argv)
+    migrate(db_manager.engine, dry_run=args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
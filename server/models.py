@@ -1,23 +1,80 @@
 """
 SQLAlchemy ORM models for StudyBuddy AI database schema
 """
-from sqlalchemy import create_engine, Column, String, Integer, Text, JSON, DateTime, Boolean, Float, ForeignKey
+from sqlalchemy import create_engine, Column, String, Integer, Text, JSON, Date, DateTime, Boolean, Float, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker, relationship, validates
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.sql import func, false
+from compression import CompressedText, CompressedJSON
+from sql_compat import WriteGate, configure_sqlite, random_unit
+from memory_profile import engine_options
 from datetime import datetime
 import os
+import random
+import re
+import threading
+import time
 import uuid
 
 Base = declarative_base()
 
+_uuid7_lock = threading.Lock()
+_uuid7_state = {'ms': 0, 'counter': 0}
+
+
+def uuid7() -> uuid.UUID:
+    """Time-ordered UUID (RFC 9562 version 7)
+
+    48-bit Unix milliseconds, then a 12-bit counter seeded randomly each
+    millisecond (monotonic within a process), then 62 random bits. New keys
+    land at the right edge of B-tree indexes instead of random pages.
+    """
+    with _uuid7_lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _uuid7_state['ms']:
+            _uuid7_state['ms'], _uuid7_state['counter'] = ms, random.getrandbits(11)
+        else:
+            _uuid7_state['counter'] += 1
+            if _uuid7_state['counter'] > 0xFFF:
+                _uuid7_state['ms'], _uuid7_state['counter'] = _uuid7_state['ms'] + 1, random.getrandbits(11)
+        ms, counter = _uuid7_state['ms'], _uuid7_state['counter']
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    return uuid.UUID(int=(ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b)
+
+
 def generate_uuid():
-    return str(uuid.uuid4())
+    return str(uuid7())
+
+
+UUID_PATTERN = '^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
+_UUID_RE = re.compile(UUID_PATTERN)
+
+
+def is_uuid(value) -> bool:
+    """True for a key in the 8-4-4-4-12 form GUID columns store
+
+    PostgreSQL rejects anything else compared with a ``uuid`` column, so
+    ids from requests are checked before they reach a query.
+    """
+    return isinstance(value, str) and _UUID_RE.match(value) is not None
+
+
+class GUID(TypeDecorator):
+    """UUID key: native 16-byte ``uuid`` on PostgreSQL, 36-character text elsewhere; values are str"""
+    impl = String(36)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(String(36))
 
 class User(Base):
     __tablename__ = 'users'
     
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(GUID, primary_key=True, default=generate_uuid)
     name = Column(String, nullable=False)
     email = Column(String, nullable=False, unique=True)
     age = Column(Integer, nullable=False)
@@ -29,33 +86,51 @@ class User(Base):
     chats = relationship("Chat", back_populates="user")
     assessment_attempts = relationship("AssessmentAttempt", back_populates="user")
 
+    @validates('email')
+    def normalize_email(self, key, email):
+        """Emails are unique case-insensitively, so they are stored lowercased (see roster_import.py)"""
+        return email.strip().lower() if email else email
+
 
 class Chat(Base):
     __tablename__ = 'chats'
     
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(GUID, primary_key=True, default=generate_uuid)
     title = Column(String, nullable=False)
-    user_id = Column(String, ForeignKey('users.id'), nullable=False)
+    user_id = Column(GUID, ForeignKey('users.id'), nullable=False, index=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    # Sidebar summary, maintained with each message write (see chat_summaries.py)
+    message_count = Column(Integer, nullable=False, default=0, server_default='0')
+    last_message_at = Column(DateTime, nullable=True)
+    last_message_preview = Column(String, nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="chats")
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('ix_chats_user_id_updated_at', 'user_id', 'updated_at'),
+    )
+
 
 class Message(Base):
     __tablename__ = 'messages'
     
-    id = Column(String, primary_key=True, default=generate_uuid)
-    chat_id = Column(String, ForeignKey('chats.id'), nullable=False)
+    id = Column(GUID, primary_key=True, default=generate_uuid)
+    chat_id = Column(GUID, ForeignKey('chats.id'), nullable=False)
     role = Column(String, nullable=False)  # 'user' or 'assistant'
-    content = Column(Text, nullable=False)
+    content = Column(CompressedText('messages.content'), nullable=False)  # Never compressed, see compression.SHARED_COLUMNS
+    token_count = Column(Integer, nullable=True)  # Set at insert, see message_context.count_tokens
     created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
     chat = relationship("Chat", back_populates="messages")
 
+    __table_args__ = (
+        Index('ix_messages_chat_id_created_at', 'chat_id', 'created_at'),
+    )
+
 
 class SolStandard(Base):
     __tablename__ = 'sol_standards'
@@ -75,26 +150,65 @@ class SolStandard(Base):
 class AssessmentItem(Base):
     __tablename__ = 'assessment_items'
     
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(GUID, primary_key=True, default=generate_uuid)
     sol_id = Column(String, ForeignKey('sol_standards.id'), nullable=False)
     item_type = Column(String, nullable=False)  # 'MCQ', 'FIB', 'CR'
     difficulty = Column(String, nullable=False)  # 'easy', 'medium', 'hard'
     dok = Column(Integer, nullable=False)  # Depth of Knowledge level
     stem = Column(Text, nullable=False)  # Question text
-    payload = Column(JSON, nullable=False)  # Question-specific data (options, answers, etc.)
+    payload = Column(CompressedJSON('assessment_items.payload'), nullable=False)  # Question-specific data (options, answers, etc.)
+    random_key = Column(Float, nullable=False, default=random.random, server_default=random_unit())  # Uniform key for O(log n) random picks
+    is_retired = Column(Boolean, nullable=False, default=False, server_default=false())  # Excluded from the pool
+    content_hash = Column(String(64), nullable=True)  # Normalized stem + answers (see item_dedup.py)
     created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
     sol_standard = relationship("SolStandard", back_populates="assessment_items")
     attempts = relationship("AssessmentAttempt", back_populates="assessment_item")
 
+    __table_args__ = (
+        Index('ix_assessment_items_pool', 'sol_id', 'item_type', 'difficulty', 'dok', 'random_key'),
+        Index('ix_assessment_items_content_hash', 'content_hash', unique=True),
+    )
+
+
+class ItemStatistics(Base):
+    """Running per-item statistics maintained as attempts are recorded (see item_stats.py)"""
+    __tablename__ = 'item_statistics'
+
+    item_id = Column(GUID, ForeignKey('assessment_items.id'), primary_key=True)
+    attempt_count = Column(Integer, nullable=False, default=0)
+    correct_count = Column(Integer, nullable=False, default=0)
+    score_ratio_sum = Column(Float, nullable=False, default=0.0)
+    duration_sum = Column(Float, nullable=False, default=0.0)
+    duration_count = Column(Integer, nullable=False, default=0)
+    ability_sum = Column(Float, nullable=False, default=0.0)
+    ability_sq_sum = Column(Float, nullable=False, default=0.0)
+    correct_ability_sum = Column(Float, nullable=False, default=0.0)
+    p_value = Column(Float, nullable=True)  # Share of correct attempts
+    mean_score = Column(Float, nullable=True)  # Mean score / max_score
+    mean_duration = Column(Float, nullable=True)  # Seconds
+    discrimination = Column(Float, nullable=True)  # Point-biserial correlation with ability
+    updated_at = Column(DateTime, nullable=False)
+
+
+class ItemPoolTarget(Base):
+    """Target inventory per item pool bucket (see item_pool.py)"""
+    __tablename__ = 'item_pool_targets'
+
+    sol_id = Column(String, ForeignKey('sol_standards.id'), primary_key=True)
+    item_type = Column(String, primary_key=True)
+    difficulty = Column(String, primary_key=True)
+    dok = Column(Integer, primary_key=True)
+    target = Column(Integer, nullable=False)
+
 
 class AssessmentAttempt(Base):
     __tablename__ = 'assessment_attempts'
     
-    id = Column(String, primary_key=True, default=generate_uuid)
-    user_id = Column(String, ForeignKey('users.id'), nullable=False)
-    item_id = Column(String, ForeignKey('assessment_items.id'), nullable=False)
+    id = Column(GUID, primary_key=True, default=generate_uuid)
+    user_id = Column(GUID, ForeignKey('users.id'), nullable=False)
+    item_id = Column(GUID, ForeignKey('assessment_items.id'), nullable=False)
     sol_id = Column(String, ForeignKey('sol_standards.id'), nullable=False)
     user_response = Column(JSON, nullable=False)  # Student's answer
     is_correct = Column(Boolean, nullable=False)
@@ -103,26 +217,110 @@ class AssessmentAttempt(Base):
     feedback = Column(Text, nullable=True)
     duration_seconds = Column(Integer, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
+    # Constructed responses are scored asynchronously: pending -> grading -> graded (or failed)
+    grading_status = Column(String(16), nullable=False, default='graded', server_default='graded')
+    grading_attempts = Column(Integer, nullable=False, default=0, server_default='0')
+    grading_error = Column(Text, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    graded_at = Column(DateTime, nullable=True)
+    grade = Column(String, nullable=True)  # Student's grade when graded: the cohort rollup it counts toward
     
     # Relationships
     user = relationship("User", back_populates="assessment_attempts")
     assessment_item = relationship("AssessmentItem", back_populates="attempts")
     sol_standard = relationship("SolStandard", back_populates="assessment_attempts")
 
+    __table_args__ = (
+        Index('ix_assessment_attempts_user_item', 'user_id', 'item_id'),
+        Index('ix_assessment_attempts_grading_queue', 'grading_status', 'created_at'),
+        # Export order of analytics_export.py: when the result became final
+        Index('ix_assessment_attempts_available_at', func.coalesce(graded_at, created_at), id),
+    )
+
 
 class MasteryProgress(Base):
     __tablename__ = 'mastery_progress'
     
-    id = Column(String, primary_key=True, default=generate_uuid)
-    user_id = Column(String, ForeignKey('users.id'), nullable=False)
+    id = Column(GUID, primary_key=True, default=generate_uuid)
+    user_id = Column(GUID, ForeignKey('users.id'), nullable=False)
     sol_id = Column(String, ForeignKey('sol_standards.id'), nullable=False)
     ewma_score = Column(Float, nullable=False, default=0.0)
     attempt_count = Column(Integer, nullable=False, default=0)
     last_attempt = Column(DateTime, nullable=True)
     mastery_level = Column(String, nullable=False, default='beginning')  # 'beginning', 'developing', 'proficient', 'advanced'
+    grade = Column(String, nullable=True)  # Cohort rollup grade this state is counted in
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index('ix_mastery_progress_user_sol', 'user_id', 'sol_id', unique=True),
+    )
+
+
+class UserRecommendation(Base):
+    """Cached ranked practice queue per user (see recommendations.py)"""
+    __tablename__ = 'user_recommendations'
+
+    user_id = Column(GUID, ForeignKey('users.id'), primary_key=True)
+    queue = Column(JSON, nullable=False)  # [{solId, difficulty, score, ...}] best first
+    computed_at = Column(DateTime, nullable=False)
+
+
+class SolPrerequisite(Base):
+    """Transitive closure of the cross-grade prerequisite graph (see sol_prerequisites.py)"""
+    __tablename__ = 'sol_prerequisites'
+
+    sol_id = Column(String, primary_key=True)
+    prerequisite_id = Column(String, primary_key=True)
+    depth = Column(Integer, nullable=False)  # Shortest number of prerequisite hops
+
+
+class CohortRollup(Base):
+    """Additive per-day activity and mastery deltas per (grade, strand, standard) (see cohort_rollups.py)
+
+    Summing a standard's rows over a date range gives its activity in that
+    range; summing the deltas up to a day gives the cohort's mastery as of
+    that day.
+    """
+    __tablename__ = 'cohort_rollups'
+
+    grade = Column(String, primary_key=True)  # The student's grade when the attempt was graded
+    strand = Column(String, primary_key=True)
+    sol_id = Column(String, ForeignKey('sol_standards.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    attempt_count = Column(Integer, nullable=False, default=0)
+    correct_count = Column(Integer, nullable=False, default=0)
+    score_ratio_sum = Column(Float, nullable=False, default=0.0)
+    duration_sum = Column(Float, nullable=False, default=0.0)
+    duration_count = Column(Integer, nullable=False, default=0)
+    new_students = Column(Integer, nullable=False, default=0)  # First graded attempt on the standard
+    ewma_delta = Column(Float, nullable=False, default=0.0)  # Change in the sum of students' EWMA
+    beginning_delta = Column(Integer, nullable=False, default=0)  # Net change in students per mastery level
+    developing_delta = Column(Integer, nullable=False, default=0)
+    proficient_delta = Column(Integer, nullable=False, default=0)
+    advanced_delta = Column(Integer, nullable=False, default=0)
+
+
+class ResponseCacheEntry(Base):
+    """Model completions reused for repeated prompts (see response_cache.py)"""
+    __tablename__ = 'response_cache'
+
+    key = Column(String(64), primary_key=True)  # sha256 of (normalized prompt, grade, model, prompt version)
+    prompt = Column(Text, nullable=False)  # Normalized prompt, for inspection
+    grade = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    system_prompt_version = Column(String, nullable=False)
+    response = Column(CompressedText('response_cache.response'), nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_hit_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_response_cache_last_hit_at', 'last_hit_at'),
+        Index('ix_response_cache_expires_at', 'expires_at'),
+    )
+
 
 # Database connection and session management
 class DatabaseManager:
@@ -131,16 +329,30 @@ class DatabaseManager:
         if not self.database_url:
             raise ValueError("DATABASE_URL environment variable is required")
         
-        self.engine = create_engine(self.database_url)
+        self.engine = create_engine(self.database_url, **engine_options(self.database_url))
+        self.read_engine = self.engine
+        self.write_gate = None
+        if self.engine.dialect.name == 'sqlite':
+            # Single-writer SQLite: WAL, tuned pragmas and a FIFO queue for write transactions
+            self.write_gate = WriteGate()
+            configure_sqlite(self.engine, self.write_gate)
+            self.read_engine = self.engine.execution_options(sqlite_read_only=True)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.read_engine)
     
     def create_tables(self):
-        """Create all tables in the database"""
-        Base.metadata.create_all(bind=self.engine)
+        """Bring the schema up to date (see schema_migrations.py); cheap when already current"""
+        from schema_migrations import migrate  # The migration steps import this module
+
+        migrate(self.engine)
     
     def get_session(self):
         """Get a database session"""
         return self.SessionLocal()
+
+    def get_read_session(self):
+        """Get a session for read-only work; on SQLite it does not wait for the writer queue"""
+        return self.ReadSessionLocal()
     
     def drop_tables(self):
         """Drop all tables (use with caution!)"""
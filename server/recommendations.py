@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Adaptive next-item recommendations for StudyBuddy AI
+
+Scores every candidate standard for every user at once with NumPy:
+  - need:      1 - EWMA mastery (unattempted standards get a neutral prior)
+  - staleness: time since ``last_attempt``, saturating with a half-life
+  - gaps:      weak prerequisites lower a standard's priority, while standards
+               that are prerequisites of the user's weak standards are boosted
+and stores a ranked queue per user in ``user_recommendations``. Serving a
+recommendation is then a single primary-key read. Grading drops the user's
+queue, and queues older than ``RECOMMENDATION_TTL`` are recomputed on read
+because staleness keeps changing without new attempts.
+
+    python recommendations.py    # recompute every user's queue (cron/nightly)
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import MasteryProgress, SolPrerequisite, User, UserRecommendation
+from sol_data import load_standards
+from sol_prerequisites import PRECEDING_COURSE, parent_standard_id
+
+QUEUE_LENGTH = 10
+MASTERY_THRESHOLD = 0.7
+STALENESS_HALF_LIFE_DAYS = 14.0
+RECOMMENDATION_TTL = timedelta(hours=24)
+
+UNATTEMPTED_NEED = {'current': 0.6, 'preceding': 0.3}
+WEIGHTS = {'need': 0.5, 'staleness': 0.2, 'unlocks': 0.3}
+PREREQUISITE_GAP_PENALTY = 0.5
+
+# Users below grade 1 practise grade 1 standards
+GRADE_FALLBACK = {'K': '1'}
+
+
+class _StandardSpace:
+    """Standard-level ids, their grades, and the direct prerequisite matrix"""
+
+    def __init__(self, session: Session):
+        self.records = [r for r in load_standards() if r['parentId'] is None]
+        self.ids = [r['id'] for r in self.records]
+        self.index = {sol_id: i for i, sol_id in enumerate(self.ids)}
+        self.grades = np.array([r['grade'] for r in self.records])
+
+        size = len(self.ids)
+        # prereq[s, p] = 1 when p is a direct prerequisite of s
+        self.prereq = np.zeros((size, size), dtype=np.float32)
+        for sol_id, prereq_id in session.query(SolPrerequisite.sol_id, SolPrerequisite.prerequisite_id).filter(
+            SolPrerequisite.depth == 1
+        ):
+            if sol_id in self.index and prereq_id in self.index:
+                self.prereq[self.index[sol_id], self.index[prereq_id]] = 1.0
+        self.prereq_count = np.maximum(self.prereq.sum(axis=1), 1.0)
+
+    def grade_masks(self, grades: Sequence[str]):
+        """(current, preceding) boolean masks of shape (users, standards)"""
+        current = np.zeros((len(grades), len(self.ids)), dtype=bool)
+        preceding = np.zeros_like(current)
+        for grade in set(grades):
+            rows = [i for i, g in enumerate(grades) if g == grade]
+            effective = GRADE_FALLBACK.get(grade, grade)
+            current[np.ix_(rows, np.flatnonzero(self.grades == effective))] = True
+            previous = PRECEDING_COURSE.get(effective)
+            if previous:
+                preceding[np.ix_(rows, np.flatnonzero(self.grades == previous[0]))] = True
+        return current, preceding
+
+
+def _difficulty(ewma: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(ewma) | (ewma < 0.4), 'easy', np.where(ewma < 0.75, 'medium', 'hard'))
+
+
+def compute_recommendations(session: Session, users: List[Dict[str, str]],
+                            now: Optional[datetime] = None,
+                            queue_length: int = QUEUE_LENGTH) -> Dict[str, List[Dict[str, Any]]]:
+    """Ranked practice queues for ``users`` (dicts with 'id' and 'grade')"""
+    if not users:
+        return {}
+    now = now or datetime.utcnow()
+    space = _StandardSpace(session)
+    user_index = {user['id']: i for i, user in enumerate(users)}
+    shape = (len(users), len(space.ids))
+
+    # Sub-standard mastery rolls up into its parent standard (mean EWMA, latest attempt)
+    ewma_sum = np.zeros(shape, dtype=np.float64)
+    ewma_n = np.zeros(shape, dtype=np.float64)
+    last_seen_days = np.full(shape, np.nan)
+    rows = session.query(
+        MasteryProgress.user_id, MasteryProgress.sol_id, MasteryProgress.ewma_score, MasteryProgress.last_attempt
+    ).filter(MasteryProgress.user_id.in_(list(user_index))).all()
+    if rows:
+        u = np.array([user_index[r[0]] for r in rows])
+        s = np.array([space.index.get(parent_standard_id(r[1]), -1) for r in rows])
+        keep = s >= 0
+        u, s = u[keep], s[keep]
+        scores = np.array([r[2] for r in rows], dtype=np.float64)[keep]
+        days = np.array([
+            (now - r[3]).total_seconds() / 86400.0 if r[3] else np.nan for r in rows
+        ], dtype=np.float64)[keep]
+        np.add.at(ewma_sum, (u, s), scores)
+        np.add.at(ewma_n, (u, s), 1.0)
+        # fmin ignores NaN, so the most recent attempt wins
+        np.fmin.at(last_seen_days, (u, s), days)
+
+    attempted = ewma_n > 0
+    ewma = np.divide(ewma_sum, ewma_n, out=np.full(shape, np.nan), where=attempted)
+    current, preceding = space.grade_masks([user['grade'] for user in users])
+    candidates = current | preceding | attempted
+
+    need = np.where(attempted, 1.0 - np.nan_to_num(ewma),
+                    np.where(current, UNATTEMPTED_NEED['current'], UNATTEMPTED_NEED['preceding']))
+    staleness = np.where(attempted, 1.0 - np.exp2(-np.nan_to_num(last_seen_days) / STALENESS_HALF_LIFE_DAYS), 0.0)
+
+    weak = (attempted & (np.nan_to_num(ewma) < MASTERY_THRESHOLD)).astype(np.float32)
+    own_gap = (weak @ space.prereq.T) / space.prereq_count      # share of my prerequisites that are weak
+    unlocks = weak @ space.prereq                                # weak standards that depend on me
+    unlocks = unlocks / np.maximum(unlocks.max(axis=1, keepdims=True), 1.0)
+
+    score = (WEIGHTS['need'] * need + WEIGHTS['staleness'] * staleness + WEIGHTS['unlocks'] * unlocks)
+    score *= 1.0 - PREREQUISITE_GAP_PENALTY * own_gap
+    score = np.where(candidates, score, -np.inf)
+
+    k = min(queue_length, len(space.ids))
+    top = np.argpartition(-score, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(score, top, axis=1)
+    top = np.take_along_axis(top, np.argsort(-top_scores, axis=1, kind='stable'), axis=1)
+    difficulty = _difficulty(ewma)
+
+    queues = {}
+    for i, user in enumerate(users):
+        queue = []
+        for s in top[i]:
+            if not np.isfinite(score[i, s]):
+                break
+            record = space.records[s]
+            queue.append({
+                'solId': record['id'],
+                'code': record['code'],
+                'grade': record['grade'],
+                'description': record['description'],
+                'difficulty': str(difficulty[i, s]),
+                'score': round(float(score[i, s]), 4),
+                'ewmaScore': None if np.isnan(ewma[i, s]) else round(float(ewma[i, s]), 4),
+                'weakPrerequisites': round(float(own_gap[i, s]), 4),
+            })
+        queues[user['id']] = queue
+    return queues
+
+
+def refresh_recommendations(session: Session, user_ids: Optional[List[str]] = None,
+                            batch_size: int = 1000) -> int:
+    """Recompute and cache queues for ``user_ids`` (default: every user)"""
+    query = session.query(User.id, User.grade)
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+    users = [{'id': user_id, 'grade': grade} for user_id, grade in query]
+
+    now = datetime.utcnow()
+    for start in range(0, len(users), batch_size):
+        batch = users[start:start + batch_size]
+        queues = compute_recommendations(session, batch, now=now)
+        session.query(UserRecommendation).filter(
+            UserRecommendation.user_id.in_(list(queues))
+        ).delete(synchronize_session=False)
+        session.bulk_insert_mappings(UserRecommendation, [
+            {'user_id': user_id, 'queue': queue, 'computed_at': now} for user_id, queue in queues.items()
+        ])
+        session.commit()
+    return len(users)
+
+
+def get_recommendations(session: Session, user_id: str) -> Optional[Dict[str, Any]]:
+    """Cached queue for a user, computing it on first request or once it is older than the TTL"""
+    cached = session.query(UserRecommendation).filter(UserRecommendation.user_id == user_id).first()
+    if cached is None or cached.computed_at < datetime.utcnow() - RECOMMENDATION_TTL:
+        if refresh_recommendations(session, [user_id]) == 0:
+            return None
+        cached = session.query(UserRecommendation).filter(UserRecommendation.user_id == user_id).first()
+    return {
+        'userId': cached.user_id,
+        'queue': cached.queue,
+        'computedAt': cached.computed_at.isoformat() if cached.computed_at else None
+    }
+
+
+if __name__ == '__main__':
+    from models import db_manager
+
+    session = db_manager.get_session()
+    try:
+        count = refresh_recommendations(session)
+        print(f"✓ Refreshed recommendations for {count} users")
+    finally:
+        session.close()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of model responses for repeated prompts
+
+Entries are keyed by the sha256 of (normalized prompt, grade, model, system
+prompt version), so "What is a prime number?" and "what is a  prime number"
+from two grade 4 students share one completion, while a prompt change
+(bump the version) or a different model never serves a stale answer.
+
+Entries expire after a TTL and the table is bounded: every
+``EVICTION_INTERVAL`` stores, expired rows are deleted and then the least
+recently hit rows beyond ``max_entries``. Hit/miss counters are kept per
+process; per-entry hit counts are persisted.
+
+Only single-turn prompts without images are meaningful to cache; deciding
+that is up to the caller.
+
+    python response_cache.py stats     # entries, hits and size
+    python response_cache.py evict     # run an eviction pass now
+    python response_cache.py clear     # drop every entry
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import ResponseCacheEntry
+from sql_compat import dialect_insert
+
+DEFAULT_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '10000'))
+EVICTION_INTERVAL = 100
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt: str) -> str:
+    prompt = unicodedata.normalize('NFKC', prompt).casefold()
+    return _WHITESPACE_RE.sub(' ', prompt).strip().rstrip('?!. ')
+
+
+def cache_key(prompt: str, grade: str, model: str, system_prompt_version: str) -> str:
+    canonical = json.dumps([normalize_prompt(prompt), str(grade), model, str(system_prompt_version)],
+                           ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class CacheMetrics:
+    """Thread-safe per-process hit/miss/store/eviction counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = self.stores = self.evictions = 0
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hitRate': self.hits / lookups if lookups else None,
+            }
+
+
+metrics = CacheMetrics()
+
+
+def lookup(session: Session, prompt: str, grade: str, model: str,
+           system_prompt_version: str) -> Optional[str]:
+    """Cached response for the prompt, or None; records the hit on the entry"""
+    now = datetime.utcnow()
+    key = cache_key(prompt, grade, model, system_prompt_version)
+    entry = session.query(ResponseCacheEntry).filter(
+        ResponseCacheEntry.key == key, ResponseCacheEntry.expires_at > now
+    ).first()
+    if entry is None:
+        metrics.incr('misses')
+        return None
+
+    session.query(ResponseCacheEntry).filter(ResponseCacheEntry.key == key).update({
+        ResponseCacheEntry.hit_count: ResponseCacheEntry.hit_count + 1,
+        ResponseCacheEntry.last_hit_at: now,
+    }, synchronize_session=False)
+    session.commit()
+    metrics.incr('hits')
+    return entry.response
+
+
+def store(session: Session, prompt: str, grade: str, model: str, system_prompt_version: str,
+          response: str, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+          max_entries: int = DEFAULT_MAX_ENTRIES) -> str:
+    """Insert or refresh the entry for the prompt; returns its key"""
+    now = datetime.utcnow()
+    key = cache_key(prompt, grade, model, system_prompt_version)
+    table = ResponseCacheEntry.__table__
+    stmt = dialect_insert(session, table).values(
+        key=key,
+        prompt=normalize_prompt(prompt),
+        grade=str(grade),
+        model=model,
+        system_prompt_version=str(system_prompt_version),
+        response=response,
+        hit_count=0,
+        created_at=now,
+        last_hit_at=now,
+        expires_at=now + timedelta(seconds=ttl_seconds),
+    )
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={'response': stmt.excluded.response, 'created_at': stmt.excluded.created_at,
+              'last_hit_at': stmt.excluded.last_hit_at, 'expires_at': stmt.excluded.expires_at}
+    ))
+    session.commit()
+
+    metrics.incr('stores')
+    if metrics.stores % EVICTION_INTERVAL == 0:
+        evict(session, max_entries)
+    return key
+
+
+def evict(session: Session, max_entries: int = DEFAULT_MAX_ENTRIES) -> int:
+    """Delete expired entries, then the least recently hit beyond ``max_entries``"""
+    removed = session.query(ResponseCacheEntry).filter(
+        ResponseCacheEntry.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+
+    excess = session.query(func.count(ResponseCacheEntry.key)).scalar() - max_entries
+    if excess > 0:
+        oldest = session.query(ResponseCacheEntry.key).order_by(
+            ResponseCacheEntry.last_hit_at
+        ).limit(excess).scalar_subquery()
+        removed += session.query(ResponseCacheEntry).filter(
+            ResponseCacheEntry.key.in_(oldest)
+        ).delete(synchronize_session=False)
+    session.commit()
+    metrics.incr('evictions', removed)
+    return removed
+
+
+def clear(session: Session, system_prompt_version: Optional[str] = None) -> int:
+    query = session.query(ResponseCacheEntry)
+    if system_prompt_version is not None:
+        query = query.filter(ResponseCacheEntry.system_prompt_version == str(system_prompt_version))
+    removed = query.delete(synchronize_session=False)
+    session.commit()
+    return removed
+
+
+def cache_stats(session: Session) -> Dict[str, Any]:
+    entries, total_hits, size = session.query(
+        func.count(ResponseCacheEntry.key),
+        func.coalesce(func.sum(ResponseCacheEntry.hit_count), 0),
+        func.coalesce(func.sum(func.length(ResponseCacheEntry.response)), 0),
+    ).one()
+    return {
+        'entries': entries,
+        'maxEntries': DEFAULT_MAX_ENTRIES,
+        'ttlSeconds': DEFAULT_TTL_SECONDS,
+        'totalEntryHits': int(total_hits),
+        'responseChars': int(size),
+        'process': metrics.snapshot(),
+    }
+
+
+if __name__ == '__main__':
+    from models import db_manager
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    session = db_manager.get_session()
+    try:
+        if command == 'stats':
+            print(json.dumps(cache_stats(session), indent=2))
+        elif command == 'evict':
+            print(f"✓ Evicted {evict(session)} entries")
+        elif command == 'clear':
+            print(f"✓ Removed {clear(session)} entries")
+        else:
+            print(f"Unknown command: {command} (expected 'stats', 'evict' or 'clear')")
+            sys.exit(1)
+    finally:
+        session.close()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Bulk roster import: create or update many users from a CSV or NDJSON file
+
+Rows are read and validated in one streaming pass and written in batches
+of ``INSERT ... ON CONFLICT (email) DO UPDATE``, one transaction per batch,
+instead of a transaction and refresh per user. Every row gets a result:
+``created``, ``updated``, ``skipped`` (existing user, ``update_existing``
+off) or ``error`` with the reason. A failing batch is rolled back and its
+rows reported as errors; earlier batches stay committed.
+
+Columns: ``name``, ``email``, ``age``, ``grade`` and optional ``password``.
+Emails are lowercased before they are matched and stored, as on every other
+write path (``User.normalize_email``, ``insertUserSchema``).
+
+    python roster_import.py roster.csv
+    python roster_import.py roster.ndjson --skip-existing
+"""
+import argparse
+import codecs
+import csv
+import json
+import re
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models import User, generate_uuid
+from sql_compat import dialect_insert
+
+BATCH_SIZE = 1000
+VALID_GRADES = ('K', '1', '2', '3', '4', '5', '6', '7')  # Same rules as insertUserSchema in shared/schema.ts
+MIN_AGE, MAX_AGE = 5, 12
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+FORMATS = ('csv', 'ndjson')
+
+users = User.__table__
+
+
+def detect_format(filename: Optional[str] = None, content_type: Optional[str] = None) -> str:
+    """'csv' or 'ndjson' from a file name or MIME type (CSV when neither says otherwise)"""
+    hints = ' '.join(filter(None, [filename, content_type])).lower()
+    return 'ndjson' if any(hint in hints for hint in ('ndjson', 'jsonl', 'json')) else 'csv'
+
+
+def read_rows(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """(row number, raw row) pairs from a binary stream, one row in memory at a time
+
+    Rows are numbered from 1 in file order (the CSV header is not a row).
+    NDJSON lines that do not parse are passed on as the exception.
+    """
+    text = codecs.getreader('utf-8-sig')(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames:
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        yield from enumerate(reader, start=1)
+        return
+    row_number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as e:
+            yield row_number, e
+
+
+def validate_row(raw: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """(column values, None) for a valid row, else (None, reason)"""
+    if isinstance(raw, Exception):
+        return None, f"Invalid JSON: {raw}"
+    if not isinstance(raw, dict):
+        return None, "Row must be an object"
+
+    name = str(raw.get('name') or '').strip()
+    email = str(raw.get('email') or '').strip().lower()
+    grade = str(raw.get('grade') or '').strip().upper()
+    password = raw.get('password') or None
+    if not name:
+        return None, "Missing name"
+    if not EMAIL_PATTERN.match(email):
+        return None, f"Invalid email {email!r}"
+    try:
+        age = int(str(raw.get('age')).strip())
+    except ValueError:
+        return None, f"Invalid age {raw.get('age')!r}"
+    if not MIN_AGE <= age <= MAX_AGE:
+        return None, f"Age must be between {MIN_AGE} and {MAX_AGE}"
+    if grade not in VALID_GRADES:
+        return None, f"Grade must be one of {', '.join(VALID_GRADES)}"
+    return {'name': name, 'email': email, 'age': age, 'grade': grade, 'password': password}, None
+
+
+def _write_batch(session: Session, batch: List[Tuple[int, Dict[str, Any]]],
+                 update_existing: bool) -> List[Dict[str, Any]]:
+    emails = [values['email'] for _row, values in batch]
+    existing = dict(session.execute(select(users.c.email, users.c.id).where(users.c.email.in_(emails))).all())
+
+    stmt = dialect_insert(session, users)
+    if update_existing:
+        stmt = stmt.on_conflict_do_update(index_elements=[users.c.email], set_={
+            'name': stmt.excluded.name,
+            'age': stmt.excluded.age,
+            'grade': stmt.excluded.grade,
+            'password': func.coalesce(stmt.excluded.password, users.c.password),  # Keep it when the row has none
+        })
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[users.c.email])
+    rows = [dict(values, id=existing.get(values['email']) or generate_uuid()) for _row, values in batch]
+    session.execute(stmt, rows)
+
+    results = []
+    for (row_number, values), row in zip(batch, rows):
+        if values['email'] in existing:
+            status = 'updated' if update_existing else 'skipped'
+        else:
+            status = 'created'
+        results.append({'row': row_number, 'status': status, 'id': row['id'], 'email': values['email']})
+    return results
+
+
+def import_roster(session: Session, stream: IO[bytes], fmt: str = 'csv', batch_size: int = BATCH_SIZE,
+                  update_existing: bool = True) -> Dict[str, Any]:
+    """Validate and upsert every row of ``stream``; returns counts and per-row results in file order"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported roster format {fmt!r}; expected one of {', '.join(FORMATS)}")
+
+    results: List[Dict[str, Any]] = []
+    seen: Dict[str, int] = {}
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+
+    def flush():
+        try:
+            results.extend(_write_batch(session, batch, update_existing))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            results.extend({'row': row_number, 'status': 'error', 'email': values['email'], 'error': str(e)}
+                           for row_number, values in batch)
+        batch.clear()
+
+    for row_number, raw in read_rows(stream, fmt):
+        values, error = validate_row(raw)
+        if values is not None and values['email'] in seen:
+            values, error = None, f"Duplicate email (first seen in row {seen[values['email']]})"
+        if values is None:
+            email = raw.get('email') if isinstance(raw, dict) else None
+            results.append({'row': row_number, 'status': 'error', 'email': email, 'error': error})
+            continue
+        seen[values['email']] = row_number
+        batch.append((row_number, values))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    results.sort(key=lambda result: result['row'])
+    counts = {status: 0 for status in ('created', 'updated', 'skipped', 'error')}
+    for result in results:
+        counts[result['status']] += 1
+    return {'rows': len(results), **counts, 'results': results}
+
+
+def lowercase_stored_emails(engine: Engine):
+    """Lowercase emails stored before every write path normalized them
+
+    Rows whose lowercased email would collide with another account are left
+    as they are, since merging accounts is a manual decision.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE users SET email = lower(email) "
+            "WHERE email <> lower(email) AND NOT EXISTS ("
+            "SELECT 1 FROM users other WHERE lower(other.email) = lower(users.email) AND other.id <> users.id)"
+        ))
+
+
+def main(argv: Optional[List[str]] = None):
+    from models import db_manager
+
+    parser = argparse.ArgumentParser(description='Import a roster of users from CSV or NDJSON')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--skip-existing', action='store_true', help='Leave users whose email already exists unchanged')
+    args = parser.parse_args(argv)
+
+    session = db_manager.get_session()
+    try:
+        with open(args.path, 'rb') as f:
+            report = import_roster(session, f, args.format or detect_format(args.path),
+                                   batch_size=args.batch_size, update_existing=not args.skip_existing)
+    finally:
+        session.close()
+
+    for result in report['results']:
+        if result['status'] == 'error':
+            print(f"✗ Row {result['row']}: {result['error']}")
+    print(f"✓ Imported {report['rows']} rows: {report['created']} created, {report['updated']} updated, "
+          f"{report['skipped']} skipped, {report['error']} errors")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for the data service
+
+``schema_migrations`` records every applied step. At startup ``migrate``
+reads the highest applied version with one query and returns immediately
+when it matches the last step, so boot time does not depend on the number
+of tables (``create_all`` reflected every table on every start and never
+added new columns or indexes to existing tables).
+
+Steps run in order, each recorded right after it succeeds. Step 1 creates
+missing tables from the current models, so a fresh database already has
+what later steps add; every step must therefore be idempotent (``IF NOT
+EXISTS``, column checks). Append new steps to ``MIGRATIONS``; never
+renumber or edit an applied one.
+
+    python schema_migrations.py status
+    python schema_migrations.py migrate
+"""
+import argparse
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.engine import Engine
+
+from analytics_export import ensure_export_index
+from change_feed import ensure_change_feed_trigger
+from chat_summaries import ensure_chat_summary_schema, ensure_chat_summary_trigger
+from cohort_rollups import ensure_rollup_grade_schema
+from compression import decompress_shared_columns
+from cr_grading import ensure_grading_queue_schema
+from item_dedup import ensure_content_hash_schema, rehash_items
+from item_pool import ensure_item_pool_schema, ensure_random_key_default
+from message_context import ensure_token_count_schema
+from message_search import ensure_search_index
+from roster_import import lowercase_stored_emails
+from models import Base
+
+ADVISORY_LOCK_KEY = 0x5742_5344  # Serializes concurrent starts on PostgreSQL
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+    Column('duration_ms', Float, nullable=False),
+)
+
+
+def _create_tables(engine: Engine):
+    Base.metadata.create_all(bind=engine)
+
+
+def _model_indexes(engine: Engine):
+    """Indexes declared on models after their tables already existed in deployments"""
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chats_user_id ON chats (user_id)"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_messages_chat_id_created_at ON messages (chat_id, created_at)"
+        ))
+        removed = _dedupe_mastery_progress(conn)
+        if removed:
+            print(f"  Removed {removed} duplicate mastery_progress rows "
+                  f"(kept the row with the most attempts for each user and standard)")
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_mastery_progress_user_sol ON mastery_progress (user_id, sol_id)"
+        ))
+
+
+def _dedupe_mastery_progress(conn) -> int:
+    """Delete all but one row per (user_id, sol_id) so the unique index can be built
+
+    Older code could insert a second row for a standard when two attempts
+    were graded concurrently; the one with the most attempts (then the most
+    recent) holds the complete EWMA.
+    """
+    return conn.execute(text(
+        "DELETE FROM mastery_progress WHERE id IN ("
+        "  SELECT id FROM ("
+        "    SELECT id, ROW_NUMBER() OVER ("
+        "      PARTITION BY user_id, sol_id"
+        "      ORDER BY attempt_count DESC, last_attempt IS NULL, last_attempt DESC, id DESC"
+        "    ) AS position FROM mastery_progress"
+        "  ) ranked WHERE position > 1"
+        ")"
+    )).rowcount
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Engine], None]]] = [
+    (1, 'create missing tables', _create_tables),
+    (2, 'chat, message and mastery indexes', _model_indexes),
+    (3, 'message full-text search', ensure_search_index),
+    (4, 'messages.token_count', ensure_token_count_schema),
+    (5, 'item pool columns and indexes', ensure_item_pool_schema),
+    (6, 'assessment_items.content_hash', ensure_content_hash_schema),
+    (7, 'constructed-response grading queue', ensure_grading_queue_schema),
+    (8, 'message change feed trigger', ensure_change_feed_trigger),
+    (9, 'chat message summaries', ensure_chat_summary_schema),
+    (10, 'decompress columns read by the Node app', decompress_shared_columns),
+    (11, 'grades recorded for cohort rollups', ensure_rollup_grade_schema),
+    (12, 'analytics export index', ensure_export_index),
+    (13, 'item content hashes per pool bucket', rehash_items),
+    (14, 'chat summary trigger', ensure_chat_summary_trigger),
+    (15, 'assessment_items.random_key server default', ensure_random_key_default),
+    (16, 'lowercase user emails', lowercase_stored_emails),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table('schema_migrations'):
+            return 0
+        return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def migrate(engine: Engine) -> List[int]:
+    """Apply pending steps in order; returns the versions applied"""
+    if current_version(engine) == LATEST_VERSION:
+        return []
+
+    with engine.connect() as lock_conn:
+        if engine.dialect.name == 'postgresql':
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': ADVISORY_LOCK_KEY})
+            lock_conn.commit()
+        try:
+            schema_migrations.create(engine, checkfirst=True)
+            applied = []
+            for version, name, step in MIGRATIONS:
+                if version <= current_version(engine):
+                    continue  # Applied by us or by a process that held the lock before us
+                started = time.perf_counter()
+                step(engine)
+                with engine.begin() as conn:
+                    conn.execute(schema_migrations.insert().values(
+                        version=version, name=name, applied_at=datetime.utcnow(),
+                        duration_ms=(time.perf_counter() - started) * 1000
+                    ))
+                applied.append(version)
+            return applied
+        finally:
+            if engine.dialect.name == 'postgresql':
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': ADVISORY_LOCK_KEY})
+                lock_conn.commit()
+
+
+def status(engine: Engine) -> List[dict]:
+    applied = {}
+    if current_version(engine):
+        with engine.connect() as conn:
+            applied = {row.version: row for row in conn.execute(select(schema_migrations))}
+    return [{
+        'version': version,
+        'name': name,
+        'appliedAt': applied[version].applied_at.isoformat() if version in applied else None,
+        'durationMs': round(applied[version].duration_ms, 1) if version in applied else None,
+    } for version, name, _step in MIGRATIONS]
+
+
+def main(argv: Optional[List[str]] = None):
+    from models import db_manager
+
+    parser = argparse.ArgumentParser(description='Apply or inspect schema migrations')
+    parser.add_argument('command', choices=['status', 'migrate'])
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        applied = migrate(db_manager.engine)
+        print(f"✓ Applied migrations {applied}" if applied else f"✓ Schema is current (version {LATEST_VERSION})")
+    for entry in status(db_manager.engine):
+        print(f"{entry['version']:>3} {entry['name']:<40} {entry['appliedAt'] or 'pending'}")
+
+
+if __name__ == '__main__':
+    main()
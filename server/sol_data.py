@@ -0,0 +1,138 @@
+"""
+Loader for the Virginia SOL mathematics datasets in the SOL/ directory
+
+The dataset files are plain Python literals in three shapes:
+  - grades 1-5:  (strand, code, description, [(sub_code, sub_description), ...])
+  - grade 6:     (code, description, [sub_description, ...])
+  - grade 7, HS: (code, description, ["<sub_code> <sub_description>", ...])
+
+They are read with ``ast.literal_eval`` so nothing in them is executed.
+Standard ids are ``<subject>-<grade>-<code>``. ``migrate-python-sol-data.ts``
+parses the same files into the same ids, strands and descriptions, so keep
+the two in step.
+"""
+import ast
+import os
+import re
+import string
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+SUBJECT = 'mathematics'
+
+SOL_DATA_DIR = os.getenv('SOL_DATA_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'SOL'
+)
+
+# (file, grade, variable) in curriculum order
+DATASET_FILES = [
+    ('1_MATH_SOL.py', '1', 'grade1_standards'),
+    ('2_MATH_SOL.py', '2', 'grade2_standards'),
+    ('3_MATH_SOL.py', '3', 'standards_data'),
+    ('4_MATH_SOL.py', '4', 'grade4_standards'),
+    ('5_MATH_SOL.py', '5', 'grade5_standards'),
+    ('6_MATH_SOL.py', '6', 'grade6_standards'),
+    ('7_MATH_SOL.py', '7', 'grade7_data'),
+    ('ALG_MATH_SOL.py', 'Algebra1', 'algebra1_data'),
+    ('ALG2_MATH_SOL.py', 'Algebra2', 'a2_data'),
+    ('AFDA_MATH_SOL.py', 'AFDA', 'afda_data'),
+    ('TRIG_MATH_SOL.py', 'Trigonometry', 'trig_data'),
+]
+
+GRADE_ORDER = [grade for _, grade, _ in DATASET_FILES]
+
+STRAND_NAMES = {
+    'NS': 'Number and Number Sense',
+    'CE': 'Computation and Estimation',
+    'MG': 'Measurement and Geometry',
+    'PS': 'Probability and Statistics',
+    'PFA': 'Patterns, Functions, and Algebra',
+    'EO': 'Expressions and Operations',
+    'EI': 'Equations and Inequalities',
+    'F': 'Functions',
+    'ST': 'Statistics',
+    'AF': 'Algebra and Functions',
+    'DA': 'Data Analysis',
+    'TT': 'Triangle Trigonometry',
+    'CT': 'Circular Trigonometry',
+    'GT': 'Graphs of Trigonometric Functions',
+    'IE': 'Identities and Equations',
+}
+
+_CODE_RE = re.compile(r'^([A-Z0-9]+)\.([A-Z]+)\.(\d+)(?:\.([a-z]+))?$')
+_LABELED_SUB_RE = re.compile(r'^([A-Z0-9]+\.[A-Z]+\.\d+\.[a-z]+)\s+(.*)$', re.DOTALL)
+
+
+def standard_id(grade: str, code: str, subject: str = SUBJECT) -> str:
+    return f"{subject}-{grade}-{code}"
+
+
+def parse_code(code: str) -> Optional[Dict[str, Any]]:
+    """Split an SOL code like ``4.NS.1.a`` into its hierarchy parts"""
+    match = _CODE_RE.match(code)
+    if not match:
+        return None
+    prefix, strand_code, number, letter = match.groups()
+    return {
+        'prefix': prefix,
+        'strandCode': strand_code,
+        'number': int(number),
+        'letter': letter,
+        'standardCode': f"{prefix}.{strand_code}.{number}",
+    }
+
+
+def _read_literal(path: str, variable: str):
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == variable for target in node.targets
+        ):
+            return ast.literal_eval(node.value)
+    raise ValueError(f"{variable} not found in {path}")
+
+
+def _record(grade: str, code: str, strand: str, description: str,
+            parent_code: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        'id': standard_id(grade, code),
+        'code': code,
+        'subject': SUBJECT,
+        'grade': grade,
+        'strand': strand,
+        'description': description.strip(),
+        'parentId': standard_id(grade, parent_code) if parent_code else None,
+    }
+
+
+def _parse_entry(grade: str, entry: tuple) -> List[Dict[str, Any]]:
+    if len(entry) == 4:
+        strand, code, description, subs = entry
+    else:
+        code, description, subs = entry
+        strand = STRAND_NAMES.get(parse_code(code)['strandCode'], 'General')
+
+    records = [_record(grade, code, strand, description)]
+    for index, sub in enumerate(subs):
+        if isinstance(sub, (tuple, list)):
+            sub_code, sub_description = sub
+        else:
+            match = _LABELED_SUB_RE.match(sub)
+            if match:
+                sub_code, sub_description = match.groups()
+            else:
+                # Unlabeled sub-standards (grade 6) are lettered in listed order
+                sub_code, sub_description = f"{code}.{string.ascii_lowercase[index]}", sub
+        records.append(_record(grade, sub_code, strand, sub_description, parent_code=code))
+    return records
+
+
+@lru_cache(maxsize=1)
+def load_standards() -> List[Dict[str, Any]]:
+    """Load every standard and sub-standard record from the SOL datasets"""
+    records: List[Dict[str, Any]] = []
+    for filename, grade, variable in DATASET_FILES:
+        for entry in _read_literal(os.path.join(SOL_DATA_DIR, filename), variable):
+            records.extend(_parse_entry(grade, entry))
+    return records
@@ -0,0 +1,127 @@
+"""
+Precomputed SOL standard hierarchy with prefix lookup and id autocomplete
+
+SOL codes are hierarchical (``4.NS.1`` -> ``4.NS.1.a``), so the datasets are
+folded once into a tree of grade -> strand -> standard -> sub-standard nodes
+keyed by code prefix (``4``, ``4.NS``, ``4.NS.1``, ``4.NS.1.a``). A character
+trie over the codes keeps, at every node, the first few matches in curriculum
+order, so autocomplete is O(len(prefix)) and never walks a whole grade.
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from sol_data import load_standards, parse_code, STRAND_NAMES
+
+AUTOCOMPLETE_CAP = 25
+
+
+class _TrieNode:
+    __slots__ = ('children', 'matches')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.matches: List[Dict[str, Any]] = []
+
+
+class SolHierarchy:
+    """Grade -> strand -> standard -> sub-standard tree plus a code prefix trie"""
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.grades: List[Dict[str, Any]] = []
+        # Grade names ('Algebra2') and code prefixes ('A2') both resolve to the grade node
+        self.grade_aliases: Dict[str, str] = {}
+        self._trie = _TrieNode()
+
+        for record in records:
+            parts = parse_code(record['code'])
+            grade_key = parts['prefix']
+            strand_key = f"{grade_key}.{parts['strandCode']}"
+
+            if grade_key not in self.nodes:
+                label = f"Grade {record['grade']}" if record['grade'].isdigit() else record['grade']
+                grade_node = self._add_node(grade_key, 'grade', label, None, grade=record['grade'])
+                self.grades.append(grade_node)
+                self.grade_aliases[record['grade'].lower()] = grade_key
+                self.grade_aliases[grade_key.lower()] = grade_key
+            if strand_key not in self.nodes:
+                label = STRAND_NAMES.get(parts['strandCode'], record['strand'])
+                self._add_node(strand_key, 'strand', label, grade_key, grade=record['grade'])
+
+            level = 'substandard' if record['parentId'] else 'standard'
+            parent_key = parts['standardCode'] if record['parentId'] else strand_key
+            self._add_node(record['code'], level, record['description'], parent_key,
+                           grade=record['grade'], id=record['id'])
+            self._index(record['code'], {
+                'id': record['id'],
+                'code': record['code'],
+                'grade': record['grade'],
+                'level': level,
+                'description': record['description'],
+            })
+
+    def _add_node(self, key: str, level: str, label: str, parent_key: Optional[str],
+                  **extra) -> Dict[str, Any]:
+        node = {'key': key, 'level': level, 'label': label, 'children': [], **extra}
+        self.nodes[key] = node
+        if parent_key is not None:
+            self.nodes[parent_key]['children'].append(node)
+        return node
+
+    def _index(self, code: str, entry: Dict[str, Any]):
+        node = self._trie
+        for char in code.lower():
+            node = node.children.setdefault(char, _TrieNode())
+            if len(node.matches) < AUTOCOMPLETE_CAP:
+                node.matches.append(entry)
+
+    def resolve(self, path: str) -> Optional[str]:
+        """Map a code prefix or grade name to a node key (case-insensitive)"""
+        if path in self.nodes:
+            return path
+        head, _, rest = path.partition('.')
+        grade_key = self.grade_aliases.get(head.lower())
+        if grade_key is None:
+            return None
+        key = f"{grade_key}.{rest.upper()}" if rest else grade_key
+        if key in self.nodes:
+            return key
+        # Sub-standard letters are lower case ('4.NS.1.a')
+        stem, _, letter = key.rpartition('.')
+        candidate = f"{stem}.{letter.lower()}"
+        return candidate if candidate in self.nodes else None
+
+    def subtree(self, path: Optional[str] = None, depth: int = 1) -> Optional[Dict[str, Any]]:
+        """Node at ``path`` with ``depth`` levels of children (``None`` path = all grades)"""
+        if not path:
+            return {
+                'key': None,
+                'level': 'root',
+                'children': [self._copy(node, depth - 1) for node in self.grades],
+            }
+        key = self.resolve(path)
+        if key is None:
+            return None
+        return self._copy(self.nodes[key], depth)
+
+    def _copy(self, node: Dict[str, Any], depth: int) -> Dict[str, Any]:
+        copy = {k: v for k, v in node.items() if k != 'children'}
+        copy['childCount'] = len(node['children'])
+        if depth > 0:
+            copy['children'] = [self._copy(child, depth - 1) for child in node['children']]
+        return copy
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Standards whose code starts with ``prefix``, in curriculum order"""
+        node = self._trie
+        for char in prefix.strip().lower():
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.matches[:max(1, min(int(limit), AUTOCOMPLETE_CAP))]
+
+
+@lru_cache(maxsize=1)
+def get_hierarchy() -> SolHierarchy:
+    """Process-wide hierarchy built from the SOL datasets on first use"""
+    return SolHierarchy(load_standards())
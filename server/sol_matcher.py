@@ -0,0 +1,124 @@
+"""
+In-memory SOL standard matcher for student questions
+
+Builds a BM25 index over every standard and sub-standard description in the
+SOL datasets and scores free-text questions against it with NumPy, so a
+homework question can be tagged with its most likely standards without an
+LLM call. The index is a term -> postings layout (CSC-style ``indptr`` /
+``doc`` / ``weight`` arrays) with BM25 weights precomputed at build time;
+a query is a single ``np.bincount`` over the postings of its terms.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from sol_data import load_standards
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in into is it its me my of on or our
+so than that the their them then there these they this to use using was what when where
+which who why will with would you your student students given determine including
+""".split())
+
+
+def _stem(token: str) -> str:
+    """Very light suffix stripping so 'fractions'/'fraction' and 'adding'/'add' meet"""
+    for suffix in ('ations', 'ation', 'ing', 'ies', 'es', 'ed', 's'):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            if suffix == 'ies':
+                return token[:-3] + 'y'
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class SolMatcher:
+    """BM25 index over SOL standard descriptions"""
+
+    def __init__(self, records: List[Dict[str, Any]], k1: float = 1.2, b: float = 0.75):
+        self.records = records
+        vocabulary: Dict[str, int] = {}
+        doc_terms = []
+        for record in records:
+            counts: Dict[int, int] = {}
+            for token in tokenize(f"{record['code']} {record['strand']} {record['description']}"):
+                term_id = vocabulary.setdefault(token, len(vocabulary))
+                counts[term_id] = counts.get(term_id, 0) + 1
+            doc_terms.append(counts)
+        self.vocabulary = vocabulary
+
+        doc_count = len(records)
+        doc_lengths = np.array([sum(counts.values()) for counts in doc_terms], dtype=np.float32)
+        avg_length = float(doc_lengths.mean()) if doc_count else 1.0
+
+        # Flatten to (term, doc, tf) triples and sort by term to get postings lists
+        terms = np.fromiter((t for counts in doc_terms for t in counts), dtype=np.int32)
+        docs = np.fromiter((d for d, counts in enumerate(doc_terms) for _ in counts), dtype=np.int32)
+        tfs = np.fromiter((tf for counts in doc_terms for tf in counts.values()), dtype=np.float32)
+        order = np.argsort(terms, kind='stable')
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+
+        doc_freq = np.bincount(terms, minlength=len(vocabulary)).astype(np.float32)
+        idf = np.log1p((doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+        norm = k1 * (1 - b + b * doc_lengths[docs] / avg_length)
+
+        self.indptr = np.concatenate(([0], np.cumsum(doc_freq, dtype=np.int64)))
+        self.postings_doc = docs
+        self.postings_weight = (idf[terms] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+        self.grade_docs: Dict[str, np.ndarray] = {}
+        grades = np.array([record['grade'] for record in records])
+        for grade in np.unique(grades):
+            self.grade_docs[str(grade)] = np.flatnonzero(grades == grade)
+        self.is_substandard = np.array([record['parentId'] is not None for record in records])
+
+    def score(self, text: str) -> np.ndarray:
+        """BM25 score of ``text`` against every indexed standard"""
+        term_ids = [self.vocabulary[token] for token in tokenize(text) if token in self.vocabulary]
+        if not term_ids:
+            return np.zeros(len(self.records), dtype=np.float32)
+        slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.postings_doc[s] for s in slices])
+        weights = np.concatenate([self.postings_weight[s] for s in slices])
+        return np.bincount(docs, weights=weights, minlength=len(self.records))
+
+    def match(self, text: str, grade: Optional[str] = None, k: int = 5,
+              include_substandards: bool = True) -> List[Dict[str, Any]]:
+        """Top-k standards for ``text``, optionally restricted to one grade
+
+        Grades without any indexed standards (e.g. 'K') fall back to searching
+        every grade rather than returning nothing.
+        """
+        scores = self.score(text)
+        candidates = self.grade_docs.get(str(grade)) if grade is not None else None
+        if candidates is None:
+            candidates = np.arange(len(self.records))
+        if not include_substandards:
+            candidates = candidates[~self.is_substandard[candidates]]
+
+        candidate_scores = scores[candidates]
+        positive = candidate_scores > 0
+        candidates, candidate_scores = candidates[positive], candidate_scores[positive]
+        if candidates.size == 0:
+            return []
+
+        k = min(k, candidates.size)
+        top = np.argpartition(-candidate_scores, k - 1)[:k]
+        top = top[np.argsort(-candidate_scores[top], kind='stable')]
+        return [
+            {**self.records[candidates[i]], 'score': round(float(candidate_scores[i]), 4)}
+            for i in top
+        ]
+
+
+@lru_cache(maxsize=1)
+def get_matcher() -> SolMatcher:
+    """Process-wide matcher built from the SOL datasets on first use"""
+    return SolMatcher(load_standards())
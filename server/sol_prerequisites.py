@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Cross-grade SOL prerequisite graph with a precomputed transitive closure
+
+Strand codes recur from grade to grade (NS, CE, MG, PS, PFA in grades 1-7)
+and feed the high school courses (Algebra 1 -> Algebra 2 / AFDA ->
+Trigonometry). Each standard is linked to the most similar standards of the
+matching strand(s) in the preceding course, scored with the BM25 index from
+``sol_matcher``. The closure of that graph is stored in ``sol_prerequisites``
+so the remediation chain for a weak standard is one indexed query.
+
+    python sol_prerequisites.py    # rebuild the closure table
+"""
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import SolPrerequisite
+from sol_data import load_standards, parse_code, standard_id
+
+PREREQUISITES_PER_STANDARD = 2
+DEFAULT_MASTERY_THRESHOLD = 0.7
+
+# grade -> (preceding grade, {strand code -> strand codes to draw prerequisites from})
+# A missing strand mapping means "same strand code"; None means "any strand".
+PRECEDING_COURSE = {
+    '2': ('1', {}),
+    '3': ('2', {}),
+    '4': ('3', {}),
+    '5': ('4', {}),
+    '6': ('5', {}),
+    '7': ('6', {}),
+    'Algebra1': ('7', {'EO': ('NS', 'CE', 'PFA'), 'EI': ('PFA',), 'F': ('PFA',), 'ST': ('PS',)}),
+    'Algebra2': ('Algebra1', {}),
+    'AFDA': ('Algebra1', {'AF': ('F', 'EI'), 'DA': ('ST',)}),
+    'Trigonometry': ('Algebra2', None),
+}
+
+
+def build_prerequisite_edges() -> Dict[str, List[str]]:
+    """Direct prerequisites (standard id -> earlier standard ids), standards only"""
+    from sol_matcher import get_matcher  # numpy-backed; only needed when the closure is rebuilt
+
+    matcher = get_matcher()
+    index_by_id = {record['id']: i for i, record in enumerate(matcher.records)}
+    standards = [record for record in load_standards() if record['parentId'] is None]
+
+    by_grade_strand: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for record in standards:
+        key = (record['grade'], parse_code(record['code'])['strandCode'])
+        by_grade_strand.setdefault(key, []).append(record)
+
+    edges: Dict[str, List[str]] = {}
+    for record in standards:
+        preceding = PRECEDING_COURSE.get(record['grade'])
+        if preceding is None:
+            continue
+        prev_grade, strand_map = preceding
+        parts = parse_code(record['code'])
+        if strand_map is None:
+            candidates = [r for (grade, _), rs in by_grade_strand.items() if grade == prev_grade for r in rs]
+        else:
+            strand_codes = strand_map.get(parts['strandCode'], (parts['strandCode'],))
+            candidates = [r for code in strand_codes for r in by_grade_strand.get((prev_grade, code), [])]
+        if not candidates:
+            continue
+
+        scores = matcher.score(record['description'])
+        ranked = sorted(candidates, key=lambda r: -scores[index_by_id[r['id']]])
+        chosen = [r['id'] for r in ranked[:PREREQUISITES_PER_STANDARD] if scores[index_by_id[r['id']]] > 0]
+        if not chosen:
+            # No shared vocabulary: fall back to the same-numbered standard of the strand
+            same_number = [r for r in candidates if parse_code(r['code'])['number'] == parts['number']]
+            chosen = [same_number[0]['id']] if same_number else []
+        edges[record['id']] = chosen
+    return edges
+
+
+def transitive_closure(edges: Dict[str, List[str]]) -> List[Tuple[str, str, int]]:
+    """(standard, prerequisite, shortest depth) for every reachable pair"""
+    rows = []
+    for sol_id in edges:
+        depths = {}
+        queue = deque((prereq, 1) for prereq in edges[sol_id])
+        while queue:
+            prereq, depth = queue.popleft()
+            if prereq in depths:
+                continue
+            depths[prereq] = depth
+            queue.extend((nxt, depth + 1) for nxt in edges.get(prereq, []))
+        rows.extend((sol_id, prereq, depth) for prereq, depth in depths.items())
+    return rows
+
+
+def rebuild_prerequisite_closure(session: Session) -> int:
+    """Replace the contents of sol_prerequisites with a freshly computed closure"""
+    rows = transitive_closure(build_prerequisite_edges())
+    session.query(SolPrerequisite).delete()
+    session.bulk_insert_mappings(SolPrerequisite, [
+        {'sol_id': sol_id, 'prerequisite_id': prereq, 'depth': depth}
+        for sol_id, prereq, depth in rows
+    ])
+    session.commit()
+    return len(rows)
+
+
+def ensure_prerequisite_closure(session: Session):
+    """Build the closure table on first start (it only changes with the datasets)"""
+    if session.query(SolPrerequisite.sol_id).first() is None:
+        rebuild_prerequisite_closure(session)
+
+
+def parent_standard_id(sol_id: str) -> str:
+    """Sub-standard ids share their parent's prerequisites"""
+    subject, _, rest = sol_id.partition('-')
+    grade, _, code = rest.rpartition('-')
+    parts = parse_code(code)
+    if parts is None or parts['letter'] is None:
+        return sol_id
+    return standard_id(grade, parts['standardCode'], subject)
+
+
+_REMEDIATION_SQL = """
+    SELECT p.prerequisite_id, p.depth, mp.ewma_score, mp.mastery_level, mp.attempt_count, mp.last_attempt
+    FROM sol_prerequisites p
+    LEFT JOIN mastery_progress mp
+           ON mp.user_id = :user_id AND mp.sol_id = p.prerequisite_id
+    WHERE p.sol_id = :sol_id
+      AND p.depth <= :max_depth
+      AND (mp.id IS NULL OR mp.ewma_score < :threshold)
+    ORDER BY p.depth DESC, p.prerequisite_id
+"""
+
+
+def get_remediation_chain(session: Session, user_id: str, sol_id: str,
+                          threshold: float = DEFAULT_MASTERY_THRESHOLD,
+                          max_depth: int = 3) -> List[Dict[str, Any]]:
+    """Earlier standards to review for a weak standard, most foundational first
+
+    Prerequisites the user has already mastered (EWMA at or above
+    ``threshold``) are skipped; never-attempted ones are included.
+    """
+    records = {record['id']: record for record in load_standards()}
+    rows = session.execute(text(_REMEDIATION_SQL), {
+        'user_id': user_id,
+        'sol_id': parent_standard_id(sol_id),
+        'max_depth': max_depth,
+        'threshold': threshold,
+    }).mappings().all()
+
+    chain = []
+    for row in rows:
+        record: Optional[Dict[str, Any]] = records.get(row['prerequisite_id'])
+        last_attempt = row['last_attempt']
+        chain.append({
+            'solId': row['prerequisite_id'],
+            'code': record['code'] if record else None,
+            'grade': record['grade'] if record else None,
+            'description': record['description'] if record else None,
+            'depth': row['depth'],
+            'ewmaScore': row['ewma_score'],
+            'masteryLevel': row['mastery_level'],
+            'attemptCount': row['attempt_count'] or 0,
+            'lastAttempt': last_attempt.isoformat() if hasattr(last_attempt, 'isoformat') else last_attempt,
+        })
+    return chain
+
+
+if __name__ == '__main__':
+    from models import db_manager
+
+    db_manager.create_tables()
+    session = db_manager.get_session()
+    try:
+        count = rebuild_prerequisite_closure(session)
+        print(f"✓ Stored {count} prerequisite pairs")
+    finally:
+        session.close()
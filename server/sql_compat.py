@@ -0,0 +1,134 @@
+"""
+Small helpers for SQL that differs between the PostgreSQL and SQLite backends
+"""
+import os
+import threading
+from typing import Dict
+
+from sqlalchemy import Float, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from memory_profile import SQLITE_CACHE_SIZE_KB
+
+
+def dialect_insert(bind, table):
+    """``INSERT`` construct supporting ``on_conflict_do_*`` for the session/engine's backend"""
+    dialect = bind.get_bind().dialect.name if hasattr(bind, 'get_bind') else bind.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {dialect}")
+
+
+class random_unit(FunctionElement):
+    """Uniform float in [0, 1); SQLite's ``random()`` is a signed 64-bit integer instead"""
+    type = Float()
+    name = 'random_unit'
+    inherit_cache = True
+
+
+@compiles(random_unit)
+def _random_unit(element, compiler, **kw):
+    return "random()"
+
+
+@compiles(random_unit, 'sqlite')
+def _random_unit_sqlite(element, compiler, **kw):
+    return "((abs(random()) % 1000000000) / 1000000000.0)"
+
+
+class WriteGate:
+    """FIFO lock admitting one SQLite write transaction at a time within the process
+
+    SQLite allows a single writer. Queueing writers here, in arrival order,
+    replaces the busy-retry loop (and its ``database is locked`` errors once
+    ``busy_timeout`` runs out) with an orderly wait; ``busy_timeout`` then
+    only has to cover writers in other processes.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    def acquire(self):
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving:
+                self._condition.wait()
+
+    def release(self):
+        with self._condition:
+            self._serving += 1
+            self._condition.notify_all()
+
+    @property
+    def waiting(self) -> int:
+        with self._condition:
+            return max(self._next_ticket - self._serving - 1, 0)
+
+
+def sqlite_pragmas() -> Dict[str, str]:
+    """Per-connection pragmas for file-backed SQLite, overridable through ``SQLITE_*`` variables"""
+    return {
+        'journal_mode': 'WAL',  # Readers never block the writer and vice versa
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),  # Durable at checkpoints; safe with WAL
+        'cache_size': str(-int(os.getenv('SQLITE_CACHE_SIZE_KB', SQLITE_CACHE_SIZE_KB))),  # Negative means KiB
+        'mmap_size': os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)),
+        'busy_timeout': os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'),
+        'temp_store': 'MEMORY',
+    }
+
+
+def configure_sqlite(engine, gate: WriteGate):
+    """Apply ``sqlite_pragmas`` and route write transactions through ``gate``
+
+    Transactions start with ``BEGIN IMMEDIATE`` after taking the gate, so a
+    transaction never fails halfway when it upgrades from reading to
+    writing. Connections with the ``sqlite_read_only`` execution option (see
+    ``DatabaseManager.read_engine``) use a plain deferred ``BEGIN`` and skip
+    the gate, reading a WAL snapshot alongside the writer.
+    """
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, _record):
+        dbapi_connection.isolation_level = None  # Let the 'begin' hook below issue BEGIN
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def _on_begin(conn):
+        if conn.get_execution_options().get('sqlite_read_only'):
+            conn.exec_driver_sql('BEGIN')
+            return
+        gate.acquire()
+        conn.info['holds_write_gate'] = True
+        try:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+        except Exception:
+            _release(conn.info)
+            raise
+
+    def _release(info):
+        if info.pop('holds_write_gate', False):
+            gate.release()
+
+    @event.listens_for(engine, 'commit')
+    def _on_commit(conn):
+        _release(conn.info)
+
+    @event.listens_for(engine, 'rollback')
+    def _on_rollback(conn):
+        _release(conn.info)
+
+    @event.listens_for(engine.pool, 'checkin')
+    def _on_checkin(_dbapi_connection, record):
+        if record is not None:
+            _release(record.info)  # Connection returned or invalidated mid-transaction
@@ -57,8 +57,9 @@ export class MemStorage implements IStorage {
   }
 
   async getUserByEmail(email: string): Promise<User | undefined> {
+    const normalized = email.trim().toLowerCase();
     return Array.from(this.users.values()).find(
-      (user) => user.email === email,
+      (user) => user.email.toLowerCase() === normalized,
     );
   }
 
@@ -301,7 +302,8 @@ export class DatabaseStorage implements IStorage {
     const { eq } = await import("drizzle-orm");
     const { users } = await import("@shared/schema");
     
-    const [user] = await db.select().from(users).where(eq(users.email, email));
+    // Emails are stored lowercased (insertUserSchema, schema migration 16)
+    const [user] = await db.select().from(users).where(eq(users.email, email.trim().toLowerCase()));
     return user || undefined;
   }
 
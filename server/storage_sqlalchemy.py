@@ -6,11 +6,25 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_
 from datetime import datetime
 import json
+import os
+import sys
 
-from .models import (
+# The data service modules import each other by bare name, as they do when run
+# as scripts from server/. Make that work when this module is imported as
+# ``server.storage_sqlalchemy`` too, so there is only ever one ``models`` module
+# (one engine, one WriteGate, one set of ORM hooks).
+_SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+if _SERVER_DIR not in sys.path:
+    sys.path.insert(0, _SERVER_DIR)
+
+from models import (
     db_manager, User, Chat, Message, SolStandard, 
     AssessmentItem, AssessmentAttempt, MasteryProgress
 )
+from item_stats import current_ability, record_attempt_statistics
+from item_dedup import insert_item
+from message_context import count_tokens
+import chat_summaries  # noqa: F401 - keeps chat summaries current on message writes
 
 class SQLAlchemyStorage:
     """Storage implementation using SQLAlchemy ORM"""
@@ -125,7 +139,10 @@ class SQLAlchemyStorage:
                     'title': chat.title,
                     'userId': chat.user_id,
                     'created_at': chat.created_at,
-                    'updated_at': chat.updated_at
+                    'updated_at': chat.updated_at,
+                    'message_count': chat.message_count,
+                    'last_message_at': chat.last_message_at,
+                    'last_message_preview': chat.last_message_preview
                 }
                 for chat in chats
             ]
@@ -197,7 +214,8 @@ class SQLAlchemyStorage:
             message = Message(
                 chat_id=message_data['chatId'],
                 role=message_data['role'],
-                content=message_data['content']
+                content=message_data['content'],
+                token_count=count_tokens(message_data['content'])
             )
             session.add(message)
             session.commit()
@@ -208,11 +226,26 @@ class SQLAlchemyStorage:
                 'chatId': message.chat_id,
                 'role': message.role,
                 'content': message.content,
+                'tokenCount': message.token_count,
                 'timestamp': message.created_at
             }
         finally:
             session.close()
     
+    async def delete_message(self, message_id: str) -> bool:
+        """Delete a message (the chat summary is recomputed in the same transaction)"""
+        session = self.get_session()
+        try:
+            message = session.query(Message).filter(Message.id == message_id).first()
+            if not message:
+                return False
+            
+            session.delete(message)
+            session.commit()
+            return True
+        finally:
+            session.close()
+    
     async def get_messages_by_chat(self, chat_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a chat"""
         session = self.get_session()
@@ -304,17 +337,10 @@ class SQLAlchemyStorage:
         """Create a new assessment item"""
         session = self.get_session()
         try:
-            item = AssessmentItem(
-                sol_id=item_data['solId'],
-                item_type=item_data['itemType'],
-                difficulty=item_data['difficulty'],
-                dok=item_data['dok'],
-                stem=item_data['stem'],
-                payload=item_data['payload']
-            )
-            session.add(item)
+            # Identical items (same standard, stem and answers) resolve to the existing row
+            item_id, _created = insert_item(session, item_data)
             session.commit()
-            session.refresh(item)
+            item = session.query(AssessmentItem).filter(AssessmentItem.id == item_id).one()
             
             return {
                 'id': item.id,
@@ -367,6 +393,15 @@ class SQLAlchemyStorage:
                 duration_seconds=attempt_data.get('durationSeconds')
             )
             session.add(attempt)
+            record_attempt_statistics(
+                session,
+                attempt.item_id,
+                attempt.is_correct,
+                attempt.score,
+                attempt.max_score,
+                attempt.duration_seconds,
+                current_ability(session, attempt.user_id, attempt.sol_id)
+            )
             session.commit()
             session.refresh(attempt)
             
@@ -392,7 +427,8 @@ class SQLAlchemyStorage:
         try:
             # Get recent attempts grouped by SOL standard
             attempts = session.query(AssessmentAttempt).filter(
-                AssessmentAttempt.user_id == user_id
+                AssessmentAttempt.user_id == user_id,
+                AssessmentAttempt.grading_status == 'graded'
             ).order_by(AssessmentAttempt.created_at.desc()).all()
             
             mastery_data = {}
@@ -0,0 +1,49 @@
+"""
+Shared fixtures: a throwaway SQLite database migrated to the current schema
+
+``DATABASE_URL`` is set before ``models`` is imported, since ``models``
+builds its engine at import time. Every table is emptied after each test.
+"""
+import os
+import sys
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='studybuddy-tests-'), 'test.db')}"
+
+import pytest  # noqa: E402
+
+from models import Base, SolStandard, User, db_manager  # noqa: E402
+from schema_migrations import migrate  # noqa: E402
+
+USER_ID = '0190aaaa-0000-7000-8000-000000000001'
+SOL_ID = 'mathematics-3-3.NS.1'
+
+
+@pytest.fixture(scope='session')
+def engine():
+    migrate(db_manager.engine)
+    return db_manager.engine
+
+
+@pytest.fixture
+def session(engine):
+    session = db_manager.get_session()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+
+@pytest.fixture
+def student(session):
+    """A grade 3 student and the standard their items belong to; returns (user_id, sol_id)"""
+    session.add(User(id=USER_ID, name='Student', email='student@example.com', age=8, grade='3'))
+    session.add(SolStandard(id=SOL_ID, subject='mathematics', grade='3', strand='Number and Number Sense',
+                            description='Place value'))
+    session.commit()
+    return USER_ID, SOL_ID
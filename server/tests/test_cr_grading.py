@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import cr_grading
+from cr_grading import claim_attempts, grade_claimed, grade_pending, submit_constructed_response
+from models import AssessmentAttempt, AssessmentItem, ItemStatistics, MasteryProgress, db_manager
+
+
+@pytest.fixture
+def pending(session, student):
+    """One queued constructed response; returns its attempt id"""
+    user_id, sol_id = student
+    item = AssessmentItem(sol_id=sol_id, item_type='CR', difficulty='medium', dok=3, stem='Explain place value',
+                          payload={'sample_answer': 'each digit is worth ten times the digit to its right'})
+    session.add(item)
+    session.commit()
+    return submit_constructed_response(session, user_id, item, 'each digit is worth ten times more').id
+
+
+def state(session, attempt_id):
+    session.expire_all()
+    return session.query(AssessmentAttempt).filter(AssessmentAttempt.id == attempt_id).one()
+
+
+def fixed_score(score):
+    return lambda item, response: {'score': score, 'feedback': 'Scored'}
+
+
+def test_claim_takes_pending_attempts_once(session, pending):
+    assert claim_attempts(session) == [pending]
+    attempt = state(session, pending)
+    assert (attempt.grading_status, attempt.grading_attempts) == ('grading', 1)
+    assert attempt.claimed_at is not None
+    assert claim_attempts(session) == []
+
+
+def test_expired_claims_are_reclaimed(session, pending):
+    claim_attempts(session)
+    expired = datetime.utcnow() - timedelta(seconds=cr_grading.CLAIM_TIMEOUT_SECONDS + 1)
+    session.query(AssessmentAttempt).update({AssessmentAttempt.claimed_at: expired})
+    session.commit()
+
+    assert claim_attempts(session) == [pending]
+    assert state(session, pending).grading_attempts == 2
+
+
+def test_graded_claim_updates_attempt_mastery_and_statistics(session, pending):
+    assert grade_pending(session, fixed_score(3.0)) == 1
+
+    attempt = state(session, pending)
+    assert (attempt.grading_status, attempt.score, attempt.feedback) == ('graded', 3.0, 'Scored')
+    assert attempt.graded_at is not None and attempt.grade == '3'
+    progress = session.query(MasteryProgress).one()
+    assert progress.attempt_count == 1 and progress.ewma_score == pytest.approx(3.0 / attempt.max_score)
+    assert session.query(ItemStatistics).one().attempt_count == 1
+
+
+def test_stolen_claim_writes_nothing(session, pending):
+    """A claim that expired mid-scoring and was taken by another worker must not be graded twice"""
+    [attempt_id] = claim_attempts(session)
+
+    def scorer_outlived_by_its_claim(item, response):
+        other = db_manager.get_session()
+        try:
+            other.query(AssessmentAttempt).filter(AssessmentAttempt.id == attempt_id).update({
+                AssessmentAttempt.claimed_at: datetime.utcnow() + timedelta(seconds=1),
+                AssessmentAttempt.grading_attempts: AssessmentAttempt.grading_attempts + 1,
+            })
+            other.commit()
+        finally:
+            other.close()
+        return {'score': 4.0, 'feedback': 'Too late'}
+
+    assert grade_claimed(session, attempt_id, scorer_outlived_by_its_claim) is False
+
+    attempt = state(session, attempt_id)
+    assert (attempt.grading_status, attempt.score, attempt.feedback) == ('grading', 0.0, None)
+    assert session.query(MasteryProgress).count() == 0
+    assert session.query(ItemStatistics).count() == 0
+
+
+def test_scorer_failures_requeue_then_fail(session, pending):
+    def unavailable(item, response):
+        raise RuntimeError('model unavailable')
+
+    for _ in range(cr_grading.MAX_GRADING_ATTEMPTS - 1):
+        assert grade_pending(session, unavailable) == 0
+        attempt = state(session, pending)
+        assert (attempt.grading_status, attempt.grading_error) == ('pending', 'model unavailable')
+
+    assert grade_pending(session, unavailable) == 0
+    attempt = state(session, pending)
+    assert (attempt.grading_status, attempt.grading_attempts) == ('failed', cr_grading.MAX_GRADING_ATTEMPTS)
+    assert claim_attempts(session) == []
+    assert session.query(MasteryProgress).count() == 0
@@ -0,0 +1,116 @@
+import pytest
+from sqlalchemy import MetaData, create_engine
+from sqlalchemy.orm import Session
+
+import item_pool
+from item_pool import ensure_random_key_default, pick_item
+from models import AssessmentAttempt, AssessmentItem, Base, SolStandard, User
+
+from conftest import SOL_ID, USER_ID
+
+
+def add_item(session, key, sol_id=SOL_ID, item_type='MCQ', difficulty='medium', dok=2, retired=False):
+    item = AssessmentItem(sol_id=sol_id, item_type=item_type, difficulty=difficulty, dok=dok,
+                          stem=f"Item keyed {key}", payload={'options': ['a', 'b'], 'correct_answer': 'a'},
+                          random_key=key, is_retired=retired)
+    session.add(item)
+    session.flush()
+    return item.id
+
+
+def attempt(session, item_id):
+    session.add(AssessmentAttempt(user_id=USER_ID, item_id=item_id, sol_id=SOL_ID, user_response='a',
+                                  is_correct=True, score=1.0, max_score=1.0))
+    session.flush()
+
+
+@pytest.fixture
+def seek_point(monkeypatch):
+    """Pin the random seek point pick_item draws"""
+    def pin(point):
+        monkeypatch.setattr(item_pool.random, 'random', lambda: point)
+    return pin
+
+
+def test_empty_bucket_returns_none(session, student):
+    assert pick_item(session, SOL_ID, 'MCQ') is None
+
+
+def test_seeks_to_first_key_at_or_after_the_point(session, student, seek_point):
+    low, high = add_item(session, 0.2), add_item(session, 0.5)
+    seek_point(0.3)
+    assert pick_item(session, SOL_ID, 'MCQ').id == high
+    seek_point(0.2)
+    assert pick_item(session, SOL_ID, 'MCQ').id == low
+
+
+def test_wraps_around_when_nothing_is_above_the_point(session, student, seek_point):
+    low = add_item(session, 0.2)
+    add_item(session, 0.5)
+    seek_point(0.9)
+    assert pick_item(session, SOL_ID, 'MCQ').id == low
+
+
+def test_only_serves_live_items_from_the_bucket(session, student, seek_point):
+    add_item(session, 0.4, item_type='FIB')
+    add_item(session, 0.5, difficulty='hard')
+    add_item(session, 0.6, dok=3)
+    add_item(session, 0.7, retired=True)
+    wanted = add_item(session, 0.8)
+    seek_point(0.0)
+    assert pick_item(session, SOL_ID, 'MCQ').id == wanted
+
+
+def test_skips_items_the_user_attempted(session, student, seek_point):
+    seen, unseen = add_item(session, 0.3), add_item(session, 0.6)
+    attempt(session, seen)
+    seek_point(0.1)
+    assert pick_item(session, SOL_ID, 'MCQ', user_id=USER_ID).id == unseen
+    attempt(session, unseen)
+    assert pick_item(session, SOL_ID, 'MCQ', user_id=USER_ID) is None
+    assert pick_item(session, SOL_ID, 'MCQ').id == seen
+
+
+def test_inserts_without_a_key_get_one_from_the_server_default(session, student):
+    session.execute(AssessmentItem.__table__.insert().values(
+        id='0190aaaa-0000-7000-8000-0000000000aa', sol_id=SOL_ID, item_type='MCQ', difficulty='medium', dok=2,
+        stem='Inserted like the Node app does', payload={}
+    ))
+    key = session.query(AssessmentItem.random_key).scalar()
+    assert key is not None and 0.0 <= key < 1.0
+
+
+@pytest.fixture
+def legacy_session():
+    """Schema as migration step 5 left it: random_key nullable and without a default"""
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    random_key = metadata.tables['assessment_items'].c.random_key
+    random_key.nullable, random_key.server_default = True, None
+
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(id=USER_ID, name='Student', email='student@example.com', age=8, grade='3'))
+        session.add(SolStandard(id=SOL_ID, subject='mathematics', grade='3', strand='Number and Number Sense',
+                                description='Place value'))
+        session.flush()
+        yield session
+    engine.dispose()
+
+
+def test_serves_unkeyed_items(legacy_session, seek_point):
+    keyed, unkeyed = add_item(legacy_session, 0.5), add_item(legacy_session, None)
+    seek_point(0.1)
+    assert pick_item(legacy_session, SOL_ID, 'MCQ').id == keyed
+    attempt(legacy_session, keyed)
+    assert pick_item(legacy_session, SOL_ID, 'MCQ', user_id=USER_ID).id == unkeyed
+
+
+def test_migration_backfills_unkeyed_items(legacy_session):
+    add_item(legacy_session, None)
+    legacy_session.commit()
+    ensure_random_key_default(legacy_session.get_bind())
+    key = legacy_session.query(AssessmentItem.random_key).scalar()
+    assert key is not None and 0.0 <= key < 1.0
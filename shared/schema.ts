@@ -1,38 +1,64 @@
 import { sql } from "drizzle-orm";
-import { pgTable, text, varchar, timestamp, integer, json, real, boolean } from "drizzle-orm/pg-core";
+import {
+  pgTable, text, uuid, timestamp, integer, json, real, boolean, doublePrecision, varchar, date,
+  index, uniqueIndex, primaryKey, customType,
+} from "drizzle-orm/pg-core";
 import { createInsertSchema } from "drizzle-zod";
 import { z } from "zod";
 
 export const users = pgTable("users", {
-  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+  id: uuid("id").primaryKey().default(sql`gen_random_uuid()`),
   name: text("name").notNull(),
   email: text("email").notNull().unique(),
   age: integer("age").notNull(),
   grade: text("grade").notNull(),
+  password: varchar("password"), // For future authentication
   createdAt: timestamp("created_at").notNull().default(sql`now()`),
 });
 
 export const chats = pgTable("chats", {
-  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+  id: uuid("id").primaryKey().default(sql`gen_random_uuid()`),
   title: text("title").notNull(),
-  userId: varchar("user_id").notNull(),
+  userId: uuid("user_id").notNull(),
   createdAt: timestamp("created_at").notNull().default(sql`now()`),
   updatedAt: timestamp("updated_at").notNull().default(sql`now()`),
+  // Sidebar summary, maintained by a trigger on messages (server/chat_summaries.py)
+  messageCount: integer("message_count").notNull().default(0),
+  lastMessageAt: timestamp("last_message_at"),
+  lastMessagePreview: varchar("last_message_preview"),
+}, (table) => [
+  index("ix_chats_user_id").on(table.userId),
+  index("ix_chats_user_id_updated_at").on(table.userId, table.updatedAt),
+]);
+
+const tsvector = customType<{ data: string }>({
+  dataType() {
+    return "tsvector";
+  },
 });
 
 export const messages = pgTable("messages", {
-  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
-  chatId: varchar("chat_id").notNull(),
+  id: uuid("id").primaryKey().default(sql`gen_random_uuid()`),
+  chatId: uuid("chat_id").notNull(),
   content: text("content").notNull(),
   role: text("role").notNull(), // 'user' or 'assistant'
   imageUrl: text("image_url"), // Optional image URL for messages with photos
+  tokenCount: integer("token_count"), // Set by the Python service at insert (server/message_context.py)
+  // Full-text search (server/message_search.py); compressed content is not indexed
+  searchVector: tsvector("search_vector").generatedAlwaysAs(
+    sql`to_tsvector('english', CASE WHEN left(content, 1) = chr(1) THEN '' ELSE coalesce(content, '') END)`
+  ),
   createdAt: timestamp("created_at").notNull().default(sql`now()`),
-});
+}, (table) => [
+  index("ix_messages_chat_id_created_at").on(table.chatId, table.createdAt),
+  index("ix_messages_search_vector").using("gin", table.searchVector),
+]);
 
 export const insertUserSchema = createInsertSchema(users).omit({
   id: true,
   createdAt: true,
 }).extend({
+  email: z.string().trim().toLowerCase().email(), // Stored lowercased; lookups lowercase too
   age: z.number().min(5).max(12),
   grade: z.enum(["K", "1", "2", "3", "4", "5", "6", "7"]),
 });
@@ -41,10 +67,15 @@ export const insertChatSchema = createInsertSchema(chats).omit({
   id: true,
   createdAt: true,
   updatedAt: true,
+  messageCount: true,
+  lastMessageAt: true,
+  lastMessagePreview: true,
 });
 
 export const insertMessageSchema = createInsertSchema(messages).omit({
   id: true,
+  tokenCount: true,
+  searchVector: true,
   createdAt: true,
 });
 
@@ -66,20 +97,26 @@ export const solStandards = pgTable("sol_standards", {
 });
 
 export const assessmentItems = pgTable("assessment_items", {
-  id: text("id").primaryKey().default(sql`gen_random_uuid()`),
+  id: uuid("id").primaryKey().default(sql`gen_random_uuid()`),
   solId: text("sol_id").notNull().references(() => solStandards.id),
   itemType: text("item_type").notNull(), // MCQ, FIB, CR
   difficulty: text("difficulty").notNull(), // easy, medium, hard
   dok: integer("dok").notNull(), // Depth of Knowledge 1-4
   stem: text("stem").notNull(),
   payload: json("payload").notNull(), // Full item JSON (choices for MCQ, answer_key for FIB, rubric for CR)
+  randomKey: doublePrecision("random_key").notNull().default(sql`random()`), // Uniform key for the item pool's random picks
+  isRetired: boolean("is_retired").notNull().default(false), // Excluded from the pool
+  contentHash: varchar("content_hash", { length: 64 }), // Normalized stem + answers (server/item_dedup.py)
   createdAt: timestamp("created_at").defaultNow(),
-});
+}, (table) => [
+  index("ix_assessment_items_pool").on(table.solId, table.itemType, table.difficulty, table.dok, table.randomKey),
+  uniqueIndex("ix_assessment_items_content_hash").on(table.contentHash),
+]);
 
 export const assessmentAttempts = pgTable("assessment_attempts", {
-  id: text("id").primaryKey().default(sql`gen_random_uuid()`),
-  userId: text("user_id").notNull().references(() => users.id),
-  itemId: text("item_id").notNull().references(() => assessmentItems.id),
+  id: uuid("id").primaryKey().default(sql`gen_random_uuid()`),
+  userId: uuid("user_id").notNull().references(() => users.id),
+  itemId: uuid("item_id").notNull().references(() => assessmentItems.id),
   solId: text("sol_id").notNull(),
   userResponse: json("user_response").notNull(),
   isCorrect: boolean("is_correct").notNull(),
@@ -88,18 +125,37 @@ export const assessmentAttempts = pgTable("assessment_attempts", {
   feedback: text("feedback"),
   durationSeconds: real("duration_seconds"),
   createdAt: timestamp("created_at").defaultNow(),
-});
+  // Constructed responses are scored asynchronously: pending -> grading -> graded (or failed)
+  gradingStatus: varchar("grading_status", { length: 16 }).notNull().default("graded"),
+  gradingAttempts: integer("grading_attempts").notNull().default(0),
+  gradingError: text("grading_error"),
+  claimedAt: timestamp("claimed_at"),
+  gradedAt: timestamp("graded_at"),
+  grade: varchar("grade"), // Student's grade when graded: the cohort rollup it counts toward
+}, (table) => [
+  index("ix_assessment_attempts_user_item").on(table.userId, table.itemId),
+  index("ix_assessment_attempts_grading_queue").on(table.gradingStatus, table.createdAt),
+  index("ix_assessment_attempts_available_at").on(sql`(coalesce(${table.gradedAt}, ${table.createdAt}))`, table.id),
+]);
 
 export const insertSolStandardSchema = createInsertSchema(solStandards).omit({
   createdAt: true,
 });
 export const insertAssessmentItemSchema = createInsertSchema(assessmentItems).omit({
   id: true,
+  randomKey: true,
+  isRetired: true,
+  contentHash: true,
   createdAt: true,
 });
 export const insertAssessmentAttemptSchema = createInsertSchema(assessmentAttempts).omit({
   id: true,
   createdAt: true,
+  gradingAttempts: true,
+  gradingError: true,
+  claimedAt: true,
+  gradedAt: true,
+  grade: true,
 });
 
 export type SolStandard = typeof solStandards.$inferSelect;
@@ -108,3 +164,104 @@ export type AssessmentAttempt = typeof assessmentAttempts.$inferSelect;
 export type InsertSolStandard = z.infer<typeof insertSolStandardSchema>;
 export type InsertAssessmentItem = z.infer<typeof insertAssessmentItemSchema>;
 export type InsertAssessmentAttempt = z.infer<typeof insertAssessmentAttemptSchema>;
+
+// Tables owned by the Python data service. server/schema_migrations.py creates
+// and migrates them; they are declared here so `db:push` leaves them alone.
+export const masteryProgress = pgTable("mastery_progress", {
+  id: uuid("id").primaryKey(),
+  userId: uuid("user_id").notNull().references(() => users.id),
+  solId: varchar("sol_id").notNull().references(() => solStandards.id),
+  ewmaScore: doublePrecision("ewma_score").notNull(),
+  attemptCount: integer("attempt_count").notNull(),
+  lastAttempt: timestamp("last_attempt"),
+  masteryLevel: varchar("mastery_level").notNull(), // beginning, developing, proficient, advanced
+  grade: varchar("grade"), // Cohort rollup grade this state is counted in
+  createdAt: timestamp("created_at").defaultNow(),
+  updatedAt: timestamp("updated_at").defaultNow(),
+}, (table) => [
+  uniqueIndex("ix_mastery_progress_user_sol").on(table.userId, table.solId),
+]);
+
+export const itemStatistics = pgTable("item_statistics", {
+  itemId: uuid("item_id").primaryKey().references(() => assessmentItems.id),
+  attemptCount: integer("attempt_count").notNull(),
+  correctCount: integer("correct_count").notNull(),
+  scoreRatioSum: doublePrecision("score_ratio_sum").notNull(),
+  durationSum: doublePrecision("duration_sum").notNull(),
+  durationCount: integer("duration_count").notNull(),
+  abilitySum: doublePrecision("ability_sum").notNull(),
+  abilitySqSum: doublePrecision("ability_sq_sum").notNull(),
+  correctAbilitySum: doublePrecision("correct_ability_sum").notNull(),
+  pValue: doublePrecision("p_value"),
+  meanScore: doublePrecision("mean_score"),
+  meanDuration: doublePrecision("mean_duration"),
+  discrimination: doublePrecision("discrimination"),
+  updatedAt: timestamp("updated_at").notNull(),
+});
+
+export const itemPoolTargets = pgTable("item_pool_targets", {
+  solId: varchar("sol_id").notNull().references(() => solStandards.id),
+  itemType: varchar("item_type").notNull(),
+  difficulty: varchar("difficulty").notNull(),
+  dok: integer("dok").notNull(),
+  target: integer("target").notNull(),
+}, (table) => [
+  primaryKey({ columns: [table.solId, table.itemType, table.difficulty, table.dok] }),
+]);
+
+export const userRecommendations = pgTable("user_recommendations", {
+  userId: uuid("user_id").primaryKey().references(() => users.id),
+  queue: json("queue").notNull(),
+  computedAt: timestamp("computed_at").notNull(),
+});
+
+export const solPrerequisites = pgTable("sol_prerequisites", {
+  solId: varchar("sol_id").notNull(),
+  prerequisiteId: varchar("prerequisite_id").notNull(),
+  depth: integer("depth").notNull(),
+}, (table) => [
+  primaryKey({ columns: [table.solId, table.prerequisiteId] }),
+]);
+
+export const cohortRollups = pgTable("cohort_rollups", {
+  grade: varchar("grade").notNull(),
+  strand: varchar("strand").notNull(),
+  solId: varchar("sol_id").notNull().references(() => solStandards.id),
+  day: date("day").notNull(),
+  attemptCount: integer("attempt_count").notNull(),
+  correctCount: integer("correct_count").notNull(),
+  scoreRatioSum: doublePrecision("score_ratio_sum").notNull(),
+  durationSum: doublePrecision("duration_sum").notNull(),
+  durationCount: integer("duration_count").notNull(),
+  newStudents: integer("new_students").notNull(),
+  ewmaDelta: doublePrecision("ewma_delta").notNull(),
+  beginningDelta: integer("beginning_delta").notNull(),
+  developingDelta: integer("developing_delta").notNull(),
+  proficientDelta: integer("proficient_delta").notNull(),
+  advancedDelta: integer("advanced_delta").notNull(),
+}, (table) => [
+  primaryKey({ columns: [table.grade, table.strand, table.solId, table.day] }),
+]);
+
+export const responseCache = pgTable("response_cache", {
+  key: varchar("key", { length: 64 }).primaryKey(),
+  prompt: text("prompt").notNull(),
+  grade: varchar("grade").notNull(),
+  model: varchar("model").notNull(),
+  systemPromptVersion: varchar("system_prompt_version").notNull(),
+  response: text("response").notNull(),
+  hitCount: integer("hit_count").notNull(),
+  createdAt: timestamp("created_at").notNull(),
+  lastHitAt: timestamp("last_hit_at").notNull(),
+  expiresAt: timestamp("expires_at").notNull(),
+}, (table) => [
+  index("ix_response_cache_last_hit_at").on(table.lastHitAt),
+  index("ix_response_cache_expires_at").on(table.expiresAt),
+]);
+
+export const schemaMigrations = pgTable("schema_migrations", {
+  version: integer("version").primaryKey(),
+  name: varchar("name").notNull(),
+  appliedAt: timestamp("applied_at").notNull(),
+  durationMs: doublePrecision("duration_ms").notNull(),
+});